@@ -0,0 +1,251 @@
+"""Adaptive (AIMD) concurrency limits for page fetches and Claude calls.
+
+Every target, a site's host or a Claude model, gets its own limit on
+requests in flight, shared by all jobs in the worker process (threads and
+the async engine alike). Until the first sign of trouble each success
+raises the limit by one, doubling it every round of requests (slow start);
+after that, by about one per round (additive increase). A 429, 503 or 529
+halves it and holds the target's requests back for its Retry-After
+(multiplicative decrease). A host whose latency climbs well above the best it has shown
+gets a smaller limit before it starts refusing requests. A model's limit
+stops growing when Anthropic's rate-limit headers show the quota nearly
+used, and is held back until the reset once it runs out.
+"""
+import os
+import time
+import asyncio
+import threading
+from contextlib import contextmanager, asynccontextmanager
+from urllib.parse import urlsplit
+import metrics
+from rate_limit import anthropic_quota
+
+# Starting and highest in-flight requests per site host
+ADAPTIVE_HOST_INITIAL = int(os.environ.get("ADAPTIVE_HOST_INITIAL", 4))
+ADAPTIVE_HOST_MAX = int(os.environ.get("ADAPTIVE_HOST_MAX", 16))
+# Starting and highest in-flight calls per Claude model
+ADAPTIVE_MODEL_INITIAL = int(os.environ.get("ADAPTIVE_MODEL_INITIAL", 8))
+ADAPTIVE_MODEL_MAX = int(os.environ.get("ADAPTIVE_MODEL_MAX", 50))
+# A host's limit is trimmed once its latency exceeds this multiple of its best
+ADAPTIVE_LATENCY_TOLERANCE = float(os.environ.get("ADAPTIVE_LATENCY_TOLERANCE", 2.0))
+# Longest a target is held back, whatever its Retry-After says
+ADAPTIVE_MAX_PAUSE_SECONDS = float(os.environ.get("ADAPTIVE_MAX_PAUSE_SECONDS", 60))
+# A model's limit stops growing once less than this share of its quota remains
+ADAPTIVE_QUOTA_HEADROOM = float(os.environ.get("ADAPTIVE_QUOTA_HEADROOM", 0.1))
+
+OVERLOAD_STATUSES = {429, 503, 529}
+OVERLOAD_DECREASE = 0.5
+LATENCY_DECREASE = 0.9
+# Weight of the newest latency in the smoothed latency
+LATENCY_SMOOTHING = 0.2
+# How fast the best latency drifts up per request, so a site that got slower for good isn't throttled forever
+BEST_LATENCY_DRIFT = 1.01
+QUOTA_KINDS = ("requests", "tokens", "input-tokens", "output-tokens")
+
+
+def quota_from_headers(headers):
+    """(remaining share, seconds until reset) of the scarcest Anthropic rate limit, or None."""
+    scarcest = None
+    for kind in QUOTA_KINDS:
+        quota = anthropic_quota(headers, kind)
+        if quota is None or not quota[0]:
+            continue
+        limit, remaining, reset = quota
+        if scarcest is None or remaining / limit < scarcest[0]:
+            scarcest = (remaining / limit, reset)
+    return scarcest
+
+
+def _wake_waiter(waiter):
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+class Slot:
+    """One request in flight. Mark it overloaded if the target refused it."""
+
+    def __init__(self, started):
+        self.started = started
+        self.outcome = "ok"
+        self.pause = None
+
+    def overloaded(self, pause):
+        self.outcome = "overloaded"
+        self.pause = pause
+
+
+class AdaptiveLimit:
+    """In-flight request limit for one target, adjusted AIMD-style."""
+
+    def __init__(self, kind, target, initial, maximum, latency_signal):
+        self.kind = kind
+        self.target = target
+        self.limit = float(initial)
+        self.maximum = maximum
+        self.in_flight = 0
+        self.latency_signal = latency_signal
+        self._smoothed = None
+        self._best = None
+        self._paused_until = 0
+        self._decreased_at = 0
+        self._saturated = False
+        self._slow_start = True
+        self._cond = threading.Condition()
+        self._async_waiters = []
+        self._publish()
+
+    def _publish(self):
+        metrics.registry.set("briefcase_concurrency_limit", int(self.limit), kind=self.kind, target=self.target)
+
+    def _wait_time(self):
+        """0 if a request may start now, else seconds to wait (None: until one finishes)."""
+        now = time.monotonic()
+        if now < self._paused_until:
+            return self._paused_until - now
+        if self.in_flight < int(self.limit):
+            return 0
+        return None
+
+    def acquire(self):
+        with self._cond:
+            while True:
+                wait = self._wait_time()
+                if wait == 0:
+                    self.in_flight += 1
+                    return time.monotonic()
+                self._cond.wait(wait)
+
+    async def acquire_async(self):
+        while True:
+            with self._cond:
+                wait = self._wait_time()
+                if wait == 0:
+                    self.in_flight += 1
+                    return time.monotonic()
+                waiter = asyncio.get_running_loop().create_future()
+                self._async_waiters.append(waiter)
+            try:
+                await asyncio.wait_for(waiter, wait)
+            except asyncio.TimeoutError:
+                pass
+
+    def _wake(self):
+        self._cond.notify_all()
+        for waiter in self._async_waiters:
+            waiter.get_loop().call_soon_threadsafe(_wake_waiter, waiter)
+        self._async_waiters = []
+
+    def release(self, slot):
+        with self._cond:
+            self.in_flight -= 1
+            if slot.outcome == "ok":
+                self._succeeded(slot.started)
+            elif slot.outcome == "overloaded":
+                self._overloaded(slot.started, slot.pause)
+            self._wake()
+
+    def _succeeded(self, started):
+        if self.latency_signal:
+            latency = time.monotonic() - started
+            if self._smoothed is None:
+                self._smoothed = latency
+            self._smoothed += LATENCY_SMOOTHING * (latency - self._smoothed)
+            self._best = min(self._best * BEST_LATENCY_DRIFT if self._best else latency, self._smoothed)
+            if self._smoothed > ADAPTIVE_LATENCY_TOLERANCE * self._best:
+                self._decrease(started, LATENCY_DECREASE, f"Latency up to {self._smoothed:.2f}s")
+                return
+        if not self._saturated and self.limit < self.maximum:
+            self.limit = min(self.maximum, self.limit + (1 if self._slow_start else 1 / self.limit))
+            self._publish()
+
+    def _decrease(self, started, factor, reason):
+        # Requests started before the last decrease saw the old limit; they
+        # don't count as evidence against the new one
+        if started is not None and started < self._decreased_at:
+            return
+        old = self.limit
+        self._slow_start = False
+        self.limit = max(1.0, self.limit * factor)
+        self._decreased_at = time.monotonic()
+        self._publish()
+        if int(old) != int(self.limit):
+            print(f"{reason} from {self.kind} {self.target}: concurrency limit {int(old)} -> {int(self.limit)}")
+
+    def _overloaded(self, started, pause, decrease=True):
+        if decrease:
+            self._decrease(started, OVERLOAD_DECREASE, "Rate limited")
+        if pause:
+            until = time.monotonic() + min(pause, ADAPTIVE_MAX_PAUSE_SECONDS)
+            self._paused_until = max(self._paused_until, until)
+
+    def overloaded(self, pause=None, started=None, decrease=True):
+        """Report a refusal seen outside a slot (e.g. by an HTTP client hook)
+        of a request sent at started (time.monotonic()). With decrease=False
+        (a refused retry, already counted once) the target is only paused."""
+        with self._cond:
+            self._overloaded(started, pause, decrease)
+            self._wake()
+
+    def quota(self, headers):
+        """Hold the limit steady while the rate-limit quota is nearly used, and
+        hold requests back until it resets once it has run out."""
+        scarcest = quota_from_headers(headers)
+        if scarcest is None:
+            return
+        share, reset = scarcest
+        with self._cond:
+            self._saturated = share < ADAPTIVE_QUOTA_HEADROOM
+            if share <= 0 and reset:
+                self._paused_until = max(self._paused_until, time.monotonic() + min(reset, ADAPTIVE_MAX_PAUSE_SECONDS))
+
+    @contextmanager
+    def slot(self):
+        """Hold one of the target's slots for a request. Exceptions leave the limit as is."""
+        slot = Slot(self.acquire())
+        try:
+            yield slot
+        except BaseException:
+            slot.outcome = None
+            raise
+        finally:
+            self.release(slot)
+
+    @asynccontextmanager
+    async def aslot(self):
+        slot = Slot(await self.acquire_async())
+        try:
+            yield slot
+        except BaseException:
+            slot.outcome = None
+            raise
+        finally:
+            self.release(slot)
+
+
+class AdaptiveLimits:
+    """One AdaptiveLimit per target, created on first use."""
+
+    def __init__(self, kind, initial, maximum, latency_signal):
+        self.kind = kind
+        self.initial = initial
+        self.maximum = maximum
+        self.latency_signal = latency_signal
+        self._limits = {}
+        self._lock = threading.Lock()
+
+    def get(self, target):
+        with self._lock:
+            limit = self._limits.get(target)
+            if limit is None:
+                limit = AdaptiveLimit(self.kind, target, self.initial, self.maximum, self.latency_signal)
+                self._limits[target] = limit
+            return limit
+
+
+hosts = AdaptiveLimits("host", ADAPTIVE_HOST_INITIAL, ADAPTIVE_HOST_MAX, latency_signal=True)
+# Claude latency follows the length of the output, not load, so models only react to refusals and quota
+models = AdaptiveLimits("model", ADAPTIVE_MODEL_INITIAL, ADAPTIVE_MODEL_MAX, latency_signal=False)
+
+
+def host_limit(url):
+    return hosts.get(urlsplit(url).netloc.lower())
@@ -1,73 +1,205 @@
 import json
-import anthropic
-from prompts import ANALYSIS_PROMPT
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import llm_cache
+import metrics
+import router
+from llm import complete_json, stream_json, anthropic_client
+from prompts import ANALYSIS_PROMPT, DIGEST_PROMPT, SYNTHESIS_PROMPT
 
-client = anthropic.Anthropic()
+client = anthropic_client()
 
+# Teams with at least this many members are analysed map-reduce style: each
+# group is condensed into a digest by a cheaper model, concurrently, and the
+# insights are written from the digests (0 turns it off)
+INSIGHTS_DIGEST_MIN_MEMBERS = int(os.environ.get("INSIGHTS_DIGEST_MIN_MEMBERS", 100))
+# Most members per digest: larger groups are split, small ones share a digest
+INSIGHTS_DIGEST_SIZE = int(os.environ.get("INSIGHTS_DIGEST_SIZE", 40))
+INSIGHTS_DIGEST_WORKERS = int(os.environ.get("INSIGHTS_DIGEST_WORKERS", 8))
+
+
+def member_text(member):
+    """A member's scraped data as the prompt text the analysis calls see."""
+    parts = [f"**{member['name']}** — {member.get('title', 'N/A')}"]
+    if member.get("bio"):
+        parts.append(f"  Bio: {member['bio']}")
+    if member.get("education"):
+        edu_strs = []
+        for edu in member["education"]:
+            s = edu.get("school", "")
+            if edu.get("degree"):
+                s += f", {edu['degree']}"
+            if edu.get("honors"):
+                s += f" ({edu['honors']})"
+            edu_strs.append(s)
+        parts.append(f"  Education: {'; '.join(edu_strs)}")
+    if member.get("career"):
+        career_strs = []
+        for c in member["career"]:
+            s = f"{c.get('role', '')} at {c.get('company', '')}"
+            if c.get("details"):
+                s += f" — {c['details']}"
+            career_strs.append(s)
+        parts.append(f"  Career: {'; '.join(career_strs)}")
+    if member.get("personal"):
+        parts.append(f"  Personal: {'; '.join(member['personal'])}")
+    return "\n".join(parts)
 
-def generate_insights(team_data, progress_callback=None):
-    """Generate rich analytical insights from structured team data using Claude Opus."""
-    if progress_callback:
-        progress_callback(75, "Generating deep insights with AI (this may take a minute)...")
 
+def insights_request(team_data):
+    """Route and prompt for the insight analysis of a scraped team."""
     # Build a clean text representation of all team members for the prompt
     team_text_parts = []
     for group in team_data.get("groups", []):
         team_text_parts.append(f"\n### {group['name']} ({group['count']} members)\n")
         for member in group.get("members", []):
-            parts = [f"**{member['name']}** — {member.get('title', 'N/A')}"]
-            if member.get("bio"):
-                parts.append(f"  Bio: {member['bio']}")
-            if member.get("education"):
-                edu_strs = []
-                for edu in member["education"]:
-                    s = edu.get("school", "")
-                    if edu.get("degree"):
-                        s += f", {edu['degree']}"
-                    if edu.get("honors"):
-                        s += f" ({edu['honors']})"
-                    edu_strs.append(s)
-                parts.append(f"  Education: {'; '.join(edu_strs)}")
-            if member.get("career"):
-                career_strs = []
-                for c in member["career"]:
-                    s = f"{c.get('role', '')} at {c.get('company', '')}"
-                    if c.get("details"):
-                        s += f" — {c['details']}"
-                    career_strs.append(s)
-                parts.append(f"  Career: {'; '.join(career_strs)}")
-            if member.get("personal"):
-                parts.append(f"  Personal: {'; '.join(member['personal'])}")
-            team_text_parts.append("\n".join(parts))
+            team_text_parts.append(member_text(member))
 
     team_text = "\n\n".join(team_text_parts)
 
-    prompt = ANALYSIS_PROMPT.format(
-        team_count=team_data["team_count"],
-        company=team_data["company"],
-        team_data=team_text,
+    prompt = (
+        f"Company: {team_data['company']}\n"
+        f"Team size: {team_data['team_count']} people\n\n"
+        f"Here is the structured data for every team member:\n\n{team_text}"
     )
+    return router.insights_route(team_data["team_count"]), prompt
+
+
+def use_digests(team_data):
+    """Whether the team is large enough to analyse from per-group digests."""
+    return bool(INSIGHTS_DIGEST_MIN_MEMBERS) and team_data.get("team_count", 0) >= INSIGHTS_DIGEST_MIN_MEMBERS
+
+
+def digest_shards(groups, size=INSIGHTS_DIGEST_SIZE):
+    """Split groups into shards of at most size members, in team order.
+
+    Groups larger than size are sliced into parts; consecutive small groups
+    are packed into one shard. Each shard is a list of (heading, members).
+    """
+    shards, current, current_size = [], [], 0
+    for group in groups:
+        members = group.get("members", [])
+        parts = [members[i:i + size] for i in range(0, len(members), size)]
+        for n, part in enumerate(parts):
+            heading = f"{group['name']} ({len(members)} members)"
+            if len(parts) > 1:
+                heading = f"{group['name']}, part {n + 1} of {len(parts)} ({len(part)} of {len(members)} members)"
+            if current and current_size + len(part) > size:
+                shards.append(current)
+                current, current_size = [], 0
+            current.append((heading, part))
+            current_size += len(part)
+    if current:
+        shards.append(current)
+    return shards
+
+
+def digest_requests(team_data):
+    """(label, route, content) of the digest call for each shard of the team."""
+    requests = []
+    for shard in digest_shards(team_data.get("groups", [])):
+        sections = [
+            f"### {heading}\n\n" + "\n\n".join(member_text(m) for m in members) for heading, members in shard
+        ]
+        content = f"Company: {team_data['company']}\n\n" + "\n\n".join(sections)
+        label = ", ".join(heading.split(" (")[0] for heading, _ in shard)
+        requests.append((label, router.digest_route(sum(len(m) for _, m in shard)), content))
+    return requests
+
+
+def synthesis_request(team_data, digests):
+    """Route and prompt for writing the insights from the group digests."""
+    groups = ", ".join(f"{g['name']} ({g['count']})" for g in team_data.get("groups", []))
+    digest_text = "\n".join(json.dumps(d, ensure_ascii=False) for d in digests)
+    prompt = (
+        f"Company: {team_data['company']}\n"
+        f"Team size: {team_data['team_count']} people\n"
+        f"Groups: {groups}\n\n"
+        f"Here are the digests of the team, one per line:\n\n{digest_text}"
+    )
+    return router.insights_route(team_data["team_count"]), prompt
+
 
-    message = client.messages.create(
-        model="claude-opus-4-20250514",
-        max_tokens=16384,
-        messages=[
-            {
-                "role": "user",
-                "content": prompt,
-            }
-        ],
+def _digest(label, route, content):
+    digest = llm_cache.lookup(route.model, DIGEST_PROMPT, content)
+    if digest is None:
+        digest = router.call(
+            route, lambda r: complete_json(client, f"Insight digest ({label})", r, DIGEST_PROMPT, content)
+        )
+        llm_cache.store(route.model, DIGEST_PROMPT, content, digest)
+    return digest
+
+
+def summarize_groups(team_data, progress_callback=None):
+    """Digest every shard of the team concurrently. Returns the digests in team order."""
+    requests = digest_requests(team_data)
+    if progress_callback:
+        progress_callback(75, f"Summarizing {team_data['team_count']} people in {len(requests)} parts...")
+
+    digests = [None] * len(requests)
+    with ThreadPoolExecutor(max_workers=min(len(requests), INSIGHTS_DIGEST_WORKERS) or 1) as executor:
+        futures = {executor.submit(metrics.in_context(_digest), *request): i for i, request in enumerate(requests)}
+        for done, future in enumerate(as_completed(futures), 1):
+            digests[futures[future]] = future.result()
+            if progress_callback:
+                progress_callback(75, f"Summarizing team ({done}/{len(requests)} parts)...")
+    return digests
+
+
+def published_once(insight_callback):
+    """Wrap insight_callback to take (index, insight) and pass each index on once.
+
+    An escalated call streams its sections from the start again; the ones
+    already published stand until the final result replaces them.
+    """
+    published = []
+
+    def publish(index, insight):
+        if insight_callback and index >= len(published):
+            published.append(index)
+            insight_callback(insight)
+    return publish
+
+
+def _stream_insights(route, instructions, prompt, progress_callback, publish):
+    def section_ready(path, insight):
+        ready = path[0] + 1
+        publish(path[0], insight)
+        if progress_callback:
+            progress_callback(75 + min(ready, 6) * 3, f"Generating deep insights ({ready} sections ready)...")
+
+    return stream_json(
+        client, "Insight generation", route, instructions, prompt, lambda path: len(path) == 1, section_ready
     )
 
-    response_text = message.content[0].text
 
-    # Extract JSON from response
-    if "```json" in response_text:
-        response_text = response_text.split("```json")[1].split("```")[0]
-    elif "```" in response_text:
-        response_text = response_text.split("```")[1].split("```")[0]
+def generate_insights(team_data, progress_callback=None, insight_callback=None):
+    """Generate rich analytical insights from structured team data using Claude Opus.
+
+    Teams of INSIGHTS_DIGEST_MIN_MEMBERS or more are first summarized into
+    per-group digests (see summarize_groups), and the insights are written
+    from those. The response is streamed; each insight is passed to
+    insight_callback as soon as its JSON object is complete, before the rest
+    has been written.
+    """
+    if use_digests(team_data):
+        digests = summarize_groups(team_data, progress_callback)
+        instructions = SYNTHESIS_PROMPT
+        route, prompt = synthesis_request(team_data, digests)
+    else:
+        instructions = ANALYSIS_PROMPT
+        route, prompt = insights_request(team_data)
+
+    if progress_callback:
+        progress_callback(75, "Generating deep insights with AI (this may take a minute)...")
 
-    insights = json.loads(response_text.strip())
+    insights = llm_cache.lookup(route.model, instructions, prompt)
+    if insights is None:
+        publish = published_once(insight_callback)
+        insights = router.call(
+            route, lambda r: _stream_insights(r, instructions, prompt, progress_callback, publish)
+        )
+        llm_cache.store(route.model, instructions, prompt, insights)
 
     if progress_callback:
         progress_callback(95, "Finalizing dossier...")
@@ -1,63 +1,353 @@
 import os
+import json
+import time
 import uuid
 import threading
-from flask import Flask, request, jsonify
+from contextlib import contextmanager, nullcontext
+from functools import partial
+from types import SimpleNamespace
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
 from dotenv import load_dotenv
 
 load_dotenv()
 
-from scraper import scrape_team
+from scraper import fetch_page, extract_team_structure, enrich_team, ProfilePool
 from analyzer import generate_insights
-from notion_builder import create_dossier_page
+from notion_builder import sync_dossier_page
+from job_store import get_job_store, untouched, FINISHED_STATUSES, JOB_HEARTBEAT_SECONDS
+from fetch_cache import normalize_url
+from scheduler import Scheduler, scheduler, JobCancelled, INTERACTIVE, BULK, PRIORITY_NAMES, PROFILE_WORKERS
+import async_pipeline
+import metrics
+from batch_profiles import enrich_team_batch, BatchPending, batch_progress, poller as batch_poller
+from refresh import refresh_team
+from checkpoints import Checkpoint, HTML, TEAM, INSIGHTS, BATCH
 
 app = Flask(__name__)
 CORS(app)
 
-# In-memory job store
-jobs = {}
+# "threads" runs each dossier's fetches and Claude calls on thread pools;
+# "async" runs them as coroutines on one event loop per worker (see
+# async_pipeline.py). Either way the job itself holds a scheduler worker
+PIPELINE_MODE = os.environ.get("PIPELINE_MODE", "threads")
 
+# Shared job store (SQLite by default, so any worker can answer a status poll)
+job_store = get_job_store()
 
-def run_pipeline(job_id, url):
-    """Run the full scraping + analysis pipeline in a background thread."""
-    job = jobs[job_id]
+# How often the event stream checks the job store for new events
+SSE_POLL_SECONDS = float(os.environ.get("SSE_POLL_SECONDS", 0.5))
+# Comment lines sent on an idle stream so proxies don't close it
+SSE_HEARTBEAT_SECONDS = float(os.environ.get("SSE_HEARTBEAT_SECONDS", 15))
+# Event streams held open at once. Each holds one of the server's threads
+# (16 with gunicorn's --threads in railway.toml) for as long as its job
+# runs, so some are left for the rest of the API
+SSE_MAX_STREAMS = int(os.environ.get("SSE_MAX_STREAMS", 12))
+# Reconnect delay given to a stream turned away by SSE_MAX_STREAMS
+SSE_BUSY_RETRY_MS = int(os.environ.get("SSE_BUSY_RETRY_MS", 5000))
+_open_streams = threading.BoundedSemaphore(SSE_MAX_STREAMS)
+# Most URLs accepted in one bulk submission
+BULK_MAX_URLS = int(os.environ.get("BULK_MAX_URLS", 100))
+# Notion exports running at once; they share one rate-limited Notion client
+NOTION_EXPORT_JOBS = int(os.environ.get("NOTION_EXPORT_JOBS", 2))
+export_scheduler = Scheduler(workers=NOTION_EXPORT_JOBS)
 
+# A submission for a URL whose dossier completed less than this long ago
+# gets that dossier instead of a new job (in-flight jobs are joined while
+# their worker is alive, see job_store.py)
+COALESCE_WINDOW_SECONDS = int(os.environ.get("COALESCE_WINDOW_SECONDS", 10 * 60))
+
+
+def _heartbeat():
+    """Touch the jobs this worker holds (dossiers, including those waiting on
+    a profile batch, and Notion exports), and
+    fail jobs left unfinished by a worker that is gone, e.g. after a
+    restart, so they can be retried and new submissions don't join them."""
+    while True:
+        try:
+            job_store.touch(scheduler.job_ids() | batch_poller.job_ids() | export_scheduler.job_ids())
+            for job_id in job_store.interrupt_stale():
+                metrics.registry.inc("briefcase_jobs_total", status="error")
+                print(f"Job {job_id} was interrupted: its worker stopped updating it")
+        except Exception as e:
+            print(f"Job heartbeat failed: {e}")
+        time.sleep(JOB_HEARTBEAT_SECONDS)
+
+
+threading.Thread(target=_heartbeat, name="job-heartbeat", daemon=True).start()
+
+
+def _progress_updater(job_id):
     def update_progress(pct, step):
-        job["progress"] = pct
-        job["step"] = step
+        # Progress updates double as cancellation points. The cancel request
+        # may have reached another worker, so it is read from the job store
+        scheduler.check(job_id)
+        if job_store.cancel_requested(job_id):
+            raise JobCancelled(job_id)
+        job_store.update(job_id, progress=pct, step=step)
+        job_store.append_event(job_id, "progress", {"progress": pct, "step": step})
+    return update_progress
+
+
+def _member_publisher(job_id):
+    """Publish each enriched member to the job's event stream."""
+    def publish(group_name, idx, member):
+        job_store.append_event(job_id, "member", {"group": group_name, "index": idx, "member": member})
+    return publish
+
+
+def _build_result(job_id, url, team_data, insights):
+    return {
+        "dossier_id": job_id,
+        "company": team_data["company"],
+        "team_count": team_data["team_count"],
+        "groups": team_data["groups"],
+        "insights": insights,
+        "source_url": url,
+    }
+
+
+def _insight_publisher(job_id, url, team_data):
+    """Publish each insight into the job's partial result as soon as it is ready."""
+    ready = []
+
+    def publish(insight):
+        ready.append(insight)
+        job_store.update(job_id, result=_build_result(job_id, url, team_data, list(ready)))
+        job_store.append_event(job_id, "insight", {"index": len(ready) - 1, "insight": insight})
+    return publish
 
+
+@contextmanager
+def _stage(job_id, trace, name):
+    """Time a pipeline stage, then publish the job's timings so far."""
     try:
-        job["status"] = "in_progress"
-        update_progress(5, "Starting...")
-
-        # Step 1-4: Scrape team page and individual profiles
-        team_data = scrape_team(url, progress_callback=update_progress)
-
-        # Step 5: Generate insights
-        insights = generate_insights(team_data, progress_callback=update_progress)
-
-        # Assemble final result
-        result = {
-            "dossier_id": job_id,
-            "company": team_data["company"],
-            "team_count": team_data["team_count"],
-            "groups": team_data["groups"],
-            "insights": insights,
-            "source_url": url,
-        }
-
-        job["result"] = result
-        job["status"] = "complete"
-        job["progress"] = 100
-        job["step"] = "Done"
+        with metrics.stage(name):
+            yield
+    finally:
+        job_store.update(job_id, timings=trace.summary())
 
-    except Exception as e:
-        job["status"] = "error"
-        job["step"] = f"Error: {str(e)}"
-        job["progress"] = 0
-        print(f"Pipeline error for job {job_id}: {e}")
-        import traceback
-        traceback.print_exc()
+
+def _complete_job(job_id, url, team_data, insights):
+    result = _build_result(job_id, url, team_data, insights)
+    job_store.update(job_id, result=result, status="complete", progress=100, step="Done")
+    job_store.append_event(job_id, "complete", {"result": result})
+    metrics.registry.inc("briefcase_jobs_total", status="complete")
+
+
+def _cancel_job(job_id):
+    job_store.update(job_id, status="cancelled", step="Cancelled")
+    job_store.append_event(job_id, "cancelled", {"step": "Cancelled"})
+    metrics.registry.inc("briefcase_jobs_total", status="cancelled")
+    print(f"Job {job_id} cancelled")
+
+
+def _fail_job(job_id, e):
+    job_store.update(job_id, status="error", step=f"Error: {str(e)}", progress=0)
+    metrics.registry.inc("briefcase_jobs_total", status="error")
+    job_store.append_event(job_id, "error", {"step": f"Error: {str(e)}"})
+    print(f"Pipeline error for job {job_id}: {e}")
+    import traceback
+    traceback.print_exc()
+
+
+def _wait_for_batch(job_id, url, batch_id, priority):
+    """Hand a job over to the batch poller until its profile batch ends, then
+    schedule it again to pick up from its checkpoints."""
+    update_progress = _progress_updater(job_id)
+
+    def on_progress(batch):
+        finished, total = batch_progress(batch)
+        try:
+            update_progress(45, f"Waiting for profile batch ({finished}/{total} done)...")
+        except JobCancelled:
+            _cancel_batch_wait(job_id)
+
+    batch_poller.watch(job_id, batch_id, partial(_schedule_pipeline, job_id, url, True, priority), on_progress)
+
+
+def _cancel_batch_wait(job_id):
+    """Cancel a job waiting on its profile batch. Returns False if it isn't waiting here."""
+    if not batch_poller.cancel(job_id):
+        return False
+    # A retry submits a new batch rather than collecting the cancelled one
+    job_store.save_checkpoint(job_id, BATCH, None)
+    _cancel_job(job_id)
+    return True
+
+
+def _on_loop(coroutine_function):
+    """Call an async_pipeline coroutine function on the worker's event loop and wait for its result."""
+    def call(*args, **kwargs):
+        return async_pipeline.engine.submit(coroutine_function(*args, **kwargs)).result()
+    return call
+
+
+# The I/O behind each pipeline stage, by PIPELINE_MODE. The job bookkeeping
+# around them (checkpoints, progress, events) is shared and runs on the
+# scheduler worker either way
+ENGINES = {
+    "threads": SimpleNamespace(
+        fetch_page=fetch_page,
+        extract_team_structure=extract_team_structure,
+        enrich_team=enrich_team,
+        generate_insights=generate_insights,
+        ProfilePool=ProfilePool,
+    ),
+    "async": SimpleNamespace(
+        fetch_page=_on_loop(async_pipeline.fetch_page),
+        extract_team_structure=_on_loop(async_pipeline.extract_team_structure),
+        enrich_team=_on_loop(async_pipeline.enrich_team),
+        generate_insights=_on_loop(async_pipeline.generate_insights),
+        ProfilePool=async_pipeline.ProfilePool,
+    ),
+}
+
+
+def run_pipeline(job_id, url, batch=False, max_workers=10, priority=INTERACTIVE, mode="threads"):
+    """Run the full scraping + analysis pipeline on a scheduler worker, with
+    the I/O done by the ENGINES[mode].
+    With batch=True profiles are extracted through the Message Batches API,
+    and the worker is freed while the batch processes.
+    Each stage is checkpointed; stages a previous attempt finished are skipped."""
+    engine = ENGINES[mode]
+    update_progress = _progress_updater(job_id)
+    checkpoint = Checkpoint(job_store, job_id)
+
+    with metrics.trace_job() as trace:
+        try:
+            job_store.update(job_id, status="in_progress")
+            update_progress(5, "Resuming..." if checkpoint.get(HTML) is not None else "Starting...")
+
+            # Step 1: Fetch the team page
+            html = checkpoint.get(HTML)
+            if html is None:
+                update_progress(5, "Fetching team page...")
+                with _stage(job_id, trace, "fetch_team_page"):
+                    html = engine.fetch_page(url)
+                checkpoint.save(HTML, html)
+
+            # Step 2: Extract the team structure. Unless profiles go through a
+            # batch, each member's profile is fetched as soon as extraction
+            # has read them, while the rest of the team is still coming in
+            done = checkpoint.members()
+            profile_hashes = checkpoint.profile_hashes()
+            with nullcontext() if batch else engine.ProfilePool(max_workers, profile_hashes, done) as profiles:
+                team_data = checkpoint.get(TEAM)
+                if team_data is None:
+                    update_progress(10, "Analyzing page structure with AI...")
+                    with _stage(job_id, trace, "team_extraction"):
+                        team_data = engine.extract_team_structure(
+                            html, url, found_callback=profiles and profiles.submit
+                        )
+                    checkpoint.save(TEAM, team_data)
+
+                # Step 3-4: Fetch and extract profiles not already checkpointed
+                if batch:
+                    enrich = partial(enrich_team_batch, batch_state=checkpoint.get(BATCH))
+                else:
+                    enrich = partial(engine.enrich_team, profiles=profiles)
+                with _stage(job_id, trace, "profiles"):
+                    try:
+                        team_data = enrich(
+                            team_data,
+                            progress_callback=update_progress,
+                            member_callback=checkpoint.member_saver(profile_hashes, _member_publisher(job_id)),
+                            profile_hashes=profile_hashes,
+                            max_workers=max_workers,
+                            done=done,
+                        )
+                    except BatchPending as pending:
+                        checkpoint.save(BATCH, pending.state)
+                        update_progress(45, "Waiting for profile batch...")
+                        _wait_for_batch(job_id, url, pending.state["id"], priority)
+                        return
+            # Kept so a later refresh can tell which profiles changed
+            job_store.update(job_id, profile_hashes=profile_hashes)
+
+            # Step 5: Generate insights
+            insights = checkpoint.get(INSIGHTS)
+            if insights is None:
+                with _stage(job_id, trace, "insights"):
+                    insights = engine.generate_insights(
+                        team_data,
+                        progress_callback=update_progress,
+                        insight_callback=_insight_publisher(job_id, url, team_data),
+                    )
+                checkpoint.save(INSIGHTS, insights)
+
+            _complete_job(job_id, url, team_data, insights)
+
+        except JobCancelled:
+            _cancel_job(job_id)
+        except Exception as e:
+            _fail_job(job_id, e)
+
+
+def run_refresh(job_id, url, previous_job, max_workers=10):
+    """Refresh a finished dossier into a new job, re-processing only what changed."""
+    update_progress = _progress_updater(job_id)
+
+    with metrics.trace_job() as trace:
+        try:
+            job_store.update(job_id, status="in_progress")
+            update_progress(5, "Starting refresh...")
+
+            profile_hashes = {}
+            with _stage(job_id, trace, "refresh"):
+                team_data, roster_changed = refresh_team(
+                    url,
+                    previous_job["result"],
+                    previous_job.get("profile_hashes") or {},
+                    progress_callback=update_progress,
+                    member_callback=_member_publisher(job_id),
+                    profile_hashes=profile_hashes,
+                    max_workers=max_workers,
+                )
+            job_store.update(job_id, profile_hashes=profile_hashes)
+
+            if roster_changed:
+                with _stage(job_id, trace, "insights"):
+                    insights = generate_insights(
+                        team_data,
+                        progress_callback=update_progress,
+                        insight_callback=_insight_publisher(job_id, url, team_data),
+                    )
+            else:
+                update_progress(95, "Roster unchanged, keeping existing insights...")
+                insights = previous_job["result"]["insights"]
+
+            _complete_job(job_id, url, team_data, insights)
+
+        except JobCancelled:
+            _cancel_job(job_id)
+        except Exception as e:
+            _fail_job(job_id, e)
+
+
+def _submit_job(url, batch, priority):
+    """Queue a pipeline for url, or join a job already running (or recently
+    completed) for the same URL. Returns (job_id, coalesced)."""
+    new_job_id = str(uuid.uuid4())[:8]
+    job_id = job_store.create_or_join(
+        new_job_id, normalize_url(url), COALESCE_WINDOW_SECONDS,
+        url=url, batch=batch, priority=PRIORITY_NAMES[priority],
+    )
+    if job_id != new_job_id:
+        # An interactive user waiting on a queued bulk job moves it up the line
+        if scheduler.promote(job_id, priority):
+            job_store.update(job_id, priority=PRIORITY_NAMES[priority])
+        return job_id, True
+
+    _schedule_pipeline(job_id, url, batch, priority)
+    return job_id, False
+
+
+def _schedule_pipeline(job_id, url, batch, priority):
+    # Batch jobs spend their time waiting on the batch API, not on I/O the loop would help with
+    mode = "async" if PIPELINE_MODE == "async" and not batch else "threads"
+    scheduler.submit(job_id, run_pipeline, job_id, url, batch, PROFILE_WORKERS[priority], priority, mode,
+                     priority=priority)
 
 
 @app.route("/api/dossier", methods=["POST"])
@@ -68,25 +358,36 @@ def create_dossier():
     if not url:
         return jsonify({"error": "URL is required"}), 400
 
-    job_id = str(uuid.uuid4())[:8]
-    jobs[job_id] = {
-        "status": "pending",
-        "progress": 0,
-        "step": "Queued",
-        "result": None,
-    }
+    # Bulk runs can trade latency for cost by batching profile extraction
+    batch = bool(data.get("batch"))
+    job_id, coalesced = _submit_job(url, batch, INTERACTIVE)
 
-    thread = threading.Thread(target=run_pipeline, args=(job_id, url))
-    thread.daemon = True
-    thread.start()
+    return jsonify({"job_id": job_id, "coalesced": coalesced})
 
-    return jsonify({"job_id": job_id})
+
+@app.route("/api/dossiers/batch", methods=["POST"])
+def create_dossiers_batch():
+    """Queue dossier jobs for several URLs at bulk priority."""
+    data = request.get_json()
+    urls = data.get("urls")
+    if not isinstance(urls, list) or not urls or not all(isinstance(u, str) and u for u in urls):
+        return jsonify({"error": "urls must be a non-empty list of URLs"}), 400
+    if len(urls) > BULK_MAX_URLS:
+        return jsonify({"error": f"At most {BULK_MAX_URLS} URLs per batch"}), 400
+
+    batch = bool(data.get("batch"))
+    jobs = []
+    for url in urls:
+        job_id, coalesced = _submit_job(url, batch, BULK)
+        jobs.append({"url": url, "job_id": job_id, "coalesced": coalesced})
+
+    return jsonify({"jobs": jobs})
 
 
 @app.route("/api/dossier/<job_id>", methods=["GET"])
 def get_dossier(job_id):
     """Check status / get result of a dossier job."""
-    job = jobs.get(job_id)
+    job = job_store.get(job_id)
     if not job:
         return jsonify({"error": "Job not found"}), 404
 
@@ -95,23 +396,233 @@ def get_dossier(job_id):
         "progress": job["progress"],
         "step": job["step"],
         "result": job["result"],
+        # Queues are per worker process: null on a worker that doesn't hold the job
+        "queue_position": scheduler.position(job_id),
+        # Breakdown of the latest run: stage wall-clock, operation totals, tokens and cost
+        "timings": job.get("timings"),
     })
 
 
+@app.route("/api/dossier/<job_id>/cancel", methods=["POST"])
+def cancel_dossier(job_id):
+    """Cancel a queued or running dossier job."""
+    job = job_store.get(job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    if job["status"] in FINISHED_STATUSES:
+        return jsonify({"error": f"Job already {job['status']}"}), 400
+
+    if _cancel_batch_wait(job_id):
+        return jsonify({"status": "cancelled"})
+    if scheduler.cancel(job_id) == "queued":
+        _cancel_job(job_id)
+        return jsonify({"status": "cancelled"})
+
+    # Running here or held by another worker: the job stops at its next
+    # progress update (or as soon as it starts, if it is still queued there)
+    job_store.request_cancel(job_id)
+    job_store.update(job_id, step="Cancelling...")
+    return jsonify({"status": "cancelling"})
+
+
+@app.route("/api/dossier/<job_id>/refresh", methods=["POST"])
+def refresh_dossier(job_id):
+    """Start an incremental refresh of a completed dossier as a new job."""
+    job = job_store.get(job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    if job["status"] != "complete":
+        return jsonify({"error": "Dossier not yet complete"}), 400
+
+    new_job_id = str(uuid.uuid4())[:8]
+    job_store.create(
+        new_job_id, url=job["url"], refreshed_from=job_id, priority=PRIORITY_NAMES[INTERACTIVE]
+    )
+    scheduler.submit(
+        new_job_id, run_refresh, new_job_id, job["url"], job, PROFILE_WORKERS[INTERACTIVE], priority=INTERACTIVE
+    )
+
+    return jsonify({"job_id": new_job_id})
+
+
+@app.route("/api/dossier/<job_id>/retry", methods=["POST"])
+def retry_dossier(job_id):
+    """Resume a failed or cancelled dossier from its first incomplete stage."""
+    job = job_store.get(job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    if job["status"] not in ("error", "cancelled"):
+        return jsonify({"error": "Only failed or cancelled dossiers can be retried"}), 400
+
+    priority = {name: p for p, name in PRIORITY_NAMES.items()}.get(job.get("priority"), INTERACTIVE)
+    previous_job = None
+    if job.get("refreshed_from"):
+        # Refreshes aren't checkpointed (they're incremental already) and simply run again
+        previous_job = job_store.get(job["refreshed_from"])
+        if not previous_job or previous_job["status"] != "complete":
+            return jsonify({"error": "The dossier this refreshed is gone; start a new one"}), 400
+
+    job_store.update(job_id, status="pending", progress=0, step="Queued for retry")
+    job_store.append_event(job_id, "retry", {"step": "Queued for retry"})
+    if previous_job:
+        scheduler.submit(job_id, run_refresh, job_id, job["url"], previous_job, PROFILE_WORKERS[priority],
+                         priority=priority)
+    else:
+        _schedule_pipeline(job_id, job["url"], bool(job.get("batch")), priority)
+
+    return jsonify({"job_id": job_id, "status": "pending"})
+
+
+@app.route("/api/dossier/<job_id>/events", methods=["GET"])
+def dossier_events(job_id):
+    """Server-Sent Events stream of a job's progress and result fragments.
+
+    Events: progress, member, insight, then complete (with the full result),
+    error or cancelled. Reconnecting clients resume after the Last-Event-ID header.
+    A retried job logs "retry" and carries on, so an error or cancelled
+    event that a retry superseded is skipped rather than ending the stream.
+    Past SSE_MAX_STREAMS open streams, a stream sends the events so far and
+    closes, and the browser reconnects after SSE_BUSY_RETRY_MS.
+    """
+    if job_store.status(job_id) is None:
+        return jsonify({"error": "Job not found"}), 404
+
+    last_event_id = request.headers.get("Last-Event-ID") or request.args.get("last_event_id") or 0
+    try:
+        last_event_id = int(last_event_id)
+    except ValueError:
+        last_event_id = 0
+
+    held = _open_streams.acquire(blocking=False)
+
+    def stream(last_event_id):
+        yield f"retry: {3000 if held else SSE_BUSY_RETRY_MS}\n\n"
+        last_sent = time.time()
+        while True:
+            events = job_store.events_since(job_id, last_event_id)
+            for i, event in enumerate(events):
+                last_event_id = event["id"]
+                final = event["type"] in ("complete", "error", "cancelled")
+                if final and (i < len(events) - 1 or job_store.status(job_id) not in FINISHED_STATUSES):
+                    continue
+                yield f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event['data'])}\n\n"
+                if final:
+                    return
+            if not held:
+                return
+            if events:
+                last_sent = time.time()
+            else:
+                status = job_store.status(job_id)
+                if status is None:
+                    return
+                if status in FINISHED_STATUSES:
+                    # The final event is appended just after the status is
+                    # written, so it may have arrived since the read above
+                    if not job_store.events_since(job_id, last_event_id):
+                        return
+                    continue
+                if time.time() - last_sent >= SSE_HEARTBEAT_SECONDS:
+                    yield ": heartbeat\n\n"
+                    last_sent = time.time()
+            time.sleep(SSE_POLL_SECONDS)
+
+    response = Response(
+        stream(last_event_id),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+    if held:
+        response.call_on_close(_open_streams.release)
+    return response
+
+
+def _previous_notion_sync(job_id):
+    """Sync state of the Notion page for this dossier, or for the dossier it
+    was refreshed from, so a refreshed dossier updates the same page.
+    Returns (state, id of the job holding it)."""
+    while job_id:
+        job = job_store.get(job_id)
+        if not job:
+            break
+        if job.get("notion_sync"):
+            return job["notion_sync"], job_id
+        job_id = job.get("refreshed_from")
+    return None, None
+
+
+def run_export(job_id, dossier):
+    """Create or update the dossier's Notion page, recording progress on the job as notion_export."""
+    def update_export(**state):
+        job_store.update(job_id, notion_export=state)
+
+    def update_progress(done, total):
+        update_export(
+            status="in_progress",
+            progress=int(done / total * 100) if total else 100,
+            step=f"Uploading blocks ({done}/{total})...",
+        )
+
+    with metrics.trace_job() as trace:
+        try:
+            previous, owner = _previous_notion_sync(job_id)
+            update_export(status="in_progress", progress=0, step="Updating page..." if previous else "Creating page...")
+            with metrics.stage("notion_export"):
+                sync = sync_dossier_page(dossier, previous, progress_callback=update_progress)
+            if owner and owner != job_id:
+                # The page now shows this dossier; the old one's state is stale
+                job_store.update(owner, notion_sync=None)
+            job_store.update(job_id, notion_sync=sync)
+            update_export(status="complete", progress=100, step="Done", notion_url=sync["url"],
+                          timings=trace.summary())
+        except Exception as e:
+            print(f"Notion export error for job {job_id}: {e}")
+            update_export(status="error", progress=0, step=f"Notion export failed: {str(e)}",
+                          timings=trace.summary())
+
+
+def _export_interrupted(job):
+    """Is the job's Notion export unfinished but held by no live worker?
+
+    A worker's heartbeat touches the jobs it is exporting, so an export whose
+    job went untouched for JOB_STALE_SECONDS died with its worker."""
+    export = job.get("notion_export")
+    return bool(export) and export["status"] in ("pending", "in_progress") and untouched(job)
+
+
 @app.route("/api/dossier/<job_id>/export-notion", methods=["POST"])
 def export_to_notion(job_id):
-    """Export a completed dossier to Notion."""
-    job = jobs.get(job_id)
+    """Start exporting a completed dossier to Notion in the background."""
+    job = job_store.get(job_id)
     if not job:
         return jsonify({"error": "Job not found"}), 404
     if job["status"] != "complete":
         return jsonify({"error": "Dossier not yet complete"}), 400
 
-    try:
-        notion_url = create_dossier_page(job["result"])
-        return jsonify({"notion_url": notion_url})
-    except Exception as e:
-        return jsonify({"error": f"Notion export failed: {str(e)}"}), 500
+    export = job.get("notion_export")
+    if export and export["status"] in ("pending", "in_progress") and not _export_interrupted(job):
+        return jsonify(export), 202
+
+    export = {"status": "pending", "progress": 0, "step": "Queued"}
+    job_store.update(job_id, notion_export=export)
+    export_scheduler.submit(job_id, run_export, job_id, job["result"])
+    return jsonify(export), 202
+
+
+@app.route("/api/dossier/<job_id>/export-notion", methods=["GET"])
+def get_notion_export(job_id):
+    """Check status / get the page URL of a dossier's Notion export."""
+    job = job_store.get(job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    if not job.get("notion_export"):
+        return jsonify({"error": "No export started"}), 404
+    if _export_interrupted(job):
+        # Reported as failed, so the client offers to start it again
+        return jsonify({**job["notion_export"], "status": "error",
+                        "step": "Notion export interrupted (the server restarted), start it again"})
+
+    return jsonify(job["notion_export"])
 
 
 @app.route("/api/debug-fetch", methods=["POST"])
@@ -131,6 +642,15 @@ def debug_fetch():
         return jsonify({"error": str(e)})
 
 
+@app.route("/api/metrics", methods=["GET"])
+def get_metrics():
+    """Process-wide metrics in Prometheus text format."""
+    queued, running = scheduler.counts()
+    metrics.registry.set("briefcase_jobs_queued", queued)
+    metrics.registry.set("briefcase_jobs_running", running)
+    return Response(metrics.registry.render(), mimetype="text/plain; version=0.0.4")
+
+
 @app.route("/api/health", methods=["GET"])
 def health():
     return jsonify({"status": "ok"})
@@ -0,0 +1,426 @@
+"""Asyncio implementation of the scraping + analysis pipeline.
+
+An alternative to the thread-per-dossier / ThreadPoolExecutor path: every
+dossier in a worker process runs as a coroutine on one shared event loop,
+so hundreds of in-flight page fetches and Claude calls cost coroutines
+instead of OS threads. Concurrency limits are shared by all active jobs.
+Enable with PIPELINE_MODE=async.
+
+Request building, HTML cleaning, caching and result assembly are shared
+with scraper.py / analyzer.py; only the I/O differs. Anything that blocks
+(the SQLite caches, HTML parsing, and progress and member callbacks,
+which write to the job store) runs in a thread via asyncio.to_thread so
+it doesn't stall every other job on the loop.
+"""
+import os
+import asyncio
+import threading
+import time
+from contextlib import nullcontext
+import httpx
+import adaptive_limit
+import llm_cache
+import metrics
+import router
+import structured_extract
+from analyzer import insights_request, use_digests, digest_requests, synthesis_request, published_once
+from html_chunker import merge_team_data
+from http_client import http as sync_http
+from json_stream import JsonStreamParser
+from fetch_cache import normalize_url
+from singleflight import AsyncSingleFlight
+from rate_limit import retry_after_seconds
+from llm import parse_json_response, cached_system, log_usage, async_anthropic_client, model_aslot
+from prompts import (
+    TEAM_EXTRACTION_PROMPT, PROFILE_EXTRACTION_PROMPT, ANALYSIS_PROMPT, DIGEST_PROMPT, SYNTHESIS_PROMPT,
+)
+from scraper import (
+    page_cache,
+    request_headers,
+    cache_response,
+    team_requests,
+    resolve_member_url,
+    resolve_member_urls,
+    is_member_path,
+    profile_request,
+    empty_profile,
+    content_hash,
+    member_key,
+    list_members,
+    assemble_team,
+)
+
+# Page fetches in flight across all jobs in this worker
+ASYNC_MAX_FETCHES = int(os.environ.get("ASYNC_MAX_FETCHES", 50))
+# Claude calls in flight across all jobs in this worker
+ASYNC_MAX_LLM_CALLS = int(os.environ.get("ASYNC_MAX_LLM_CALLS", 20))
+
+
+class AsyncEngine:
+    """Owns the worker's event loop thread and the clients shared by all jobs.
+
+    The loop is started lazily so it is created after gunicorn forks.
+    """
+
+    def __init__(self):
+        self._loop = None
+        self._lock = threading.Lock()
+
+    def _start(self):
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="async-pipeline", daemon=True).start()
+                self.http = httpx.AsyncClient(
+                    follow_redirects=True,
+                    timeout=30,
+                    limits=httpx.Limits(max_connections=ASYNC_MAX_FETCHES),
+                )
+                self.client = async_anthropic_client()
+                self.fetch_slots = asyncio.Semaphore(ASYNC_MAX_FETCHES)
+                self.llm_slots = asyncio.Semaphore(ASYNC_MAX_LLM_CALLS)
+                self._loop = loop
+        return self._loop
+
+    def submit(self, coro):
+        """Schedule a coroutine on the worker loop; returns a concurrent Future."""
+        return asyncio.run_coroutine_threadsafe(coro, self._start())
+
+    def call_soon(self, fn):
+        """Run fn() on the worker loop, from any thread."""
+        self._start().call_soon_threadsafe(fn)
+
+
+engine = AsyncEngine()
+
+
+async def fetch_page(url, retries=2):
+    """Async counterpart of scraper.fetch_page (same cache and retry rules)."""
+    cached = await asyncio.to_thread(page_cache.lookup, url) if page_cache else None
+    if cached and cached.fresh:
+        return cached.body
+
+    headers = request_headers(cached)
+    limit = adaptive_limit.host_limit(url)
+    with metrics.span("fetch_page"):
+        for attempt in range(retries + 1):
+            # The host's adaptive limit first, so a slow host doesn't tie up engine-wide slots
+            async with limit.aslot() as slot, engine.fetch_slots:
+                resp = None
+                if not sync_http.needs_cloudscraper(url):
+                    resp = await engine.http.get(url, headers=headers)
+                    if resp.status_code == 403:
+                        sync_http.mark_cloudscraper(url)
+                        resp = None
+                if resp is None:
+                    # cloudscraper is synchronous; run it off the loop
+                    resp = await asyncio.to_thread(sync_http.get, url, headers, 30)
+                if resp.status_code in adaptive_limit.OVERLOAD_STATUSES:
+                    slot.overloaded(retry_after_seconds(resp.headers) or 2 * (attempt + 1))
+            if resp.status_code == 304 and cached:
+                await asyncio.to_thread(page_cache.revalidated, url)
+                return cached.body
+            if attempt < retries and resp.status_code in adaptive_limit.OVERLOAD_STATUSES:
+                metrics.record_retry("fetch")
+                continue
+            resp.raise_for_status()
+            await asyncio.to_thread(cache_response, url, resp)
+            return resp.text
+
+
+async def _complete_json(label, route, instructions, content):
+    async with model_aslot(route.model), engine.llm_slots:
+        started = time.perf_counter()
+        message = await engine.client.messages.create(
+            model=route.model,
+            max_tokens=route.max_tokens,
+            timeout=route.timeout,
+            system=cached_system(instructions),
+            messages=[
+                {
+                    "role": "user",
+                    "content": content,
+                }
+            ],
+        )
+    log_usage(label, message.usage, route.model, time.perf_counter() - started)
+    return parse_json_response(message.content[0].text)
+
+
+async def _stream_json(label, route, instructions, content, want, value_callback):
+    """Async counterpart of llm.stream_json; value_callback is a coroutine function."""
+    parser = JsonStreamParser(want)
+    async with model_aslot(route.model), engine.llm_slots:
+        started = time.perf_counter()
+        async with engine.client.messages.stream(
+            model=route.model,
+            max_tokens=route.max_tokens,
+            timeout=route.timeout,
+            system=cached_system(instructions),
+            messages=[
+                {
+                    "role": "user",
+                    "content": content,
+                }
+            ],
+        ) as stream:
+            async for text in stream.text_stream:
+                for path, value in parser.feed(text):
+                    await value_callback(path, value)
+            message = await stream.get_final_message()
+
+    log_usage(label, message.usage, route.model, time.perf_counter() - started)
+    return parse_json_response(message.content[0].text)
+
+
+async def _extract_team_chunk(route, content, found_callback=None):
+    team_data = await asyncio.to_thread(llm_cache.lookup, route.model, TEAM_EXTRACTION_PROMPT, content)
+    if team_data is None:
+        if found_callback:
+            async def found(path, member):
+                found_callback(member)
+
+            def call(r):
+                return _stream_json("Team extraction", r, TEAM_EXTRACTION_PROMPT, content, is_member_path, found)
+        else:
+            def call(r):
+                return _complete_json("Team extraction", r, TEAM_EXTRACTION_PROMPT, content)
+        team_data = await router.acall(route, call)
+        await asyncio.to_thread(llm_cache.store, route.model, TEAM_EXTRACTION_PROMPT, content, team_data)
+    elif found_callback:
+        for _, _, member in list_members(team_data.get("groups", [])):
+            found_callback(member)
+    return team_data
+
+
+async def extract_team_structure(html, url, found_callback=None):
+    """Async counterpart of scraper.extract_team_structure; found_callback is called on the loop."""
+    # HTML parsing and cleaning are CPU-bound, keep them off the loop
+    fast = await asyncio.to_thread(structured_extract.extract_team, html, url)
+    if fast:
+        team_data, method = fast
+        print(f"Team structure read from {method}, skipping Claude")
+        return resolve_member_urls(team_data, url)
+
+    found = found_callback and (lambda member: found_callback(resolve_member_url(member, url)))
+    requests = await asyncio.to_thread(team_requests, html, url)
+    parts = await asyncio.gather(*(_extract_team_chunk(route, content, found) for route, content in requests))
+    parts = [resolve_member_urls(part, url) for part in parts]
+    return parts[0] if len(parts) == 1 else merge_team_data(parts)
+
+
+async def _load_profile(member):
+    """Fetch and extract a profile page. Returns (profile data, content hash)."""
+    html = await fetch_page(member["profile_url"])
+    route, content = await asyncio.to_thread(profile_request, member, html)
+    profile_data = await asyncio.to_thread(structured_extract.extract_profile, html, member)
+    if profile_data is None:
+        profile_data = await asyncio.to_thread(router.short_profile, html, member)
+    if profile_data is None:
+        profile_data = await asyncio.to_thread(llm_cache.lookup, route.model, PROFILE_EXTRACTION_PROMPT, content)
+    if profile_data is None:
+        label = f"Profile extraction ({member['name']})"
+        profile_data = await router.acall(
+            route, lambda r: _complete_json(label, r, PROFILE_EXTRACTION_PROMPT, content)
+        )
+        await asyncio.to_thread(llm_cache.store, route.model, PROFILE_EXTRACTION_PROMPT, content, profile_data)
+    return profile_data, content_hash(content)
+
+
+# Jobs on the loop scraping the same profile share one fetch + extraction
+profile_flights = AsyncSingleFlight()
+
+
+async def fetch_profile(member, profile_hashes=None):
+    if not member.get("profile_url"):
+        return empty_profile(member)
+
+    try:
+        profile_data, digest = await profile_flights.do(
+            normalize_url(member["profile_url"]), _load_profile, member
+        )
+        if profile_hashes is not None:
+            profile_hashes[member_key(member)] = digest
+        return {**member, **profile_data}
+
+    except Exception as e:
+        print(f"Error fetching profile for {member['name']}: {e}")
+        return empty_profile(member)
+
+
+class ProfilePool:
+    """Async counterpart of scraper.ProfilePool: one task per member, at most
+    max_workers of them fetching at once. Members are submitted on the
+    engine's loop; the pool itself may be entered and left from any thread."""
+
+    def __init__(self, max_workers, profile_hashes=None, done=None):
+        self.profile_hashes = profile_hashes
+        self.done = done or {}
+        # This job's share of the engine-wide fetch/LLM slots
+        self._slots = asyncio.Semaphore(max_workers)
+        self._tasks = {}
+
+    async def _fetch(self, member):
+        async with self._slots:
+            return await fetch_profile(member, self.profile_hashes)
+
+    def submit(self, member):
+        """Start on member's profile; returns its Task (None for a member in done)."""
+        key = member_key(member)
+        if key in self.done:
+            return None
+        task = self._tasks.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch(member))
+            self._tasks[key] = task
+        return task
+
+    def __enter__(self):
+        return self
+
+    def _cancel(self):
+        for task in self._tasks.values():
+            task.cancel()
+
+    def __exit__(self, *exc):
+        engine.call_soon(self._cancel)
+
+
+async def scrape_team(url, progress_callback=None, member_callback=None, profile_hashes=None, max_workers=10):
+    """Async counterpart of scraper.scrape_team, with the same progress steps."""
+    if progress_callback:
+        await asyncio.to_thread(progress_callback, 5, "Fetching team page...")
+
+    html = await fetch_page(url)
+
+    if progress_callback:
+        await asyncio.to_thread(progress_callback, 10, "Analyzing page structure with AI...")
+
+    with ProfilePool(max_workers, profile_hashes) as profiles:
+        team_data = await extract_team_structure(html, url, found_callback=profiles.submit)
+        return await enrich_team(team_data, progress_callback, member_callback, profile_hashes, max_workers,
+                                 profiles=profiles)
+
+
+async def enrich_team(team_data, progress_callback=None, member_callback=None, profile_hashes=None, max_workers=10,
+                      done=None, profiles=None):
+    """Async counterpart of scraper.enrich_team."""
+    company = team_data.get("company", "Unknown Company")
+    groups = team_data.get("groups", [])
+    done = done or {}
+
+    all_members = list_members(groups)
+    total_members = len(all_members)
+
+    if progress_callback:
+        await asyncio.to_thread(
+            progress_callback, 20, f"Found {total_members} team members. Fetching individual profiles..."
+        )
+
+    enriched_groups = {g["name"]: [] for g in groups}
+    pending = []
+    for group_name, idx, member in all_members:
+        if member_key(member) in done:
+            enriched_groups[group_name].append((idx, done[member_key(member)]))
+        else:
+            pending.append((group_name, idx, member))
+    completed = total_members - len(pending)
+
+    async def ready(task):
+        return task, await task
+
+    waiting = {}
+    with nullcontext(profiles) if profiles else ProfilePool(max_workers, profile_hashes) as profiles:
+        for group_name, idx, member in pending:
+            waiting.setdefault(profiles.submit(member), []).append((group_name, idx, member))
+        # Leaving the pool on an error (e.g. the job was cancelled) stops the remaining profiles
+        for next_done in asyncio.as_completed([ready(task) for task in waiting]):
+            task, profile = await next_done
+            for group_name, idx, member in waiting[task]:
+                enriched_member = {**profile, **member}
+                enriched_groups[group_name].append((idx, enriched_member))
+                if member_callback:
+                    await asyncio.to_thread(member_callback, group_name, idx, enriched_member)
+                completed += 1
+                if progress_callback:
+                    pct = 20 + int((completed / total_members) * 50)
+                    step = f"Fetching profiles ({completed}/{total_members})..."
+                    await asyncio.to_thread(progress_callback, pct, step)
+
+    return assemble_team(company, groups, enriched_groups)
+
+
+async def _digest(label, route, content):
+    digest = await asyncio.to_thread(llm_cache.lookup, route.model, DIGEST_PROMPT, content)
+    if digest is None:
+        digest = await router.acall(
+            route, lambda r: _complete_json(f"Insight digest ({label})", r, DIGEST_PROMPT, content)
+        )
+        await asyncio.to_thread(llm_cache.store, route.model, DIGEST_PROMPT, content, digest)
+    return digest
+
+
+async def summarize_groups(team_data, progress_callback=None):
+    """Async counterpart of analyzer.summarize_groups."""
+    requests = digest_requests(team_data)
+    if progress_callback:
+        await asyncio.to_thread(
+            progress_callback, 75, f"Summarizing {team_data['team_count']} people in {len(requests)} parts..."
+        )
+
+    async def digest(i, request):
+        return i, await _digest(*request)
+
+    digests = [None] * len(requests)
+    tasks = [asyncio.ensure_future(digest(i, request)) for i, request in enumerate(requests)]
+    try:
+        for done, next_done in enumerate(asyncio.as_completed(tasks), 1):
+            i, digests[i] = await next_done
+            if progress_callback:
+                await asyncio.to_thread(progress_callback, 75, f"Summarizing team ({done}/{len(requests)} parts)...")
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        raise
+    return digests
+
+
+async def _stream_insights(route, instructions, prompt, progress_callback, publish):
+    async def section_ready(path, insight):
+        ready = path[0] + 1
+        await asyncio.to_thread(publish, path[0], insight)
+        if progress_callback:
+            await asyncio.to_thread(
+                progress_callback, 75 + min(ready, 6) * 3, f"Generating deep insights ({ready} sections ready)..."
+            )
+
+    return await _stream_json(
+        "Insight generation", route, instructions, prompt, lambda path: len(path) == 1, section_ready
+    )
+
+
+async def generate_insights(team_data, progress_callback=None, insight_callback=None):
+    """Async counterpart of analyzer.generate_insights, streaming the same way."""
+    if use_digests(team_data):
+        digests = await summarize_groups(team_data, progress_callback)
+        instructions = SYNTHESIS_PROMPT
+        route, prompt = synthesis_request(team_data, digests)
+    else:
+        instructions = ANALYSIS_PROMPT
+        route, prompt = insights_request(team_data)
+
+    if progress_callback:
+        await asyncio.to_thread(progress_callback, 75, "Generating deep insights with AI (this may take a minute)...")
+
+    insights = await asyncio.to_thread(llm_cache.lookup, route.model, instructions, prompt)
+    if insights is None:
+        publish = published_once(insight_callback)
+        insights = await router.acall(
+            route, lambda r: _stream_insights(r, instructions, prompt, progress_callback, publish)
+        )
+        await asyncio.to_thread(llm_cache.store, route.model, instructions, prompt, insights)
+
+    if progress_callback:
+        await asyncio.to_thread(progress_callback, 95, "Finalizing dossier...")
+
+    return insights
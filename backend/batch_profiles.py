@@ -0,0 +1,328 @@
+"""Bulk profile extraction through the Anthropic Message Batches API.
+
+For overnight runs throughput and cost matter more than latency: instead of
+one synchronous Haiku call per member, every profile extraction for a
+dossier is submitted as a single message batch and the results are mapped
+back to members by custom_id. A bulk submission gets one batch per dossier.
+
+A batch can take hours, so the job doesn't wait for it on a scheduler
+worker: enrich_team_batch raises BatchPending once it is submitted, the
+job hands it to the process's BatchPoller and is scheduled again, picking
+the batch up from its checkpoint, when it has ended.
+
+Set PROFILE_BATCH_BACKEND=local to use LocalBatchClient, an in-process
+stand-in for the batch API, so the mode can be exercised offline.
+"""
+import os
+import json
+import time
+import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+import llm_cache
+import metrics
+import router
+import structured_extract
+from llm import parse_json_response, cached_system, log_usage
+from prompts import PROFILE_EXTRACTION_PROMPT
+from scraper import (
+    client,
+    fetch_page,
+    profile_request,
+    empty_profile,
+    content_hash,
+    member_key,
+    list_members,
+    assemble_team,
+)
+
+PROFILE_BATCH_BACKEND = os.environ.get("PROFILE_BATCH_BACKEND", "anthropic")
+# How often to check on a submitted batch
+BATCH_POLL_SECONDS = int(os.environ.get("BATCH_POLL_SECONDS", 30))
+
+
+def _empty_profile_response(params):
+    return json.dumps({"bio": None, "education": [], "career": [], "personal": []})
+
+
+class LocalBatchClient:
+    """Offline stand-in for client.messages.batches.
+
+    Batches "process" for `processing_seconds` and then every request is
+    answered by `responder(params) -> response text`. Returned objects have
+    the same shape as the SDK's, so callers can't tell the difference.
+    """
+
+    def __init__(self, responder=_empty_profile_response, processing_seconds=0):
+        self.responder = responder
+        self.processing_seconds = processing_seconds
+        self._batches = {}
+
+    def create(self, requests):
+        batch_id = f"msgbatch_local_{uuid.uuid4().hex[:12]}"
+        self._batches[batch_id] = {"requests": list(requests), "created_at": time.time(), "canceled": False}
+        return self.retrieve(batch_id)
+
+    def retrieve(self, batch_id):
+        batch = self._batches[batch_id]
+        canceled = batch["canceled"]
+        ended = canceled or time.time() - batch["created_at"] >= self.processing_seconds
+        count = len(batch["requests"])
+        return SimpleNamespace(
+            id=batch_id,
+            processing_status="ended" if ended else "in_progress",
+            request_counts=SimpleNamespace(
+                processing=0 if ended else count,
+                succeeded=count if ended and not canceled else 0,
+                errored=0,
+                canceled=count if canceled else 0,
+                expired=0,
+            ),
+        )
+
+    def cancel(self, batch_id):
+        self._batches[batch_id]["canceled"] = True
+        return self.retrieve(batch_id)
+
+    def results(self, batch_id):
+        for request in self._batches[batch_id]["requests"]:
+            if self._batches[batch_id]["canceled"]:
+                yield SimpleNamespace(custom_id=request["custom_id"], result=SimpleNamespace(type="canceled"))
+                continue
+            text = self.responder(request["params"])
+            message = SimpleNamespace(
+                content=[SimpleNamespace(type="text", text=text)],
+                usage=SimpleNamespace(input_tokens=0, output_tokens=0),
+            )
+            yield SimpleNamespace(
+                custom_id=request["custom_id"],
+                result=SimpleNamespace(type="succeeded", message=message),
+            )
+
+
+_local_batches = LocalBatchClient()
+
+
+def _batches_api():
+    if PROFILE_BATCH_BACKEND == "local":
+        # One client per process, so a resumed job finds the batch it submitted
+        return _local_batches
+    return client.messages.batches
+
+
+class BatchPending(Exception):
+    """Raised by enrich_team_batch while its profile batch is still processing.
+
+    `state` is what the job checkpoints to pick the batch up again: the
+    batch id and, for each custom_id, the member key, model and content.
+    """
+
+    def __init__(self, state):
+        super().__init__(f"Profile batch {state['id']} is still processing")
+        self.state = state
+
+
+class BatchPoller:
+    """One thread that checks on every pending profile batch in the process.
+
+    A job waiting on a batch is handed over here and gives up its scheduler
+    worker; on_end is called (on the poller thread) once the batch ends.
+    """
+
+    def __init__(self, poll_seconds=BATCH_POLL_SECONDS):
+        self.poll_seconds = poll_seconds
+        self._watched = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def watch(self, job_id, batch_id, on_end, on_progress=None):
+        """Call on_progress(batch) on each poll and on_end() once batch_id has ended."""
+        with self._lock:
+            self._watched[job_id] = (batch_id, on_end, on_progress)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._poll, name="batch-poller", daemon=True)
+                self._thread.start()
+
+    def cancel(self, job_id):
+        """Stop waiting for job_id and cancel its batch. Returns True if it was waiting."""
+        with self._lock:
+            watched = self._watched.pop(job_id, None)
+        if watched is None:
+            return False
+        try:
+            _batches_api().cancel(watched[0])
+        except Exception as e:
+            print(f"Error cancelling profile batch {watched[0]}: {e}")
+        return True
+
+    def job_ids(self):
+        """Ids of the jobs waiting on a batch here."""
+        with self._lock:
+            return set(self._watched)
+
+    def _poll(self):
+        while True:
+            time.sleep(self.poll_seconds)
+            with self._lock:
+                watched = dict(self._watched)
+            for job_id, (batch_id, on_end, on_progress) in watched.items():
+                try:
+                    batch = _batches_api().retrieve(batch_id)
+                    if batch.processing_status != "ended":
+                        if on_progress:
+                            on_progress(batch)
+                        continue
+                    with self._lock:
+                        # Cancelled while we were retrieving it
+                        if self._watched.pop(job_id, None) is None:
+                            continue
+                    on_end()
+                except Exception as e:
+                    print(f"Error polling profile batch {batch_id}: {e}")
+
+
+poller = BatchPoller()
+
+
+def batch_progress(batch):
+    """(finished, total) requests of a batch."""
+    counts = batch.request_counts
+    finished = counts.succeeded + counts.errored + counts.canceled + counts.expired
+    return finished, finished + counts.processing
+
+
+def _batch_texts(batches, state):
+    """{custom_id: response text} for an ended batch's succeeded requests."""
+    texts = {}
+    for entry in batches.results(state["id"]):
+        if entry.result.type == "succeeded":
+            message = entry.result.message
+            model = state["requests"][entry.custom_id]["model"]
+            log_usage(f"Batch profile extraction ({entry.custom_id})", message.usage, model, batch=True)
+            texts[entry.custom_id] = message.content[0].text
+        else:
+            print(f"Batch request {entry.custom_id} {entry.result.type}")
+    return texts
+
+
+def _submit_profiles(members, batches, profile_hashes, max_workers, found):
+    """Extract what can be without Claude and submit the rest as one batch.
+
+    Profile pages are fetched concurrently first; structured data, short
+    pages and cached extractions are used where they can be. found(i,
+    member) is called for each member that is finished now. Returns the
+    batch state (see BatchPending), or None when nothing was submitted.
+    """
+    def fetch(member):
+        try:
+            return fetch_page(member["profile_url"])
+        except Exception as e:
+            print(f"Error fetching profile for {member['name']}: {e}")
+            return None
+
+    indices = [i for i, m in enumerate(members) if m.get("profile_url")]
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pages = dict(zip(indices, executor.map(metrics.in_context(fetch), [members[i] for i in indices])))
+
+    state = {"requests": {}}
+    requests = []
+    for i, member in enumerate(members):
+        html = pages.get(i)
+        if html is None:
+            found(i, empty_profile(member))
+            continue
+        route, content = profile_request(member, html)
+        profile_data = structured_extract.extract_profile(html, member) or router.short_profile(html, member)
+        if profile_data is None:
+            profile_data = llm_cache.lookup(route.model, PROFILE_EXTRACTION_PROMPT, content)
+        if profile_data is not None:
+            # Only for extracted profiles, so a failed one is tried again next time
+            if profile_hashes is not None:
+                profile_hashes[member_key(member)] = content_hash(content)
+            found(i, {**member, **profile_data})
+            continue
+        custom_id = f"member-{i}"
+        state["requests"][custom_id] = {"key": member_key(member), "model": route.model, "content": content}
+        router.record(route)
+        requests.append({
+            "custom_id": custom_id,
+            "params": {
+                "model": route.model,
+                "max_tokens": route.max_tokens,
+                "system": cached_system(PROFILE_EXTRACTION_PROMPT),
+                "messages": [{"role": "user", "content": content}],
+            },
+        })
+
+    if not requests:
+        return None
+    state["id"] = batches.create(requests=requests).id
+    return state
+
+
+def enrich_team_batch(team_data, progress_callback=None, member_callback=None, profile_hashes=None, max_workers=10,
+                      done=None, batch_state=None):
+    """Counterpart of scraper.enrich_team that extracts profiles via a batch.
+
+    The first call submits the batch and raises BatchPending. Once the
+    batch has ended, call again with its state to collect the profiles;
+    members finished before it was submitted are expected back in done.
+    """
+    batches = _batches_api()
+    groups = team_data.get("groups", [])
+    done = done or {}
+    all_members = list_members(groups)
+    pending = [(gn, idx, m) for gn, idx, m in all_members if member_key(m) not in done]
+
+    enriched_groups = {g["name"]: [] for g in groups}
+    for group_name, idx, member in all_members:
+        if member_key(member) in done:
+            enriched_groups[group_name].append((idx, done[member_key(member)]))
+
+    def found(group_name, idx, member):
+        enriched_groups[group_name].append((idx, member))
+        if member_callback:
+            member_callback(group_name, idx, member)
+
+    if batch_state is None:
+        if progress_callback:
+            progress_callback(20, f"Found {len(all_members)} team members. Submitting profile batch...")
+        members = [m for _, _, m in pending]
+        batch_state = _submit_profiles(
+            members, batches, profile_hashes, max_workers,
+            lambda i, member: found(pending[i][0], pending[i][1], member),
+        )
+        if batch_state is not None:
+            raise BatchPending(batch_state)
+    elif pending:
+        if batches.retrieve(batch_state["id"]).processing_status != "ended":
+            raise BatchPending(batch_state)
+        texts = _batch_texts(batches, batch_state)
+        by_key = {request["key"]: (custom_id, request) for custom_id, request in batch_state["requests"].items()}
+        for group_name, idx, member in pending:
+            custom_id, request = by_key.get(member_key(member), (None, None))
+            if request is None:
+                # Its profile page failed before the batch, and it was published then
+                enriched_groups[group_name].append((idx, empty_profile(member)))
+                continue
+            if custom_id not in texts:
+                # Left unextracted (and unhashed), so the next run tries it again
+                found(group_name, idx, empty_profile(member))
+                continue
+            try:
+                profile_data = parse_json_response(texts[custom_id])
+                if not router.valid("profile", profile_data):
+                    raise ValueError("unexpected profile output shape")
+            except ValueError as e:
+                print(f"Error parsing batch profile for {member['name']}: {e}")
+                found(group_name, idx, empty_profile(member))
+                continue
+            llm_cache.store(request["model"], PROFILE_EXTRACTION_PROMPT, request["content"], profile_data)
+            if profile_hashes is not None:
+                profile_hashes[member_key(member)] = content_hash(request["content"])
+            found(group_name, idx, {**member, **profile_data})
+
+    if progress_callback:
+        progress_callback(70, "Profile batch complete.")
+    return assemble_team(team_data.get("company", "Unknown Company"), groups, enriched_groups)
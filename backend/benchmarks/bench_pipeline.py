@@ -0,0 +1,346 @@
+"""End-to-end pipeline benchmark against local stand-ins (no network, no API keys).
+
+Usage (from backend/):
+    python benchmarks/bench_pipeline.py [--sizes 10,50,100] [--concurrency 5,10] [--runs 3]
+                                        [--scenarios scrape,insights,notion,api] [--mode threads|async]
+                                        [--json results.json] [--baseline results.json] [--no-memory]
+
+Starts benchmarks/standins.py in a subprocess (team sites, Anthropic and
+Notion with configurable latency and rate limits; see --help) and points
+the pipeline at it. Fetch and LLM caches are disabled, and every run uses
+fresh URLs, so nothing is served from a cache or coalesced.
+
+Scenarios, each at every team size:
+    scrape    scraper.scrape_team (or the async engine) at each profile concurrency
+    insights  analyzer.generate_insights
+    notion    notion_builder.sync_dossier_page into a new page
+    api       POST /api/dossier for `concurrency` teams at once, polling until complete
+    fixture   scrape_team on the recorded team_large.html (the structured fast path)
+
+For each scenario the report gives p50/p95 latency, throughput, CPU seconds
+per run (this process only) and peak Python memory (tracemalloc, which
+slows things down; --no-memory turns it off), followed by where the time
+went (stage and operation totals from metrics.py). --json saves the rows
+and --baseline compares p50s against a saved run.
+"""
+import os
+import sys
+import json
+import math
+import time
+import uuid
+import socket
+import argparse
+import statistics
+import subprocess
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_standins(args):
+    """Run the stand-in servers in a subprocess. Returns (process, site URL)."""
+    ports = {name: free_port() for name in ("site", "anthropic", "notion")}
+    proc = subprocess.Popen(
+        [
+            sys.executable, os.path.join(BENCH_DIR, "standins.py"),
+            "--site-port", str(ports["site"]),
+            "--anthropic-port", str(ports["anthropic"]),
+            "--notion-port", str(ports["notion"]),
+            "--site-latency", str(args.site_latency),
+            "--anthropic-latency", str(args.anthropic_latency),
+            "--anthropic-tps", str(args.anthropic_tps),
+            "--anthropic-rpm", str(args.anthropic_rpm),
+            "--notion-latency", str(args.notion_latency),
+            "--notion-rps", str(args.notion_rps),
+        ],
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    if proc.stdout.readline().strip() != "ready":
+        raise RuntimeError("stand-in servers failed to start")
+
+    # Must be set before the pipeline modules are imported
+    os.environ.update({
+        "ANTHROPIC_BASE_URL": f"http://127.0.0.1:{ports['anthropic']}",
+        "ANTHROPIC_API_KEY": "benchmark",
+        "NOTION_API_URL": f"http://127.0.0.1:{ports['notion']}/v1",
+        "NOTION_TOKEN": "benchmark",
+        "NOTION_DATABASE_ID": "benchmark",
+        "FETCH_CACHE_ENABLED": "0",
+        "LLM_CACHE_ENABLED": "0",
+        "JOB_STORE": "memory",
+        "PIPELINE_MODE": args.mode,
+        "COALESCE_WINDOW_SECONDS": "0",
+    })
+    return proc, f"http://127.0.0.1:{ports['site']}"
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile."""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+class Measurement:
+    """Collects per-run latencies, traces, CPU time and peak memory for one row."""
+
+    def __init__(self, scenario, size, concurrency, memory):
+        self.row = {"scenario": scenario, "size": size, "concurrency": concurrency}
+        self.latencies = []
+        self.traces = []
+        self.memory = memory
+
+    def __enter__(self):
+        if self.memory:
+            tracemalloc.reset_peak()
+        self._cpu = time.process_time()
+        self._wall = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        wall = time.perf_counter() - self._wall
+        cpu = time.process_time() - self._cpu
+        runs = len(self.latencies)
+        self.row.update({
+            "runs": runs,
+            "p50": statistics.median(self.latencies),
+            "p95": percentile(self.latencies, 95),
+            "throughput": self.row.get("items", runs) / wall,
+            "cpu_per_run": cpu / runs,
+            "peak_mb": tracemalloc.get_traced_memory()[1] / 1e6 if self.memory else None,
+            "breakdown": _breakdown(self.traces),
+        })
+
+    def timed(self, fn, *args, **kwargs):
+        import metrics
+        with metrics.trace_job() as trace:
+            start = time.perf_counter()
+            result = fn(*args, **kwargs)
+            self.latencies.append(time.perf_counter() - start)
+        self.traces.append(trace.summary())
+        return result
+
+
+def _breakdown(traces):
+    """Mean seconds per run of each stage and operation."""
+    totals = {}
+    for trace in traces:
+        for kind in ("stages", "operations"):
+            for name, value in trace.get(kind, {}).items():
+                totals[f"{kind[:-1]}:{name}"] = totals.get(f"{kind[:-1]}:{name}", 0) + value["seconds"]
+    return {name: seconds / len(traces) for name, seconds in sorted(totals.items())} if traces else {}
+
+
+def team_url(site, size):
+    return f"{site}/team/{size}/{uuid.uuid4().hex[:8]}"
+
+
+def bench_scrape(site, args, sizes, concurrency):
+    import scraper
+    import async_pipeline
+
+    def scrape(url, workers):
+        if args.mode == "async":
+            return async_pipeline.engine.submit(async_pipeline.scrape_team(url, max_workers=workers)).result()
+        return scraper.scrape_team(url, max_workers=workers)
+
+    for size in sizes:
+        for workers in concurrency:
+            m = Measurement("scrape", size, workers, not args.no_memory)
+            m.row["items"] = size * args.runs
+            with m:
+                for _ in range(args.runs):
+                    m.timed(scrape, team_url(site, size), workers)
+            m.row["unit"] = "profiles/s"
+            yield m.row
+
+
+def bench_fixture(site, args, sizes, concurrency):
+    import scraper
+
+    for workers in concurrency:
+        m = Measurement("fixture", "team_large", workers, not args.no_memory)
+        with m:
+            for _ in range(args.runs):
+                # A query string makes every run's URLs distinct
+                m.timed(scraper.scrape_team, f"{site}/fixtures/team_large.html?run={uuid.uuid4().hex[:8]}",
+                        max_workers=workers)
+        m.row["unit"] = "runs/s"
+        yield m.row
+
+
+def _team_data(site, size):
+    import scraper
+    return scraper.scrape_team(team_url(site, size), max_workers=20)
+
+
+def bench_insights(site, args, sizes, concurrency):
+    import analyzer
+    import async_pipeline
+
+    for size in sizes:
+        team_data = _team_data(site, size)
+        m = Measurement("insights", size, None, not args.no_memory)
+        with m:
+            for _ in range(args.runs):
+                if args.mode == "async":
+                    m.timed(lambda: async_pipeline.engine.submit(async_pipeline.generate_insights(team_data)).result())
+                else:
+                    m.timed(analyzer.generate_insights, team_data)
+        m.row["unit"] = "runs/s"
+        yield m.row
+
+
+def bench_notion(site, args, sizes, concurrency):
+    import analyzer
+    from notion_builder import sync_dossier_page
+
+    for size in sizes:
+        team_data = _team_data(site, size)
+        dossier = {
+            "dossier_id": "benchmark",
+            "company": team_data["company"],
+            "team_count": team_data["team_count"],
+            "groups": team_data["groups"],
+            "insights": analyzer.generate_insights(team_data),
+            "source_url": site,
+        }
+        m = Measurement("notion", size, None, not args.no_memory)
+        with m:
+            for _ in range(args.runs):
+                m.timed(sync_dossier_page, dossier)
+        m.row["unit"] = "pages/s"
+        yield m.row
+
+
+def bench_api(site, args, sizes, concurrency):
+    import app
+
+    client = app.app.test_client()
+
+    def run_job(size):
+        """Submit one dossier and poll until it finishes. Returns (seconds, timings)."""
+        start = time.perf_counter()
+        job_id = client.post("/api/dossier", json={"url": team_url(site, size)}).get_json()["job_id"]
+        while True:
+            job = client.get(f"/api/dossier/{job_id}").get_json()
+            if job["status"] in ("complete", "error", "cancelled"):
+                if job["status"] != "complete":
+                    raise RuntimeError(f"job {job_id} ended with {job['status']}: {job['step']}")
+                return time.perf_counter() - start, job["timings"]
+            time.sleep(0.02)
+
+    for size in sizes:
+        for jobs in concurrency:
+            m = Measurement("api", size, jobs, not args.no_memory)
+            m.row["items"] = jobs * args.runs
+            with m:
+                for _ in range(args.runs):
+                    with ThreadPoolExecutor(max_workers=jobs) as pool:
+                        for seconds, timings in pool.map(run_job, [size] * jobs):
+                            m.latencies.append(seconds)
+                            m.traces.append(timings)
+            m.row["unit"] = "dossiers/s"
+            yield m.row
+
+
+SCENARIOS = {
+    "scrape": bench_scrape,
+    "fixture": bench_fixture,
+    "insights": bench_insights,
+    "notion": bench_notion,
+    "api": bench_api,
+}
+
+
+def _key(row):
+    return row["scenario"], str(row["size"]), str(row["concurrency"])
+
+
+def report(rows, baseline=None):
+    base = {_key(row): row for row in baseline or []}
+    header = (
+        f"{'scenario':<10}{'size':>11}{'conc':>6}{'runs':>6}{'p50 s':>9}{'p95 s':>9}"
+        f"{'throughput':>22}{'cpu s/run':>11}{'peak MB':>9}"
+    )
+    if baseline:
+        header += f"{'p50 vs base':>13}"
+    print(header)
+    for row in rows:
+        peak = f"{row['peak_mb']:.1f}" if row["peak_mb"] is not None else "-"
+        line = (
+            f"{row['scenario']:<10}{str(row['size']):>11}{str(row['concurrency'] or '-'):>6}{row['runs']:>6}"
+            f"{row['p50']:>9.3f}{row['p95']:>9.3f}{row['throughput']:>11.2f} {row['unit']:<10}"
+            f"{row['cpu_per_run']:>11.3f}{peak:>9}"
+        )
+        previous = base.get(_key(row))
+        if previous:
+            line += f"{(row['p50'] - previous['p50']) / previous['p50'] * 100:>+12.1f}%"
+        print(line)
+
+    print("\nMean seconds per run (operations are summed over concurrent calls):")
+    for row in rows:
+        parts = ", ".join(f"{name} {seconds:.3f}" for name, seconds in row["breakdown"].items())
+        print(f"  {row['scenario']} {row['size']} x{row['concurrency'] or 1}: {parts or '-'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", default="10,50,100", help="team sizes, comma-separated")
+    parser.add_argument("--concurrency", default="5,10", help="profile workers (scrape) or concurrent jobs (api)")
+    parser.add_argument("--runs", type=int, default=3, help="runs per row")
+    parser.add_argument("--scenarios", default="scrape,fixture,insights,notion,api")
+    parser.add_argument("--mode", choices=("threads", "async"), default="threads")
+    parser.add_argument("--json", help="save the rows to this file")
+    parser.add_argument("--baseline", help="compare against rows saved with --json")
+    parser.add_argument("--no-memory", action="store_true", help="skip tracemalloc (lower overhead)")
+    parser.add_argument("--site-latency", type=float, default=0.02)
+    parser.add_argument("--anthropic-latency", type=float, default=0.3)
+    parser.add_argument("--anthropic-tps", type=float, default=500)
+    parser.add_argument("--anthropic-rpm", type=float, default=0)
+    parser.add_argument("--notion-latency", type=float, default=0.05)
+    parser.add_argument("--notion-rps", type=float, default=3)
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(",")]
+    concurrency = [int(c) for c in args.concurrency.split(",")]
+    scenarios = args.scenarios.split(",")
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    proc, site = start_standins(args)
+    if not args.no_memory:
+        tracemalloc.start()
+    rows = []
+    try:
+        for name in scenarios:
+            for row in SCENARIOS[name](site, args, sizes, concurrency):
+                label = f"{row['scenario']} {row['size']} x{row['concurrency'] or 1}"
+                print(f"{label}: p50 {row['p50']:.3f}s", file=sys.stderr)
+                rows.append(row)
+    finally:
+        proc.terminate()
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    print()
+    report(rows, baseline)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,427 @@
+"""Local stand-ins for team sites, the Anthropic API and the Notion API.
+
+Usage (from backend/):
+    python benchmarks/standins.py [--site-port 8801] [--anthropic-port 8802] [--notion-port 8803] ...
+
+bench_pipeline.py starts this in a subprocess, so the servers' CPU and
+memory don't count against the pipeline being measured. Each server has
+configurable latency and rate limits; responses are canned but sized like
+real ones.
+
+Site (GET):
+    /team/<n>/<tag>          generated team page with n member cards
+    /profiles/<n>/<tag>/<i>  the recorded fixtures/profile.html
+    /fixtures/<name>         a recorded fixture as is
+    anything else            fixtures/profile.html (e.g. profile links of team_large.html)
+
+The tag only makes URLs unique, so runs don't share cached or coalesced work.
+
+Anthropic (POST /v1/messages, streaming or not): team extraction returns the
+members of the /team/<n>/<tag> page named in the request (split across
+chunks when the page was chunked), profile extraction returns a canned
+profile, insight digests summarize the members they were sent and anything
+else gets canned insight sections. Latency is
+--anthropic-latency plus output tokens at --anthropic-tps. Above
+--anthropic-rpm requests a minute, requests get a 429 with retry-after;
+every response carries anthropic-ratelimit-requests-* headers.
+
+Notion: enough of /v1/pages and /v1/blocks for notion_builder, keeping the
+block tree in memory, with a 429 above --notion-rps requests a second.
+"""
+import os
+import re
+import sys
+import json
+import time
+import uuid
+import random
+import argparse
+import threading
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+GROUP_NAMES = ("Partners", "Principals", "Operating Team")
+TEAM_URL_RE = re.compile(r"The page URL is: \S*/team/(\d+)/([\w-]+)")
+CHUNK_RE = re.compile(r"This is part (\d+) of (\d+) of the page's HTML")
+NOT_FOUND = object()
+
+
+class RateLimiter:
+    """Token bucket; take() returns 0 when a request may go ahead, else seconds to wait."""
+
+    def __init__(self, per_second):
+        self.rate = per_second
+        self.tokens = max(per_second, 1)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self):
+        if not self.rate:
+            return 0
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(max(self.rate, 1), self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.rate
+
+    def headers(self, prefix, per=60):
+        """Rate-limit headers in the Anthropic style: limit and remaining per
+        `per` seconds, and when the bucket will be full again."""
+        if not self.rate:
+            return {}
+        with self.lock:
+            capacity = max(self.rate, 1)
+            full_in = (capacity - self.tokens) / self.rate
+        reset = datetime.now(timezone.utc) + timedelta(seconds=full_in)
+        return {
+            f"{prefix}-limit": str(int(self.rate * per)),
+            f"{prefix}-remaining": str(int(self.tokens / capacity * self.rate * per)),
+            f"{prefix}-reset": reset.isoformat().replace("+00:00", "Z"),
+        }
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def send(self, code, body, content_type="application/json", headers=None):
+        if not isinstance(body, (bytes, str)):
+            body = json.dumps(body)
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        self.send_response(code)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def json_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+
+# --- Team site ---
+
+def _fixture(name):
+    with open(os.path.join(FIXTURES_DIR, name), encoding="utf-8") as f:
+        return f.read()
+
+
+def team_members(size, tag):
+    """The members of the generated /team/<size>/<tag> page, grouped."""
+    groups = {name: [] for name in GROUP_NAMES}
+    for i in range(size):
+        groups[GROUP_NAMES[i % len(GROUP_NAMES)]].append({
+            "name": f"Member {i}",
+            "title": GROUP_NAMES[i % len(GROUP_NAMES)].rstrip("s"),
+            "photo_url": f"/images/{tag}/{i}.jpg",
+            "profile_url": f"/profiles/{size}/{tag}/{i}",
+        })
+    return [{"name": name, "members": members} for name, members in groups.items() if members]
+
+
+def team_page(size, tag):
+    sections = []
+    for group in team_members(size, tag):
+        cards = "".join(
+            f'<div class="team-card"><a href="{m["profile_url"]}"><img src="{m["photo_url"]}" alt="{m["name"]}" '
+            f'loading="lazy"></a><div class="team-card__body"><h3 class="team-card__name">{m["name"]}</h3>'
+            f'<p class="team-card__title">{m["title"]}</p><a class="team-card__link" href="{m["profile_url"]}">'
+            f'Read bio</a></div></div>'
+            for m in group["members"]
+        )
+        sections.append(
+            f'<section class="team-group"><h2>{group["name"]}</h2><div class="team-grid">{cards}</div></section>'
+        )
+    return (
+        "<!DOCTYPE html><html><head><title>Our Team | Benchmark Capital Partners</title>"
+        '<meta property="og:site_name" content="Benchmark Capital Partners">'
+        f'<script>window.analytics={{"page":"team","tag":"{tag}"}};</script><style>.team-grid{{display:grid}}</style>'
+        '</head><body><nav><a href="/">Home</a><a href="/team">Team</a><a href="/portfolio">Portfolio</a></nav>'
+        f'<main><h1>Our Team</h1>{"".join(sections)}</main><footer>&copy; Benchmark Capital Partners</footer>'
+        "</body></html>"
+    )
+
+
+class SiteHandler(Handler):
+    latency = 0
+
+    def do_GET(self):
+        time.sleep(self.latency)
+        parts = self.path.split("?")[0].strip("/").split("/")
+        if parts[0] == "team" and len(parts) == 3 and parts[1].isdigit():
+            return self.send(200, team_page(int(parts[1]), parts[2]), "text/html; charset=utf-8")
+        if parts[0] == "fixtures" and len(parts) == 2 and os.path.exists(os.path.join(FIXTURES_DIR, parts[1])):
+            return self.send(200, _fixture(parts[1]), "text/html; charset=utf-8")
+        self.send(200, PROFILE_HTML, "text/html; charset=utf-8")
+
+
+# --- Anthropic ---
+
+PROFILE = {
+    "bio": (
+        "Joined the firm after a decade building and scaling software companies. Previously led product at a "
+        "venture-backed infrastructure startup through its acquisition, and before that was an engineer at a large "
+        "cloud provider. Focuses on developer tools, data infrastructure and applied AI, and sits on the boards of "
+        "several portfolio companies. Outside work, a keen long-distance runner and amateur jazz pianist."
+    ),
+    "education": [
+        {"school": "Stanford University", "degree": "MS Computer Science", "honors": None},
+        {"school": "University of Michigan", "degree": "BSE Electrical Engineering", "honors": "Summa Cum Laude"},
+    ],
+    "career": [
+        {"company": "Stackwise", "role": "VP Product", "details": "Acquired by a public software company"},
+        {"company": "Amazon Web Services", "role": "Senior Software Engineer", "details": None},
+        {"company": "McKinsey & Company", "role": "Business Analyst", "details": None},
+    ],
+    "personal": ["Marathon runner", "Jazz pianist"],
+}
+
+INSIGHTS = [
+    {
+        "title": title,
+        "content": "\n".join(
+            f"- **Observation {i}**: a paragraph-length finding about the team, naming people, schools and "
+            f"companies and explaining why it matters for a first meeting."
+            for i in range(8)
+        ),
+    }
+    for title in (
+        "Education Patterns", "Career Trajectories", "Hidden Connections",
+        "Standout Individuals", "Team Composition", "Conversation Starters",
+    )
+]
+
+
+def digest(content):
+    """A canned digest of the members named in an insight digest request."""
+    names = re.findall(r"^\*\*(.+?)\*\*", content, re.M)
+    return {
+        "groups": re.findall(r"^### (.+?)(?: \(|,)", content, re.M),
+        "count": len(names),
+        "seniority": {"Partner": len(names)},
+        "gender": {"women": 0, "men": 0, "unclear": len(names)},
+        "schools": [{"school": "Stanford University", "degree": "MS Computer Science", "people": names}],
+        "employers": [{"company": "Amazon Web Services", "people": names}],
+        "founders": [],
+        "standouts": [{"name": name, "why": "Left a large cloud provider to build developer tools."} for name in names[:4]],
+        "personal": [{"interest": "Marathon running", "people": names}],
+        "patterns": ["Everyone in this group took the same path from big-company engineering into product roles."],
+    }
+
+
+def _tokens(text):
+    return max(1, len(text) // 4)
+
+
+def anthropic_reply(body):
+    """Canned JSON for a request, shaped like the extraction/analysis prompts expect."""
+    content = body["messages"][-1]["content"]
+    if isinstance(content, list):
+        content = "".join(part.get("text", "") for part in content)
+    team = TEAM_URL_RE.search(content)
+    if team:
+        size, tag = int(team.group(1)), team.group(2)
+        groups = team_members(size, tag)
+        chunk = CHUNK_RE.search(content)
+        if chunk:
+            # Each chunk of a split page holds a share of the members
+            part, parts = int(chunk.group(1)) - 1, int(chunk.group(2))
+            groups = [{**g, "members": g["members"][part::parts]} for g in groups]
+        return {"company": "Benchmark Capital Partners", "groups": groups}
+    if content.startswith("The page URL is:"):
+        return {"company": "Unknown", "groups": [{"name": "Team", "members": []}]}
+    if content.startswith("Person:"):
+        return PROFILE
+    if content.startswith("Company:") and "Team size:" not in content:
+        return digest(content)
+    return INSIGHTS
+
+
+class AnthropicHandler(Handler):
+    latency = 0.3
+    tokens_per_second = 500
+    limiter = RateLimiter(0)
+
+    def do_POST(self):
+        body = self.json_body()
+        wait = self.limiter.take()
+        quota = self.limiter.headers("anthropic-ratelimit-requests")
+        if wait:
+            return self.send(
+                429,
+                {"type": "error", "error": {"type": "rate_limit_error", "message": "Stand-in rate limit"}},
+                headers={"retry-after": f"{wait:.3f}", **quota},
+            )
+        if not self.path.startswith("/v1/messages"):
+            return self.send(404, {"type": "error", "error": {"type": "not_found_error", "message": self.path}})
+
+        text = "```json\n" + json.dumps(anthropic_reply(body), indent=1) + "\n```"
+        usage = {"input_tokens": _tokens(json.dumps(body)), "output_tokens": _tokens(text)}
+        message = {
+            "id": f"msg_{uuid.uuid4().hex[:16]}", "type": "message", "role": "assistant", "model": body.get("model"),
+            "stop_reason": "end_turn", "stop_sequence": None,
+        }
+        generation = usage["output_tokens"] / self.tokens_per_second
+        time.sleep(self.latency * random.uniform(0.8, 1.2))
+
+        if not body.get("stream"):
+            time.sleep(generation)
+            return self.send(200, {**message, "content": [{"type": "text", "text": text}], "usage": usage},
+                             headers=quota)
+
+        self.send_response(200)
+        for key, value in quota.items():
+            self.send_header(key, value)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+
+        def event(kind, data):
+            self.wfile.write(f"event: {kind}\ndata: {json.dumps({'type': kind, **data})}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        event("message_start", {"message": {**message, "content": [], "stop_reason": None,
+                                            "usage": {**usage, "output_tokens": 1}}})
+        event("content_block_start", {"index": 0, "content_block": {"type": "text", "text": ""}})
+        pieces = [text[i:i + 200] for i in range(0, len(text), 200)]
+        for piece in pieces:
+            time.sleep(generation / len(pieces))
+            event("content_block_delta", {"index": 0, "delta": {"type": "text_delta", "text": piece}})
+        event("content_block_stop", {"index": 0})
+        event("message_delta", {"delta": {"stop_reason": "end_turn", "stop_sequence": None},
+                                "usage": {"output_tokens": usage["output_tokens"]}})
+        event("message_stop", {})
+        self.close_connection = True
+
+
+# --- Notion ---
+
+class NotionHandler(Handler):
+    latency = 0.05
+    limiter = RateLimiter(3)
+    blocks = {}
+    lock = threading.Lock()
+
+    def _store(self, parent_id, children):
+        created = []
+        for block in children:
+            block_id = str(uuid.uuid4())
+            nested = block[block["type"]].pop("children", None) or []
+            self.blocks[block_id] = {"block": block, "children": [], "archived": False}
+            self.blocks[parent_id]["children"].append(block_id)
+            self._store(block_id, nested)
+            block_type = block["type"]
+            created.append({"object": "block", "id": block_id, "type": block_type, block_type: block[block_type]})
+        return created
+
+    def _handle(self, method):
+        body = self.json_body() if method in ("POST", "PATCH") else None
+        wait = self.limiter.take()
+        if wait:
+            return self.send(429, {"object": "error", "code": "rate_limited"}, headers={"Retry-After": f"{wait:.3f}"})
+        time.sleep(self.latency)
+
+        parts = self.path.split("?")[0].strip("/").split("/")[1:]
+        with self.lock:
+            if method == "POST" and parts == ["pages"]:
+                page_id = str(uuid.uuid4())
+                self.blocks[page_id] = {"block": None, "children": [], "archived": False}
+                self._store(page_id, body.get("children") or [])
+                url = f"https://www.notion.so/{page_id.replace('-', '')}"
+                return self.send(200, {"object": "page", "id": page_id, "url": url})
+            if method == "PATCH" and len(parts) == 2 and parts[0] == "pages":
+                return self.send(200, {"object": "page", "id": parts[1]})
+            if method == "GET" and len(parts) == 2 and parts[0] == "pages" and parts[1] in self.blocks:
+                page = self.blocks[parts[1]]
+                return self.send(200, {"object": "page", "id": parts[1], "archived": page["archived"]})
+            found = self.blocks.get(parts[1], NOT_FOUND) if len(parts) >= 2 and parts[0] == "blocks" else NOT_FOUND
+            if found is NOT_FOUND:
+                return self.send(404, {"object": "error", "code": "object_not_found"})
+            if method == "PATCH" and parts[2:] == ["children"]:
+                created = self._store(parts[1], body["children"])
+                after = body.get("after")
+                if after:
+                    siblings = found["children"]
+                    new = siblings[-len(created):]
+                    del siblings[-len(created):]
+                    at = siblings.index(after) + 1
+                    siblings[at:at] = new
+                return self.send(200, {"object": "list", "results": created})
+            if method == "PATCH":
+                if body.get("archived"):
+                    found["archived"] = True
+                else:
+                    block_type = found["block"]["type"]
+                    found["block"][block_type].update(body.get(block_type, {}))
+                return self.send(200, {"object": "block", "id": parts[1]})
+            if method == "DELETE":
+                found["archived"] = True
+                return self.send(200, {"object": "block", "id": parts[1], "archived": True})
+        self.send(405, {"object": "error", "code": "invalid_request"})
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def do_PATCH(self):
+        self._handle("PATCH")
+
+    def do_DELETE(self):
+        self._handle("DELETE")
+
+
+PROFILE_HTML = _fixture("profile.html")
+
+
+def serve(handler, port):
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--site-port", type=int, default=8801)
+    parser.add_argument("--anthropic-port", type=int, default=8802)
+    parser.add_argument("--notion-port", type=int, default=8803)
+    parser.add_argument("--site-latency", type=float, default=0.02, help="seconds per page")
+    parser.add_argument("--anthropic-latency", type=float, default=0.3, help="seconds before the first token")
+    parser.add_argument("--anthropic-tps", type=float, default=500, help="output tokens per second")
+    parser.add_argument("--anthropic-rpm", type=float, default=0, help="requests per minute (0 = unlimited)")
+    parser.add_argument("--notion-latency", type=float, default=0.05, help="seconds per request")
+    parser.add_argument("--notion-rps", type=float, default=3, help="requests per second (0 = unlimited)")
+    args = parser.parse_args()
+
+    SiteHandler.latency = args.site_latency
+    AnthropicHandler.latency = args.anthropic_latency
+    AnthropicHandler.tokens_per_second = args.anthropic_tps
+    AnthropicHandler.limiter = RateLimiter(args.anthropic_rpm / 60)
+    NotionHandler.latency = args.notion_latency
+    NotionHandler.limiter = RateLimiter(args.notion_rps)
+
+    serve(SiteHandler, args.site_port)
+    serve(AnthropicHandler, args.anthropic_port)
+    serve(NotionHandler, args.notion_port)
+    print("ready", flush=True)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,58 @@
+"""Per-job checkpoints of the pipeline's stage outputs.
+
+Each stage saves its output to the job store as soon as it is produced:
+the raw team page HTML, the extracted team structure, any pending profile
+batch, every successfully enriched member (with its profile content hash) and the insights. A job
+that fails or is cancelled can then be retried from its first incomplete
+stage; members whose profile failed are the only ones fetched again.
+"""
+from scraper import member_key
+
+HTML = "html"
+TEAM = "team"
+INSIGHTS = "insights"
+# A submitted profile batch (see batch_profiles.BatchPending), collected once it ends
+BATCH = "batch"
+MEMBER_PREFIX = "member:"
+
+
+class Checkpoint:
+    def __init__(self, store, job_id):
+        self.store = store
+        self.job_id = job_id
+        self._saved = store.checkpoints(job_id)
+
+    def get(self, stage):
+        return self._saved.get(stage)
+
+    def save(self, stage, value):
+        self._saved[stage] = value
+        self.store.save_checkpoint(self.job_id, stage, value)
+
+    def members(self):
+        """Enriched members saved so far, keyed by member_key."""
+        return {
+            stage[len(MEMBER_PREFIX):]: saved["member"]
+            for stage, saved in self._saved.items() if stage.startswith(MEMBER_PREFIX)
+        }
+
+    def profile_hashes(self):
+        """Profile content hashes of the saved members (see refresh.py)."""
+        return {
+            stage[len(MEMBER_PREFIX):]: saved["hash"]
+            for stage, saved in self._saved.items() if stage.startswith(MEMBER_PREFIX) and saved["hash"]
+        }
+
+    def member_saver(self, profile_hashes, member_callback=None):
+        """Wrap a member_callback to also save each member whose profile was extracted.
+
+        A member with a profile URL but no recorded hash failed and is left
+        out, so a retry fetches it again.
+        """
+        def save_member(group_name, idx, member):
+            key = member_key(member)
+            if key in profile_hashes or not member.get("profile_url"):
+                self.save(MEMBER_PREFIX + key, {"member": member, "hash": profile_hashes.get(key)})
+            if member_callback:
+                member_callback(group_name, idx, member)
+        return save_member
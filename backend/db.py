@@ -0,0 +1,21 @@
+"""Small helpers for the SQLite files used by the job store and caches."""
+import sqlite3
+import threading
+
+
+class SQLiteDB:
+    """Hands out one WAL-mode connection per thread for a database file."""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    def conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
@@ -0,0 +1,158 @@
+"""On-disk cache for fetched pages.
+
+Entries are keyed by normalized URL and point at a content-addressed body
+(identical pages are stored once). Each entry keeps the ETag and
+Last-Modified validators so stale pages can be revalidated with a
+conditional request instead of being downloaded again.
+"""
+import os
+import hashlib
+import time
+import zlib
+from collections import namedtuple
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+from db import SQLiteDB
+
+FETCH_CACHE_ENABLED = os.environ.get("FETCH_CACHE_ENABLED", "1") == "1"
+FETCH_CACHE_PATH = os.environ.get("FETCH_CACHE_PATH", "briefcase_fetch_cache.db")
+# Pages younger than this are served without touching the network
+FETCH_CACHE_FRESH_SECONDS = int(os.environ.get("FETCH_CACHE_FRESH_SECONDS", 6 * 60 * 60))
+# Least recently used entries are evicted once stored bodies exceed this size
+FETCH_CACHE_MAX_BYTES = int(os.environ.get("FETCH_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+
+CachedPage = namedtuple("CachedPage", ["body", "etag", "last_modified", "fresh"])
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def normalize_url(url):
+    """Canonical form of a URL for cache lookups.
+
+    Lowercases scheme and host, drops default ports, fragments and utm_*
+    tracking parameters, and sorts the query string.
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if parts.port and parts.port != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parts.port}"
+    path = parts.path or "/"
+    query = sorted(
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if not k.lower().startswith("utm_")
+    )
+    return urlunsplit((scheme, host, path, urlencode(query), ""))
+
+
+def _hash(value):
+    return hashlib.sha256(value.encode("utf-8")).hexdigest()
+
+
+class FetchCache:
+    """LRU-bounded page cache stored in SQLite."""
+
+    def __init__(self, path=FETCH_CACHE_PATH, fresh_seconds=FETCH_CACHE_FRESH_SECONDS,
+                 max_bytes=FETCH_CACHE_MAX_BYTES):
+        self.fresh_seconds = fresh_seconds
+        self.max_bytes = max_bytes
+        self._db = SQLiteDB(path)
+        conn = self._db.conn()
+        conn.execute(
+            """CREATE TABLE IF NOT EXISTS entries (
+                url_key TEXT PRIMARY KEY,
+                url TEXT NOT NULL,
+                content_hash TEXT NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                fetched_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )"""
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed_at ON entries (accessed_at)")
+        conn.execute("CREATE INDEX IF NOT EXISTS entries_content_hash ON entries (content_hash)")
+        conn.execute(
+            """CREATE TABLE IF NOT EXISTS bodies (
+                content_hash TEXT PRIMARY KEY,
+                body BLOB NOT NULL,
+                size INTEGER NOT NULL
+            )"""
+        )
+        conn.commit()
+
+    def lookup(self, url):
+        """Return the cached page for a URL, or None if it was never stored."""
+        url_key = _hash(normalize_url(url))
+        conn = self._db.conn()
+        row = conn.execute(
+            """SELECT e.etag, e.last_modified, e.fetched_at, b.body
+               FROM entries e JOIN bodies b ON b.content_hash = e.content_hash
+               WHERE e.url_key = ?""",
+            (url_key,),
+        ).fetchone()
+        if row is None:
+            return None
+        now = time.time()
+        with conn:
+            conn.execute("UPDATE entries SET accessed_at = ? WHERE url_key = ?", (now, url_key))
+        return CachedPage(
+            body=zlib.decompress(row["body"]).decode("utf-8"),
+            etag=row["etag"],
+            last_modified=row["last_modified"],
+            fresh=now - row["fetched_at"] < self.fresh_seconds,
+        )
+
+    def revalidated(self, url):
+        """Mark a cached page as fresh again after a 304 Not Modified."""
+        now = time.time()
+        conn = self._db.conn()
+        with conn:
+            conn.execute(
+                "UPDATE entries SET fetched_at = ?, accessed_at = ? WHERE url_key = ?",
+                (now, now, _hash(normalize_url(url))),
+            )
+
+    def store(self, url, body, etag=None, last_modified=None):
+        normalized = normalize_url(url)
+        content_hash = _hash(body)
+        compressed = zlib.compress(body.encode("utf-8"))
+        now = time.time()
+        conn = self._db.conn()
+        with conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO bodies (content_hash, body, size) VALUES (?, ?, ?)",
+                (content_hash, compressed, len(compressed)),
+            )
+            conn.execute(
+                """INSERT OR REPLACE INTO entries
+                   (url_key, url, content_hash, etag, last_modified, fetched_at, accessed_at)
+                   VALUES (?, ?, ?, ?, ?, ?, ?)""",
+                (_hash(normalized), normalized, content_hash, etag, last_modified, now, now),
+            )
+        self._evict()
+
+    def _evict(self):
+        """Drop least recently used entries until bodies fit in max_bytes."""
+        conn = self._db.conn()
+        with conn:
+            self._delete_orphans(conn)
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM bodies").fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            rows = conn.execute(
+                """SELECT e.url_key, b.size FROM entries e
+                   JOIN bodies b ON b.content_hash = e.content_hash
+                   ORDER BY e.accessed_at"""
+            ).fetchall()
+            for row in rows:
+                if total <= self.max_bytes:
+                    break
+                conn.execute("DELETE FROM entries WHERE url_key = ?", (row["url_key"],))
+                total -= row["size"]
+            self._delete_orphans(conn)
+
+    @staticmethod
+    def _delete_orphans(conn):
+        conn.execute(
+            """DELETE FROM bodies WHERE NOT EXISTS
+               (SELECT 1 FROM entries e WHERE e.content_hash = bodies.content_hash)"""
+        )
@@ -0,0 +1,146 @@
+"""Split cleaned team-page markup into token-bounded chunks.
+
+Chunks end on structural boundaries (sections and top-level headings
+first, then the start of a repeated card, then any other block) so a card
+is rarely cut in half. Each chunk remembers the last section heading before
+it, so members at the top of a chunk can still be attributed to the right
+group.
+"""
+import re
+from bisect import bisect_left, bisect_right
+from collections import Counter, namedtuple
+from members import name_key
+
+# Rough size of a token in cleaned HTML; good enough for budgeting requests
+CHARS_PER_TOKEN = 4
+
+Chunk = namedtuple("Chunk", ["html", "heading"])
+
+TAG_RE = re.compile(r"<(/?)([a-zA-Z][a-zA-Z0-9]*)[^>]*?(/?)>")
+VOID_TAGS = {"area", "br", "col", "embed", "hr", "img", "input", "meta", "param"}
+BOUNDARY_TAGS = {"section", "article", "h1", "h2", "h3", "li", "div"}
+# Lower is a better place to split
+SECTION_PRIORITY = 0
+CARD_PRIORITY = 1
+BLOCK_PRIORITY = 2
+HEADING_RE = re.compile(r"<h([12])[^>]*>(.*?)</h\1>", re.I | re.S)
+MARKUP_RE = re.compile(r"<[^>]+>")
+
+
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def _find_boundaries(html):
+    """Candidate split points as (position, priority), in document order.
+
+    Repeated cards are recognised as the most common (tag, nesting depth)
+    among div/li openings: a grid of people is many siblings of one shape.
+    """
+    openings = []
+    depth = 0
+    for m in TAG_RE.finditer(html):
+        tag = m.group(2).lower()
+        if m.group(1):
+            depth = max(depth - 1, 0)
+            continue
+        if tag in BOUNDARY_TAGS:
+            openings.append((m.start(), tag, depth))
+        if tag not in VOID_TAGS and not m.group(3):
+            depth += 1
+
+    shapes = Counter((tag, d) for _, tag, d in openings if tag in ("div", "li"))
+    card_shape = shapes.most_common(1)[0][0] if shapes else None
+
+    boundaries = []
+    for pos, tag, d in openings:
+        if tag in ("section", "article", "h1", "h2"):
+            priority = SECTION_PRIORITY
+        elif (tag, d) == card_shape:
+            priority = CARD_PRIORITY
+        else:
+            priority = BLOCK_PRIORITY
+        boundaries.append((pos, priority))
+    return boundaries
+
+
+def chunk_html(html, max_tokens):
+    """Split markup into chunks of at most max_tokens (estimated) each."""
+    if estimate_tokens(html) <= max_tokens:
+        return [Chunk(html, None)]
+
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    boundaries = _find_boundaries(html)
+    positions = [pos for pos, _ in boundaries]
+
+    starts = [0]
+    start = 0
+    while len(html) - start > max_chars:
+        limit = start + max_chars
+        # Don't let a well-placed boundary produce tiny chunks
+        lo = bisect_right(positions, start + max_chars // 2)
+        hi = bisect_right(positions, limit)
+        if lo < hi:
+            # Best priority wins; among equals, the latest keeps the chunk fullest
+            split = min(boundaries[lo:hi], key=lambda b: (b[1], -b[0]))[0]
+        else:
+            split = limit
+        starts.append(split)
+        start = split
+
+    headings = [(m.start(), MARKUP_RE.sub("", m.group(2)).strip()) for m in HEADING_RE.finditer(html)]
+    heading_positions = [pos for pos, _ in headings]
+
+    chunks = []
+    for i, start in enumerate(starts):
+        end = starts[i + 1] if i + 1 < len(starts) else len(html)
+        idx = bisect_left(heading_positions, start)
+        heading = headings[idx - 1][1] if idx > 0 else None
+        chunks.append(Chunk(html[start:end], heading or None))
+    return chunks
+
+
+def merge_team_data(parts):
+    """Merge team extractions from several chunks of the same page.
+
+    Groups keep the order in which they first appear. A card cut at a chunk
+    boundary can be seen twice, even under different group names by the two
+    chunks: members are de-duplicated by profile URL across groups (staying
+    in the first group that listed them) and by name within a group,
+    filling in fields the first sighting was missing.
+    """
+    company = None
+    groups = {}
+    by_url = {}
+    for part in parts:
+        if not company and part.get("company") and part["company"] != "Unknown Company":
+            company = part["company"]
+        for group in part.get("groups", []):
+            merged = groups.setdefault(group["name"], {"members": [], "by_name": {}, "sightings": 0})
+            merged["sightings"] += len(group.get("members", []))
+            for member in group.get("members", []):
+                url = member.get("profile_url")
+                name = name_key(member)
+                existing = by_url.get(url) if url else None
+                if existing is None and name:
+                    existing = merged["by_name"].get(name)
+                if existing is None:
+                    existing = dict(member)
+                    merged["members"].append(existing)
+                else:
+                    for key, value in member.items():
+                        if value and not existing.get(key):
+                            existing[key] = value
+                if existing.get("profile_url"):
+                    by_url[existing["profile_url"]] = existing
+                if name:
+                    merged["by_name"][name] = existing
+
+    return {
+        "company": company or "Unknown Company",
+        # A group whose members all turned out to belong to earlier groups is dropped
+        "groups": [
+            {"name": name, "members": g["members"]}
+            for name, g in groups.items() if g["members"] or not g["sightings"]
+        ],
+    }
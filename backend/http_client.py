@@ -0,0 +1,80 @@
+"""Shared, thread-safe HTTP client for page fetches.
+
+Keeps one keep-alive requests.Session per host so parallel profile fetches
+reuse TLS connections, and one cloudscraper session per host so the
+Cloudflare challenge is solved once. Hosts that answered 403 are remembered
+and later requests go straight to cloudscraper.
+"""
+import os
+import threading
+from urllib.parse import urlsplit
+import cloudscraper
+import requests
+from requests.adapters import HTTPAdapter
+
+# Connections kept open per host (should cover ADAPTIVE_HOST_MAX, the most
+# requests a host can have in flight)
+FETCH_POOL_MAXSIZE = int(os.environ.get("FETCH_POOL_MAXSIZE", 16))
+# Distinct connection pools kept per session (redirects can cross subdomains)
+FETCH_POOL_CONNECTIONS = int(os.environ.get("FETCH_POOL_CONNECTIONS", 4))
+
+
+class FetchClient:
+    def __init__(self, pool_connections=FETCH_POOL_CONNECTIONS, pool_maxsize=FETCH_POOL_MAXSIZE):
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self._sessions = {}
+        self._scrapers = {}
+        self._cloudflare_hosts = set()
+        self._lock = threading.Lock()
+
+    def _mount_pools(self, session):
+        adapter = HTTPAdapter(pool_connections=self.pool_connections, pool_maxsize=self.pool_maxsize)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    def _session(self, host):
+        with self._lock:
+            session = self._sessions.get(host)
+            if session is None:
+                session = self._mount_pools(requests.Session())
+                self._sessions[host] = session
+            return session
+
+    def _scraper(self, host):
+        with self._lock:
+            scraper = self._scrapers.get(host)
+            if scraper is None:
+                scraper = self._mount_pools(cloudscraper.create_scraper())
+                self._scrapers[host] = scraper
+            return scraper
+
+    def needs_cloudscraper(self, url):
+        """Whether a URL's host has previously answered 403 to a plain request."""
+        return urlsplit(url).netloc.lower() in self._cloudflare_hosts
+
+    def mark_cloudscraper(self, url):
+        """Send future requests for a URL's host straight to cloudscraper."""
+        with self._lock:
+            self._cloudflare_hosts.add(urlsplit(url).netloc.lower())
+
+    def get(self, url, headers=None, timeout=30):
+        """GET a URL, using cloudscraper for hosts known to need it.
+
+        A 403 from the plain session marks the host as Cloudflare-protected
+        and the request is repeated through cloudscraper.
+        """
+        host = urlsplit(url).netloc.lower()
+        if host not in self._cloudflare_hosts:
+            resp = self._session(host).get(url, headers=headers, timeout=timeout, allow_redirects=True)
+            if resp.status_code != 403:
+                return resp
+            self.mark_cloudscraper(url)
+
+        # cloudscraper sets its own browser headers; only forward conditional ones
+        conditional = {k: v for k, v in (headers or {}).items() if k.startswith("If-")}
+        return self._scraper(host).get(url, headers=conditional, timeout=timeout)
+
+
+http = FetchClient()
@@ -0,0 +1,451 @@
+"""Job storage shared by every gunicorn worker.
+
+Jobs live in SQLite (WAL mode) by default so a status poll can be served by
+any worker. Set JOB_STORE=memory to keep jobs in the current process instead
+(handy for local development with a single worker).
+
+Each job also has an append-only event log (progress, members, insights...)
+with increasing ids, which backs the Server-Sent Events stream, and a set
+of named checkpoints holding each pipeline stage's output so a failed job
+can be retried from where it stopped (see checkpoints.py).
+
+A cancel request is stored too, so the worker running a job sees it
+whichever worker received it. It lasts until the job's run finishes.
+
+create_or_join() coalesces submissions: a job created under a key (the
+normalized URL) is reused by later submissions with the same key while it
+is in flight, or for a while after it completes.
+
+Each worker touches the jobs it holds every JOB_HEARTBEAT_SECONDS (see
+touch()). An unfinished job nobody has touched for JOB_STALE_SECONDS was
+lost with its worker, e.g. in a restart or redeploy: it is no longer
+joined, and interrupt_stale() marks it failed so it can be retried from
+its checkpoints.
+"""
+import os
+import json
+import threading
+import time
+import zlib
+from db import SQLiteDB
+
+JOB_STORE = os.environ.get("JOB_STORE", "sqlite")
+JOB_DB_PATH = os.environ.get("JOB_DB_PATH", "briefcase_jobs.db")
+# Finished jobs (complete, error or cancelled) are dropped after this many seconds
+JOB_TTL_SECONDS = int(os.environ.get("JOB_TTL_SECONDS", 24 * 60 * 60))
+# How often to sweep expired jobs, at most
+EVICTION_INTERVAL = 60
+# How often each worker touches the jobs it has queued or running
+JOB_HEARTBEAT_SECONDS = int(os.environ.get("JOB_HEARTBEAT_SECONDS", 30))
+# An unfinished job untouched for this long is taken to have died with its worker
+JOB_STALE_SECONDS = int(os.environ.get("JOB_STALE_SECONDS", 5 * 60))
+INTERRUPTED_STEP = "Error: interrupted (the server restarted while it was running), retry to resume"
+
+FINISHED_STATUSES = ("complete", "error", "cancelled")
+COLUMNS = ("status", "progress", "step", "url")
+
+
+def _pack(value):
+    """Serialize a JSON value into a compact compressed blob."""
+    if value is None:
+        return None
+    return zlib.compress(json.dumps(value, separators=(",", ":")).encode("utf-8"))
+
+
+def _unpack(blob):
+    if blob is None:
+        return None
+    return json.loads(zlib.decompress(blob).decode("utf-8"))
+
+
+def _joinable(status, finished_at, updated_at, window, now):
+    """Can a new submission attach to a job in this state?"""
+    if status not in FINISHED_STATUSES:
+        return not untouched({"updated_at": updated_at}, now)
+    return status == "complete" and finished_at is not None and finished_at >= now - window
+
+
+def untouched(job, now=None):
+    """Has no worker touched the job for JOB_STALE_SECONDS? (See touch().)"""
+    return job["updated_at"] < (now or time.time()) - JOB_STALE_SECONDS
+
+
+class MemoryJobStore:
+    """In-process job store. Only safe with a single worker process."""
+
+    def __init__(self, ttl=JOB_TTL_SECONDS):
+        self.ttl = ttl
+        self._jobs = {}
+        self._events = {}
+        self._keys = {}
+        self._checkpoints = {}
+        self._cancel_requests = set()
+        self._next_event_id = 1
+        self._lock = threading.Lock()
+
+    def _new_job(self, fields):
+        now = time.time()
+        return {
+            "status": "pending",
+            "progress": 0,
+            "step": "Queued",
+            "result": None,
+            **fields,
+            "created_at": now,
+            "updated_at": now,
+            "finished_at": None,
+        }
+
+    def create(self, job_id, **fields):
+        job = self._new_job(fields)
+        with self._lock:
+            self._jobs[job_id] = job
+        self.evict_expired()
+
+    def create_or_join(self, job_id, key, window, **fields):
+        """Create job_id under key, unless a joinable job already holds the key.
+
+        Returns the id of the job that serves the submission.
+        """
+        now = time.time()
+        with self._lock:
+            existing = self._jobs.get(self._keys.get(key))
+            if existing and _joinable(existing["status"], existing["finished_at"], existing["updated_at"], window, now):
+                return self._keys[key]
+            self._jobs[job_id] = self._new_job(fields)
+            self._keys[key] = job_id
+        self.evict_expired()
+        return job_id
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def status(self, job_id):
+        """Just the job's status, or None if there is no such job."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return job["status"] if job else None
+
+    def update(self, job_id, **fields):
+        now = time.time()
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            job.update(fields)
+            job["updated_at"] = now
+            if fields.get("status") in FINISHED_STATUSES:
+                job["finished_at"] = now
+                self._cancel_requests.discard(job_id)
+            elif "status" in fields:
+                # Back in flight (retried), so not up for eviction
+                job["finished_at"] = None
+
+    def evict_expired(self):
+        cutoff = time.time() - self.ttl
+        with self._lock:
+            expired = [
+                job_id for job_id, job in self._jobs.items()
+                if job["finished_at"] and job["finished_at"] < cutoff
+            ]
+            for job_id in expired:
+                del self._jobs[job_id]
+                self._events.pop(job_id, None)
+                self._checkpoints.pop(job_id, None)
+            self._keys = {k: job_id for k, job_id in self._keys.items() if job_id in self._jobs}
+            self._cancel_requests &= set(self._jobs)
+
+    def touch(self, job_ids):
+        """Mark jobs as still held by a live worker."""
+        now = time.time()
+        with self._lock:
+            for job_id in job_ids:
+                if job_id in self._jobs:
+                    self._jobs[job_id]["updated_at"] = now
+
+    def interrupt_stale(self):
+        """Fail unfinished jobs nobody has touched for JOB_STALE_SECONDS. Returns their ids."""
+        now = time.time()
+        with self._lock:
+            stale = [
+                job_id for job_id, job in self._jobs.items()
+                if job["status"] not in FINISHED_STATUSES and job["updated_at"] < now - JOB_STALE_SECONDS
+            ]
+        for job_id in stale:
+            self.update(job_id, status="error", step=INTERRUPTED_STEP, progress=0)
+            self.append_event(job_id, "error", {"step": INTERRUPTED_STEP})
+        return stale
+
+    def request_cancel(self, job_id):
+        with self._lock:
+            self._cancel_requests.add(job_id)
+
+    def cancel_requested(self, job_id):
+        with self._lock:
+            return job_id in self._cancel_requests
+
+    def append_event(self, job_id, event_type, data):
+        with self._lock:
+            event = {"id": self._next_event_id, "type": event_type, "data": data}
+            self._next_event_id += 1
+            self._events.setdefault(job_id, []).append(event)
+
+    def events_since(self, job_id, last_event_id=0):
+        """Events for a job with an id greater than last_event_id, oldest first."""
+        with self._lock:
+            return [e for e in self._events.get(job_id, []) if e["id"] > last_event_id]
+
+    def save_checkpoint(self, job_id, stage, value):
+        with self._lock:
+            self._checkpoints.setdefault(job_id, {})[stage] = value
+
+    def checkpoints(self, job_id):
+        """All of a job's checkpoints as {stage: value}."""
+        with self._lock:
+            return dict(self._checkpoints.get(job_id, {}))
+
+
+class SQLiteJobStore:
+    """SQLite-backed job store, safe to share between processes.
+
+    Status columns are stored as plain columns so progress updates are cheap.
+    The result and any other job fields are stored as compressed JSON blobs.
+    """
+
+    def __init__(self, path=JOB_DB_PATH, ttl=JOB_TTL_SECONDS):
+        self.ttl = ttl
+        self._db = SQLiteDB(path)
+        self._last_eviction = 0
+        conn = self._conn()
+        conn.execute(
+            """CREATE TABLE IF NOT EXISTS jobs (
+                job_id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                progress INTEGER NOT NULL DEFAULT 0,
+                step TEXT,
+                url TEXT,
+                result BLOB,
+                extra BLOB,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                finished_at REAL
+            )"""
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS jobs_finished_at ON jobs (finished_at)")
+        conn.execute(
+            """CREATE TABLE IF NOT EXISTS events (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                job_id TEXT NOT NULL,
+                type TEXT NOT NULL,
+                data BLOB,
+                created_at REAL NOT NULL
+            )"""
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS events_job_id ON events (job_id, id)")
+        conn.execute(
+            """CREATE TABLE IF NOT EXISTS checkpoints (
+                job_id TEXT NOT NULL,
+                stage TEXT NOT NULL,
+                data BLOB,
+                PRIMARY KEY (job_id, stage)
+            )"""
+        )
+        conn.execute("CREATE TABLE IF NOT EXISTS cancel_requests (job_id TEXT PRIMARY KEY)")
+        conn.execute(
+            """CREATE TABLE IF NOT EXISTS job_keys (
+                key TEXT PRIMARY KEY,
+                job_id TEXT NOT NULL
+            )"""
+        )
+        conn.commit()
+
+    def _conn(self):
+        return self._db.conn()
+
+    def _insert(self, conn, job_id, fields):
+        now = time.time()
+        job = {"status": "pending", "progress": 0, "step": "Queued", "url": None, **fields}
+        result = job.pop("result", None)
+        extra = {k: v for k, v in job.items() if k not in COLUMNS}
+        conn.execute(
+            """INSERT INTO jobs (job_id, status, progress, step, url, result, extra,
+                                 created_at, updated_at)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            (job_id, job["status"], job["progress"], job["step"], job["url"],
+             _pack(result), _pack(extra), now, now),
+        )
+
+    def create(self, job_id, **fields):
+        conn = self._conn()
+        with conn:
+            self._insert(conn, job_id, fields)
+        self.evict_expired()
+
+    def create_or_join(self, job_id, key, window, **fields):
+        """Create job_id under key, unless a joinable job already holds the key.
+
+        Returns the id of the job that serves the submission.
+        """
+        conn = self._conn()
+        with conn:
+            # Hold the write lock so two workers can't both create a job for the key
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                """SELECT jobs.job_id, status, finished_at, updated_at FROM job_keys
+                   JOIN jobs ON jobs.job_id = job_keys.job_id WHERE key = ?""",
+                (key,),
+            ).fetchone()
+            if row and _joinable(row["status"], row["finished_at"], row["updated_at"], window, time.time()):
+                return row["job_id"]
+            self._insert(conn, job_id, fields)
+            conn.execute("INSERT OR REPLACE INTO job_keys (key, job_id) VALUES (?, ?)", (key, job_id))
+        self.evict_expired()
+        return job_id
+
+    def get(self, job_id):
+        row = self._conn().execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = _unpack(row["extra"]) or {}
+        job.update({col: row[col] for col in COLUMNS})
+        job["result"] = _unpack(row["result"])
+        job["created_at"] = row["created_at"]
+        job["updated_at"] = row["updated_at"]
+        job["finished_at"] = row["finished_at"]
+        return job
+
+    def status(self, job_id):
+        """Just the job's status (no result blob to load), or None if there is no such job."""
+        row = self._conn().execute("SELECT status FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return row["status"] if row else None
+
+    def update(self, job_id, **fields):
+        now = time.time()
+        assignments = ["updated_at = ?"]
+        params = [now]
+        for col in COLUMNS:
+            if col in fields:
+                assignments.append(f"{col} = ?")
+                params.append(fields[col])
+        if "result" in fields:
+            assignments.append("result = ?")
+            params.append(_pack(fields["result"]))
+        if fields.get("status") in FINISHED_STATUSES:
+            assignments.append("finished_at = ?")
+            params.append(now)
+        elif "status" in fields:
+            assignments.append("finished_at = NULL")
+
+        extra_fields = {k: v for k, v in fields.items() if k not in COLUMNS and k != "result"}
+        conn = self._conn()
+        with conn:
+            if extra_fields:
+                # Take the write lock before reading so concurrent updates don't clobber each other
+                conn.execute("BEGIN IMMEDIATE")
+                row = conn.execute("SELECT extra FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+                if row is None:
+                    return
+                extra = _unpack(row["extra"]) or {}
+                extra.update(extra_fields)
+                assignments.append("extra = ?")
+                params.append(_pack(extra))
+            conn.execute(
+                f"UPDATE jobs SET {', '.join(assignments)} WHERE job_id = ?",
+                (*params, job_id),
+            )
+            if fields.get("status") in FINISHED_STATUSES:
+                conn.execute("DELETE FROM cancel_requests WHERE job_id = ?", (job_id,))
+
+    def evict_expired(self):
+        now = time.time()
+        if now - self._last_eviction < EVICTION_INTERVAL:
+            return
+        self._last_eviction = now
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM jobs WHERE finished_at < ?", (now - self.ttl,))
+            conn.execute("DELETE FROM events WHERE job_id NOT IN (SELECT job_id FROM jobs)")
+            conn.execute("DELETE FROM checkpoints WHERE job_id NOT IN (SELECT job_id FROM jobs)")
+            conn.execute("DELETE FROM job_keys WHERE job_id NOT IN (SELECT job_id FROM jobs)")
+            conn.execute("DELETE FROM cancel_requests WHERE job_id NOT IN (SELECT job_id FROM jobs)")
+
+    def touch(self, job_ids):
+        """Mark jobs as still held by a live worker."""
+        now = time.time()
+        conn = self._conn()
+        with conn:
+            conn.executemany("UPDATE jobs SET updated_at = ? WHERE job_id = ?", [(now, job_id) for job_id in job_ids])
+
+    def interrupt_stale(self):
+        """Fail unfinished jobs nobody has touched for JOB_STALE_SECONDS. Returns their ids."""
+        now = time.time()
+        placeholders = ", ".join("?" for _ in FINISHED_STATUSES)
+        conn = self._conn()
+        with conn:
+            # One transaction, so two workers sweeping at once don't both fail a job
+            conn.execute("BEGIN IMMEDIATE")
+            stale = [row["job_id"] for row in conn.execute(
+                f"SELECT job_id FROM jobs WHERE status NOT IN ({placeholders}) AND updated_at < ?",
+                (*FINISHED_STATUSES, now - JOB_STALE_SECONDS),
+            ).fetchall()]
+            for job_id in stale:
+                conn.execute(
+                    """UPDATE jobs SET status = 'error', step = ?, progress = 0, updated_at = ?, finished_at = ?
+                       WHERE job_id = ?""",
+                    (INTERRUPTED_STEP, now, now, job_id),
+                )
+                conn.execute(
+                    "INSERT INTO events (job_id, type, data, created_at) VALUES (?, 'error', ?, ?)",
+                    (job_id, _pack({"step": INTERRUPTED_STEP}), now),
+                )
+                conn.execute("DELETE FROM cancel_requests WHERE job_id = ?", (job_id,))
+        return stale
+
+    def request_cancel(self, job_id):
+        conn = self._conn()
+        with conn:
+            conn.execute("INSERT OR IGNORE INTO cancel_requests (job_id) VALUES (?)", (job_id,))
+
+    def cancel_requested(self, job_id):
+        row = self._conn().execute("SELECT 1 FROM cancel_requests WHERE job_id = ?", (job_id,)).fetchone()
+        return row is not None
+
+    def append_event(self, job_id, event_type, data):
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "INSERT INTO events (job_id, type, data, created_at) VALUES (?, ?, ?, ?)",
+                (job_id, event_type, _pack(data), time.time()),
+            )
+
+    def events_since(self, job_id, last_event_id=0):
+        """Events for a job with an id greater than last_event_id, oldest first."""
+        rows = self._conn().execute(
+            "SELECT id, type, data FROM events WHERE job_id = ? AND id > ? ORDER BY id",
+            (job_id, last_event_id),
+        ).fetchall()
+        return [{"id": row["id"], "type": row["type"], "data": _unpack(row["data"])} for row in rows]
+
+    def save_checkpoint(self, job_id, stage, value):
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO checkpoints (job_id, stage, data) VALUES (?, ?, ?)",
+                (job_id, stage, _pack(value)),
+            )
+
+    def checkpoints(self, job_id):
+        """All of a job's checkpoints as {stage: value}."""
+        rows = self._conn().execute("SELECT stage, data FROM checkpoints WHERE job_id = ?", (job_id,)).fetchall()
+        return {row["stage"]: _unpack(row["data"]) for row in rows}
+
+
+def get_job_store():
+    """Build the job store selected by the JOB_STORE environment variable."""
+    if JOB_STORE == "memory":
+        return MemoryJobStore()
+    if JOB_STORE == "sqlite":
+        return SQLiteJobStore()
+    raise ValueError(f"Unknown JOB_STORE: {JOB_STORE}")
@@ -0,0 +1,87 @@
+"""Incremental JSON parsing for streamed model output.
+
+JsonStreamParser is fed text as it arrives and returns every value that has
+just been completed at a path of interest, so callers can act on the first
+insight (or team member) long before the whole document has been written.
+Paths are tuples of object keys and array indices from the root, e.g.
+(2,) for the third element of a top-level array or ("groups", 0, "name").
+Only objects, arrays and strings are reported; other scalars are skipped.
+"""
+import json
+
+
+class JsonStreamParser:
+    def __init__(self, want):
+        """`want(path)` decides which completed values are returned."""
+        self.want = want
+        self._text = ""
+        self._pos = 0
+        self._root_seen = False
+        self._done = False
+        # One frame per open container: [kind, key or index, start offset, expecting a key]
+        self._stack = []
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._string_is_key = False
+
+    def _path(self):
+        return tuple(frame[1] for frame in self._stack)
+
+    def feed(self, chunk):
+        """Consume more text; return [(path, value)] for newly completed values."""
+        self._text += chunk
+        text = self._text
+        completed = []
+        i = self._pos
+        while i < len(text) and not self._done:
+            c = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    if self._string_is_key:
+                        self._stack[-1][1] = json.loads(text[self._string_start:i + 1])
+                    else:
+                        self._emit(self._path(), self._string_start, i + 1, completed)
+                i += 1
+                continue
+
+            if not self._root_seen:
+                # Skip any preamble such as a ```json fence
+                if c in "{[":
+                    self._root_seen = True
+                else:
+                    i += 1
+                    continue
+
+            if c == '"':
+                self._in_string = True
+                self._string_start = i
+                self._string_is_key = bool(self._stack) and self._stack[-1][0] == "{" and self._stack[-1][3]
+            elif c in "{[":
+                self._stack.append([c, None if c == "{" else 0, i, c == "{"])
+            elif c in "}]":
+                frame = self._stack.pop()
+                self._emit(self._path(), frame[2], i + 1, completed)
+                if not self._stack:
+                    self._done = True
+            elif c == ":":
+                self._stack[-1][3] = False
+            elif c == ",":
+                frame = self._stack[-1]
+                if frame[0] == "[":
+                    frame[1] += 1
+                else:
+                    frame[3] = True
+            i += 1
+
+        self._pos = i
+        return completed
+
+    def _emit(self, path, start, end, completed):
+        if self.want(path):
+            completed.append((path, json.loads(self._text[start:end])))
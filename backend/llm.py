@@ -0,0 +1,235 @@
+"""Helpers shared by every Claude call in the pipeline."""
+import os
+import json
+import time
+import threading
+import contextvars
+from contextlib import contextmanager, asynccontextmanager
+import anthropic
+import adaptive_limit
+import metrics
+from html_chunker import estimate_tokens
+from json_stream import JsonStreamParser
+from rate_limit import RequestBudget, retry_after_seconds
+
+
+# Retries of a Claude request on 429, 529 and other 5xx responses or
+# connection errors, with the SDK's jittered exponential backoff (or the
+# server's Retry-After). A request that runs out of them fails
+LLM_MAX_RETRIES = int(os.environ.get("LLM_MAX_RETRIES", 8))
+
+# Process-wide budget of requests and input tokens, from the rate-limit headers
+budget = RequestBudget()
+
+_client = None
+_client_lock = threading.Lock()
+
+# Refusals (429/529) the response hook saw during the current call's attempts
+_refusals = contextvars.ContextVar("llm_refusals", default=None)
+
+
+def _is_retry(request):
+    # The SDK numbers each attempt of a request; anything after the first is a retry
+    return request.headers.get("x-stainless-retry-count", "0") != "0"
+
+
+def _request_model(request):
+    if not request.url.path.endswith("/messages"):
+        return None
+    try:
+        return json.loads(request.content).get("model")
+    except (ValueError, AttributeError):
+        return None
+
+
+def _budget_wait(model, waited):
+    if waited:
+        print(f"Rate-limit budget for {model} used up, waited {waited:.1f}s")
+        metrics.record_operation("llm_budget_wait", waited)
+
+
+def _before_send(request):
+    if _is_retry(request):
+        metrics.record_retry("llm")
+    model = _request_model(request)
+    if model:
+        _budget_wait(model, budget.acquire(model, estimate_tokens(request.content.decode("utf-8", "ignore"))))
+    request.extensions["briefcase_sent"] = time.monotonic()
+
+
+async def _before_send_async(request):
+    if _is_retry(request):
+        metrics.record_retry("llm")
+    model = _request_model(request)
+    if model:
+        tokens = estimate_tokens(request.content.decode("utf-8", "ignore"))
+        _budget_wait(model, await budget.acquire_async(model, tokens))
+    request.extensions["briefcase_sent"] = time.monotonic()
+
+
+def _after_response(response):
+    # Every attempt's status and rate-limit headers, the SDK's own retries included
+    model = _request_model(response.request)
+    if not model:
+        return
+    budget.update(model, response.headers)
+    limit = adaptive_limit.models.get(model)
+    if response.status_code in adaptive_limit.OVERLOAD_STATUSES:
+        refusals = _refusals.get()
+        if refusals is not None:
+            refusals.append(response.status_code)
+        # A refused retry only holds the model back: its first refusal already cut the limit
+        limit.overloaded(
+            retry_after_seconds(response.headers),
+            response.request.extensions.get("briefcase_sent"),
+            decrease=not _is_retry(response.request),
+        )
+    else:
+        limit.quota(response.headers)
+
+
+async def _after_response_async(response):
+    _after_response(response)
+
+
+def anthropic_client():
+    """The process-wide Anthropic client, shared by every synchronous call.
+
+    One connection pool; each request (retries included) waits its turn in
+    the rate-limit budget, retries are counted in the metrics and responses
+    adjust the per-model adaptive limits (adaptive_limit.py).
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = anthropic.Anthropic(
+                max_retries=LLM_MAX_RETRIES,
+                http_client=anthropic.DefaultHttpxClient(
+                    event_hooks={"request": [_before_send], "response": [_after_response]}
+                ),
+            )
+        return _client
+
+
+def async_anthropic_client():
+    """An async client with the same retries, budget and hooks, for the async engine's loop."""
+    return anthropic.AsyncAnthropic(
+        max_retries=LLM_MAX_RETRIES,
+        http_client=anthropic.DefaultAsyncHttpxClient(
+            event_hooks={"request": [_before_send_async], "response": [_after_response_async]}
+        ),
+    )
+
+
+def parse_json_response(response_text):
+    """Parse JSON from a model response, handling markdown code blocks."""
+    if "```json" in response_text:
+        response_text = response_text.split("```json")[1].split("```")[0]
+    elif "```" in response_text:
+        response_text = response_text.split("```")[1].split("```")[0]
+    return json.loads(response_text.strip())
+
+
+def cached_system(instructions):
+    """System prompt with the static instructions marked as a cacheable prefix.
+
+    Everything that varies per call goes in the user message after it, so
+    repeated calls with the same instructions hit the prompt cache. (The API
+    only caches prefixes above a model-specific minimum length.)
+    """
+    return [{"type": "text", "text": instructions, "cache_control": {"type": "ephemeral"}}]
+
+
+def log_usage(label, usage, model, seconds=None, batch=False):
+    """Report token usage for a call, including prompt cache hits, and record
+    it in the metrics. Anything in parentheses in label (e.g. a member's
+    name) is left out of the metric labels."""
+    metrics.record_llm_call(label.split(" (")[0], model, usage, seconds, batch)
+    cache_read = getattr(usage, "cache_read_input_tokens", None) or 0
+    cache_write = getattr(usage, "cache_creation_input_tokens", None) or 0
+    print(
+        f"{label}: {usage.input_tokens} input tokens "
+        f"(+{cache_read} read from cache, +{cache_write} written to cache), "
+        f"{usage.output_tokens} output tokens"
+    )
+
+
+@contextmanager
+def model_slot(model):
+    """Hold one of the model's adaptive-limit slots for a Claude call.
+
+    The SDK retries refusals inside the call and the response hook reports
+    each one, so a call that only got through after them isn't counted as
+    a success that raises the limit again.
+    """
+    refusals = []
+    token = _refusals.set(refusals)
+    try:
+        with adaptive_limit.models.get(model).slot() as slot:
+            yield slot
+            if refusals:
+                slot.outcome = None
+    finally:
+        _refusals.reset(token)
+
+
+@asynccontextmanager
+async def model_aslot(model):
+    """Async counterpart of model_slot."""
+    refusals = []
+    token = _refusals.set(refusals)
+    try:
+        async with adaptive_limit.models.get(model).aslot() as slot:
+            yield slot
+            if refusals:
+                slot.outcome = None
+    finally:
+        _refusals.reset(token)
+
+
+def complete_json(client, label, route, instructions, content):
+    """Make a Claude call on the route (see router.py) and parse its JSON response."""
+    with model_slot(route.model):
+        started = time.perf_counter()
+        message = client.messages.create(
+            model=route.model,
+            max_tokens=route.max_tokens,
+            timeout=route.timeout,
+            system=cached_system(instructions),
+            messages=[
+                {
+                    "role": "user",
+                    "content": content,
+                }
+            ],
+        )
+    log_usage(label, message.usage, route.model, time.perf_counter() - started)
+    return parse_json_response(message.content[0].text)
+
+
+def stream_json(client, label, route, instructions, content, want, value_callback):
+    """Like complete_json, but streamed: each value the response completes at
+    a path for which want(path) is true is passed to value_callback(path,
+    value) as soon as it has been written (see json_stream.py)."""
+    parser = JsonStreamParser(want)
+    with model_slot(route.model):
+        started = time.perf_counter()
+        with client.messages.stream(
+            model=route.model,
+            max_tokens=route.max_tokens,
+            timeout=route.timeout,
+            system=cached_system(instructions),
+            messages=[
+                {
+                    "role": "user",
+                    "content": content,
+                }
+            ],
+        ) as stream:
+            for text in stream.text_stream:
+                for path, value in parser.feed(text):
+                    value_callback(path, value)
+            message = stream.get_final_message()
+
+    log_usage(label, message.usage, route.model, time.perf_counter() - started)
+    return parse_json_response(message.content[0].text)
@@ -0,0 +1,103 @@
+"""Persistent memoization of parsed LLM extraction results.
+
+Results are keyed by a hash of (PROMPT_VERSION, model, prompt template,
+input), so a byte-identical page sent with the same prompt returns the
+stored JSON instead of making another API call. Bump PROMPT_VERSION in
+prompts.py to invalidate every entry at once.
+"""
+import os
+import hashlib
+import json
+import threading
+import time
+import zlib
+from db import SQLiteDB
+from prompts import PROMPT_VERSION
+
+LLM_CACHE_ENABLED = os.environ.get("LLM_CACHE_ENABLED", "1") == "1"
+LLM_CACHE_PATH = os.environ.get("LLM_CACHE_PATH", "briefcase_llm_cache.db")
+# Least recently used results are evicted once stored results exceed this size
+LLM_CACHE_MAX_BYTES = int(os.environ.get("LLM_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+
+
+def cache_key(model, template, content):
+    digest = hashlib.sha256()
+    for part in (PROMPT_VERSION, model, template, content):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class LLMCache:
+    """LRU-bounded store of parsed LLM results in SQLite."""
+
+    def __init__(self, path=LLM_CACHE_PATH, max_bytes=LLM_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._db = SQLiteDB(path)
+        conn = self._db.conn()
+        conn.execute(
+            """CREATE TABLE IF NOT EXISTS results (
+                key TEXT PRIMARY KEY,
+                version TEXT NOT NULL,
+                value BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                accessed_at REAL NOT NULL
+            )"""
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS results_accessed_at ON results (accessed_at)")
+        # Entries from older prompt versions can never be hit again
+        conn.execute("DELETE FROM results WHERE version != ?", (PROMPT_VERSION,))
+        conn.commit()
+
+    def get(self, key):
+        conn = self._db.conn()
+        row = conn.execute("SELECT value FROM results WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        with conn:
+            conn.execute("UPDATE results SET accessed_at = ? WHERE key = ?", (time.time(), key))
+        return json.loads(zlib.decompress(row["value"]).decode("utf-8"))
+
+    def put(self, key, value):
+        blob = zlib.compress(json.dumps(value, separators=(",", ":")).encode("utf-8"))
+        conn = self._db.conn()
+        with conn:
+            conn.execute(
+                """INSERT OR REPLACE INTO results (key, version, value, size, accessed_at)
+                   VALUES (?, ?, ?, ?, ?)""",
+                (key, PROMPT_VERSION, blob, len(blob), time.time()),
+            )
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            for row in conn.execute("SELECT key, size FROM results ORDER BY accessed_at").fetchall():
+                if total <= self.max_bytes:
+                    break
+                conn.execute("DELETE FROM results WHERE key = ?", (row["key"],))
+                total -= row["size"]
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def _get_cache():
+    global _cache
+    if not LLM_CACHE_ENABLED:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = LLMCache()
+    return _cache
+
+
+def lookup(model, template, content):
+    """Return the stored result for this call, or None on a miss."""
+    cache = _get_cache()
+    return cache.get(cache_key(model, template, content)) if cache else None
+
+
+def store(model, template, content, value):
+    cache = _get_cache()
+    if cache:
+        cache.put(cache_key(model, template, content), value)
@@ -0,0 +1,17 @@
+"""Identity of a team member across extractions, runs and exports.
+
+Chunk merging, checkpoints, refreshes and the Notion page diff all match
+members up by these keys, so they have to agree on who is who.
+"""
+
+
+def name_key(member):
+    """A member's name, normalized for matching: lowercase, single-spaced."""
+    return " ".join((member.get("name") or "").lower().split())
+
+
+def member_key(member):
+    """Stable identity of a team member across runs: profile URL, else name."""
+    if member.get("profile_url"):
+        return member["profile_url"]
+    return "name:" + name_key(member)
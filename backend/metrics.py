@@ -0,0 +1,284 @@
+"""Latency, token and cost instrumentation.
+
+Every traced operation (page fetches, HTML cleaning, Claude calls, Notion
+requests) and pipeline stage is recorded twice: in the process-wide
+registry, rendered for GET /api/metrics in Prometheus text format, and in
+the trace of the job it ran for, if any. The job's trace is held in a
+context variable, so it follows the job into asyncio tasks and
+to_thread(); thread pool tasks need in_context().
+
+Metrics are per process: with several gunicorn workers, scrape each one
+(or aggregate in Prometheus).
+"""
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+# USD per million (input, output) tokens, matched by model name prefix.
+# Cache reads bill at 10% of the input price, cache writes at 125%
+MODEL_PRICES = {
+    "claude-haiku-4-5": (1.0, 5.0),
+    "claude-sonnet-4": (3.0, 15.0),
+    "claude-opus-4": (15.0, 75.0),
+}
+CACHE_READ_RATE = 0.1
+CACHE_WRITE_RATE = 1.25
+# Message Batches are billed at half price
+BATCH_RATE = 0.5
+
+LATENCY_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+HELP = {
+    "briefcase_stage_seconds": ("histogram", "Wall-clock time of pipeline stages."),
+    "briefcase_operation_seconds": ("histogram", "Time spent in traced operations."),
+    "briefcase_llm_call_seconds": ("histogram", "Latency of Claude calls."),
+    "briefcase_llm_calls_total": ("counter", "Claude calls made."),
+    "briefcase_llm_tokens_total": ("counter", "Tokens used by Claude calls, by type."),
+    "briefcase_llm_cost_usd_total": ("counter", "Estimated cost of Claude calls in USD."),
+    "briefcase_retries_total": ("counter", "Retried requests, by target."),
+    "briefcase_llm_routes_total": ("counter", "Model tier each Claude call was routed to, by stage."),
+    "briefcase_concurrency_limit": ("gauge", "Adaptive limit on requests in flight, by host or model."),
+    "briefcase_jobs_total": ("counter", "Finished dossier jobs, by status."),
+    "briefcase_jobs_queued": ("gauge", "Dossier jobs waiting for a scheduler worker."),
+    "briefcase_jobs_running": ("gauge", "Dossier jobs running."),
+}
+
+TOKEN_TYPES = ("input", "output", "cache_read", "cache_write")
+
+
+def _labels(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{str(v)}"' for k, v in pairs) + "}"
+
+
+class Registry:
+    """Counters, gauges and histograms keyed by name and labels."""
+
+    def __init__(self):
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name, value=1, **labels):
+        key = (name, _labels(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        with self._lock:
+            self._gauges[(name, _labels(labels))] = value
+
+    def observe(self, name, value, **labels):
+        key = (name, _labels(labels))
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = {"buckets": [0] * len(LATENCY_BUCKETS), "sum": 0, "count": 0}
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if value <= bound:
+                    hist["buckets"][i] += 1
+            hist["sum"] += value
+            hist["count"] += 1
+
+    def render(self):
+        """The registry in Prometheus text exposition format."""
+        with self._lock:
+            series = {}
+            for (name, labels), value in self._counters.items():
+                series.setdefault(name, []).append(f"{name}{_format_labels(labels)} {value:g}")
+            for (name, labels), value in self._gauges.items():
+                series.setdefault(name, []).append(f"{name}{_format_labels(labels)} {value:g}")
+            for (name, labels), hist in self._histograms.items():
+                lines = series.setdefault(name, [])
+                for bound, count in zip(LATENCY_BUCKETS, hist["buckets"]):
+                    lines.append(f"{name}_bucket{_format_labels(labels, [('le', f'{bound:g}')])} {count}")
+                lines.append(f"{name}_bucket{_format_labels(labels, [('le', '+Inf')])} {hist['count']}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {hist['sum']:.6f}")
+                lines.append(f"{name}_count{_format_labels(labels)} {hist['count']}")
+
+        out = []
+        for name in sorted(series):
+            kind, help_text = HELP.get(name, ("untyped", name))
+            out.append(f"# HELP {name} {help_text}")
+            out.append(f"# TYPE {name} {kind}")
+            out.extend(sorted(series[name]))
+        return "\n".join(out) + "\n"
+
+
+registry = Registry()
+
+
+class JobTrace:
+    """Timing, token and cost totals for one job."""
+
+    def __init__(self):
+        self.started = time.time()
+        self.stages = {}
+        self.operations = {}
+        self.llm = {"calls": 0, "cost_usd": 0.0, **{f"{t}_tokens": 0 for t in TOKEN_TYPES}}
+        self.retries = {}
+        self.routes = {}
+        self._lock = threading.Lock()
+
+    def add(self, kind, name, seconds):
+        with self._lock:
+            totals = getattr(self, kind).setdefault(name, {"count": 0, "seconds": 0.0})
+            totals["count"] += 1
+            totals["seconds"] += seconds
+
+    def add_llm(self, tokens, cost):
+        with self._lock:
+            self.llm["calls"] += 1
+            self.llm["cost_usd"] += cost
+            for token_type, count in tokens.items():
+                self.llm[f"{token_type}_tokens"] += count
+
+    def add_retry(self, target):
+        with self._lock:
+            self.retries[target] = self.retries.get(target, 0) + 1
+
+    def add_route(self, stage, tier):
+        with self._lock:
+            key = f"{stage}:{tier}"
+            self.routes[key] = self.routes.get(key, 0) + 1
+
+    def summary(self):
+        """JSON-friendly breakdown for the job status response.
+
+        Stage times are wall-clock; operation times are summed over
+        concurrent calls, so they can add up to more than the job took.
+        """
+        with self._lock:
+            return {
+                "elapsed_seconds": round(time.time() - self.started, 3),
+                "stages": {k: {"count": v["count"], "seconds": round(v["seconds"], 3)} for k, v in self.stages.items()},
+                "operations": {
+                    k: {"count": v["count"], "seconds": round(v["seconds"], 3)} for k, v in self.operations.items()
+                },
+                "llm": {**self.llm, "cost_usd": round(self.llm["cost_usd"], 6)},
+                "retries": dict(self.retries),
+                "routes": dict(self.routes),
+            }
+
+
+_current_trace = contextvars.ContextVar("job_trace", default=None)
+
+
+@contextmanager
+def trace_job():
+    """Collect everything traced inside the block into a new JobTrace."""
+    trace = JobTrace()
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+
+def in_context(fn):
+    """Wrap fn to run in (a copy of) the caller's context, e.g. on a thread pool."""
+    ctx = contextvars.copy_context()
+
+    def run(*args, **kwargs):
+        return ctx.copy().run(fn, *args, **kwargs)
+    return run
+
+
+@contextmanager
+def _timed(kind, metric, label, name):
+    start = time.perf_counter()
+    status = "ok"
+    try:
+        yield
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        seconds = time.perf_counter() - start
+        registry.observe(metric, seconds, **{label: name, "status": status})
+        trace = _current_trace.get()
+        if trace:
+            trace.add(kind, name, seconds)
+
+
+def stage(name):
+    """Time a pipeline stage (wall-clock)."""
+    return _timed("stages", "briefcase_stage_seconds", "stage", name)
+
+
+def span(name):
+    """Time one operation, such as a page fetch."""
+    return _timed("operations", "briefcase_operation_seconds", "operation", name)
+
+
+def record_operation(name, seconds):
+    """Record time spent outside a span, such as waiting in a queue, as an operation."""
+    registry.observe("briefcase_operation_seconds", seconds, operation=name, status="ok")
+    trace = _current_trace.get()
+    if trace:
+        trace.add("operations", name, seconds)
+
+
+def model_price(model):
+    for prefix, price in MODEL_PRICES.items():
+        if model.startswith(prefix):
+            return price
+    return None
+
+
+def record_llm_call(call, model, usage, seconds=None, batch=False):
+    """Record a Claude call's latency, tokens and estimated cost."""
+    tokens = {
+        "input": usage.input_tokens,
+        "output": usage.output_tokens,
+        "cache_read": getattr(usage, "cache_read_input_tokens", None) or 0,
+        "cache_write": getattr(usage, "cache_creation_input_tokens", None) or 0,
+    }
+    cost = 0.0
+    price = model_price(model)
+    if price:
+        input_price, output_price = price
+        cost = (
+            tokens["input"] * input_price
+            + tokens["cache_read"] * input_price * CACHE_READ_RATE
+            + tokens["cache_write"] * input_price * CACHE_WRITE_RATE
+            + tokens["output"] * output_price
+        ) / 1_000_000
+        if batch:
+            cost *= BATCH_RATE
+
+    registry.inc("briefcase_llm_calls_total", model=model, call=call)
+    for token_type, count in tokens.items():
+        registry.inc("briefcase_llm_tokens_total", count, model=model, type=token_type)
+    registry.inc("briefcase_llm_cost_usd_total", cost, model=model)
+    if seconds is not None:
+        registry.observe("briefcase_llm_call_seconds", seconds, model=model, call=call)
+    trace = _current_trace.get()
+    if trace:
+        trace.add_llm(tokens, cost)
+        if seconds is not None:
+            trace.add("operations", f"llm:{call}", seconds)
+
+
+def record_retry(target):
+    """Count a retried request to target ("fetch", "llm" or "notion")."""
+    registry.inc("briefcase_retries_total", target=target)
+    trace = _current_trace.get()
+    if trace:
+        trace.add_retry(target)
+
+
+def record_route(stage, tier, escalated=False):
+    """Count a Claude call routed to tier ("skipped" when Claude wasn't needed)."""
+    registry.inc("briefcase_llm_routes_total", stage=stage, tier=tier, escalated=str(escalated).lower())
+    trace = _current_trace.get()
+    if trace:
+        trace.add_route(stage, tier)
@@ -0,0 +1,73 @@
+"""Rate-limited Notion API client shared by all exports in a process.
+
+Requests go through one pooled keep-alive session and a token bucket
+tuned to Notion's average limit of ~3 requests per second, so concurrent
+exports can't trip it together. A 429 pauses the bucket for Retry-After
+seconds and the request is retried, as are transient 502/503/504s.
+"""
+import os
+import time
+import requests
+from requests.adapters import HTTPAdapter
+import metrics
+from rate_limit import TokenBucket, retry_after_seconds
+
+NOTION_TOKEN = os.environ.get("NOTION_TOKEN")
+NOTION_API = os.environ.get("NOTION_API_URL", "https://api.notion.com/v1")
+NOTION_VERSION = "2022-06-28"
+NOTION_REQUESTS_PER_SECOND = float(os.environ.get("NOTION_REQUESTS_PER_SECOND", 3))
+NOTION_MAX_RETRIES = int(os.environ.get("NOTION_MAX_RETRIES", 5))
+NOTION_TIMEOUT = 30
+
+RETRY_STATUSES = {429, 502, 503, 504}
+
+
+class NotionClient:
+    def __init__(self, token=NOTION_TOKEN, rate=NOTION_REQUESTS_PER_SECOND, max_retries=NOTION_MAX_RETRIES):
+        self.max_retries = max_retries
+        self.bucket = TokenBucket(rate)
+        self.session = requests.Session()
+        self.session.mount("https://", HTTPAdapter(pool_maxsize=10))
+        self.session.mount("http://", HTTPAdapter(pool_maxsize=10))
+        self.session.headers.update({
+            "Authorization": f"Bearer {token}",
+            "Content-Type": "application/json",
+            "Notion-Version": NOTION_VERSION,
+        })
+
+    def request(self, method, path, json=None):
+        """Send a request and return the decoded JSON response."""
+        for attempt in range(self.max_retries + 1):
+            self.bucket.acquire()
+            with metrics.span("notion_request"):
+                resp = self.session.request(method, f"{NOTION_API}{path}", json=json, timeout=NOTION_TIMEOUT)
+            if resp.status_code in RETRY_STATUSES and attempt < self.max_retries:
+                metrics.record_retry("notion")
+                delay = retry_after_seconds(resp.headers)
+                if delay is None:
+                    delay = 2 ** attempt
+                if resp.status_code == 429:
+                    # Everyone backs off, not just this request
+                    self.bucket.pause(delay)
+                print(f"Notion {method} {path} returned {resp.status_code}, retrying in {delay:.1f}s")
+                time.sleep(delay)
+                continue
+            if not resp.ok:
+                # Notion explains validation errors in the body
+                raise requests.HTTPError(f"{resp.status_code} from Notion: {resp.text[:500]}", response=resp)
+            return resp.json()
+
+    def get(self, path):
+        return self.request("GET", path)
+
+    def post(self, path, json):
+        return self.request("POST", path, json)
+
+    def patch(self, path, json):
+        return self.request("PATCH", path, json)
+
+    def delete(self, path):
+        return self.request("DELETE", path)
+
+
+notion = NotionClient()
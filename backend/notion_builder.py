@@ -1,80 +1,377 @@
+"""Build a dossier's Notion page and keep it in sync with the dossier.
+
+The page is a list of items: the header, one toggle per group (whose
+children are the members' blocks, one flat run per member), a divider and
+one toggle per insight. Each export returns a sync state recording the
+page, and every item's and member's block IDs with a hash per block.
+Passing that state to the next export turns it into a diff: unchanged
+items are left alone, changed ones are patched block by block when their
+shape is the same and replaced otherwise, new ones are inserted after
+their predecessor and removed ones are archived.
+
+Notion takes at most 100 children per block array and 1000 blocks per
+request, so BlockUploader appends in batches, and appends toggle children
+beyond the first 100 under their toggle (using the block IDs Notion
+returns) on a small thread pool. All requests go through the shared
+rate-limited client in notion_api.py.
+"""
 import os
+import json
+import hashlib
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 import requests
+import metrics
+from notion_api import notion
+from members import member_key
 
-NOTION_TOKEN = os.environ.get("NOTION_TOKEN")
 NOTION_DATABASE_ID = os.environ.get("NOTION_DATABASE_ID")
-NOTION_API = "https://api.notion.com/v1"
-NOTION_HEADERS = {
-    "Authorization": f"Bearer {NOTION_TOKEN}",
-    "Content-Type": "application/json",
-    "Notion-Version": "2022-06-28",
-}
+# Concurrent requests per export (the rate limit is shared by all exports)
+NOTION_EXPORT_WORKERS = int(os.environ.get("NOTION_EXPORT_WORKERS", 3))
 
+MAX_CHILDREN = 100
+MAX_BLOCKS_PER_REQUEST = 1000
 
-def create_dossier_page(dossier):
-    """Create a Notion page with the full dossier content using toggle H1 pattern."""
+
+def _unique_key(key, seen):
+    """Disambiguate repeated keys (two people with the same name) by occurrence."""
+    seen[key] = seen.get(key, 0) + 1
+    return key if seen[key] == 1 else f"{key}#{seen[key]}"
+
+
+def build_dossier_items(dossier):
+    """The page content as items: {"key", "blocks"}, plus "members" for groups.
+    Group toggles are built empty; their children are the members' blocks."""
     company = dossier["company"]
     team_count = dossier["team_count"]
-
-    children = []
+    seen = {}
 
     # Header
-    children.append(_heading(1, f"{company} — Team Dossier ({team_count} members)"))
-    children.append(_divider())
+    items = [{
+        "key": "header",
+        "blocks": [
+            _heading(1, f"{company} — Team Dossier ({team_count} members)"),
+            _divider(),
+        ],
+    }]
 
     # Team sections
     for group in dossier.get("groups", []):
-        # Toggle heading for each group
-        group_children = []
-        for member in group.get("members", []):
-            # Build member content blocks
-            member_blocks = _build_member_blocks(member)
-            group_children.extend(member_blocks)
-            group_children.append(_divider())
-
-        children.append(
-            _toggle_heading(2, f"{group['name']} ({group['count']})", group_children)
-        )
+        # Each member's blocks, followed by a divider
+        member_seen = {}
+        members = [
+            {
+                "key": _unique_key(member_key(member), member_seen),
+                "blocks": _build_member_blocks(member) + [_divider()],
+            }
+            for member in group.get("members", [])
+        ]
+        items.append({
+            "key": _unique_key(f"group:{group['name']}", seen),
+            "blocks": [_toggle_heading(2, f"{group['name']} ({group['count']})", [])],
+            "members": members,
+        })
 
-    children.append(_divider())
+    items.append({"key": "rule", "blocks": [_divider()]})
 
     # Insight sections
     for insight in dossier.get("insights", []):
         insight_blocks = _markdown_to_blocks(insight["content"])
-        children.append(_toggle_heading(2, insight["title"], insight_blocks))
+        items.append({
+            "key": _unique_key(f"insight:{insight['title']}", seen),
+            "blocks": [_toggle_heading(2, insight["title"], insight_blocks)],
+        })
+
+    return items
+
+
+def _page_title(dossier):
+    return f"{dossier['company']} — Team Dossier"
+
+
+def sync_dossier_page(dossier, state=None, progress_callback=None):
+    """Create the dossier's Notion page, or update the page described by a
+    previous export's state in place. Returns the new sync state.
+    progress_callback(done, total) is called as blocks are written."""
+    items = build_dossier_items(dossier)
+    total = sum(count_blocks(item["blocks"]) + _member_blocks(item) for item in items)
+    title = _page_title(dossier)
 
-    # Create the page (Notion API limits children to 100 per request)
-    page_data = {
+    if state:
+        try:
+            sync = DossierSync(progress_callback=progress_callback, total=total)
+            if state.get("title") != title:
+                notion.patch(f"/pages/{state['page_id']}", {
+                    "properties": {"title": {"title": [{"text": {"content": title}}]}},
+                })
+            return {**state, "title": title, "items": sync.run(state["page_id"], state["items"], items)}
+        except requests.HTTPError as e:
+            # Any other failure leaves the page as it is rather than duplicating it
+            if not _page_gone(state["page_id"]):
+                raise
+            print(f"Notion page {state['page_id']} is gone ({e}), creating a new page")
+
+    page = notion.post("/pages", {
         "parent": {"database_id": NOTION_DATABASE_ID},
         "properties": {
             "title": {
-                "title": [{"text": {"content": f"{company} — Team Dossier"}}]
+                "title": [{"text": {"content": title}}]
             }
         },
-        "children": children[:100],
-    }
+    })
+    sync = DossierSync(progress_callback=progress_callback, total=total)
+    return {"page_id": page["id"], "url": page["url"], "title": title, "items": sync.run(page["id"], [], items)}
+
+
+def _page_gone(page_id):
+    """Has the page been deleted or archived in Notion?"""
+    try:
+        page = notion.get(f"/pages/{page_id}")
+    except requests.HTTPError as e:
+        if e.response is not None and e.response.status_code == 404:
+            return True
+        raise
+    return bool(page.get("archived") or page.get("in_trash"))
+
+
+def _member_blocks(item):
+    return sum(count_blocks(m["blocks"]) for m in item.get("members") or [])
+
 
-    resp = requests.post(
-        f"{NOTION_API}/pages",
-        headers=NOTION_HEADERS,
-        json=page_data,
+def _block_hash(block):
+    return hashlib.sha256(json.dumps(block, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+def _same_shape(old, blocks):
+    """Can the old item's blocks be patched into these, one for one?"""
+    return (
+        len(old["block_ids"]) == len(blocks)
+        and old.get("types") == [b["type"] for b in blocks]
+        and not any(_children_of(b) for b in blocks)
+    )
+
+
+def _reusable(old, item):
+    return old is not None and (
+        old["hashes"] == [_block_hash(b) for b in item["blocks"]] or _same_shape(old, item["blocks"])
     )
-    resp.raise_for_status()
-    page = resp.json()
-    page_id = page["id"]
 
-    # Append remaining children in batches of 100
-    remaining = children[100:]
-    while remaining:
-        batch = remaining[:100]
-        remaining = remaining[100:]
-        requests.patch(
-            f"{NOTION_API}/blocks/{page_id}/children",
-            headers=NOTION_HEADERS,
-            json={"children": batch},
-        )
 
-    return page["url"]
+def _kept_items(old_items, new_items):
+    """Old items that can stay put: same key, still in the same relative order."""
+    old_positions = {item["key"]: i for i, item in enumerate(old_items)}
+    kept = {}
+    last = -1
+    for item in new_items:
+        i = old_positions.get(item["key"])
+        if i is not None and i > last:
+            kept[item["key"]] = old_items[i]
+            last = i
+    return kept
+
+
+def _needs_rebuild(old_items, new_items):
+    """Notion can only insert after an existing block, so a new first item in
+    front of kept ones means re-placing everything after it."""
+    kept = _kept_items(old_items, new_items)
+    return bool(kept) and not _reusable(kept.get(new_items[0]["key"]), new_items[0])
+
+
+class DossierSync:
+    """Applies the difference between two versions of the page's items."""
+
+    def __init__(self, api=notion, workers=NOTION_EXPORT_WORKERS, progress_callback=None, total=0):
+        self.api = api
+        self.workers = workers
+        self.uploader = BlockUploader(api, workers, progress_callback, total)
+
+    def run(self, page_id, old_items, new_items):
+        """Sync the page's top-level items, then every group's members. Returns the new item states."""
+        # Archives and in-place patches don't depend on each other, so they go
+        # out concurrently; inserts are ordered and go through the uploader
+        self._pool = ThreadPoolExecutor(max_workers=self.workers)
+        self._futures = []
+        self._groups = []
+        with self._pool:
+            states = self._sync_children(page_id, old_items, new_items)
+            # Different groups are different parents: sync their members in parallel
+            sync_children = metrics.in_context(self._sync_children)
+            member_syncs = [
+                self._pool.submit(sync_children, state["block_ids"][0], old_members, item["members"])
+                for state, old_members, item in self._groups
+            ]
+            for (state, _, _), future in zip(self._groups, member_syncs):
+                state["members"] = future.result()
+            # Archives submitted while syncing members
+            for future in self._futures:
+                future.result()
+        return states
+
+    def _archive(self, old):
+        for block_id in old["block_ids"]:
+            self._futures.append(self._pool.submit(metrics.in_context(self.api.delete), f"/blocks/{block_id}"))
+
+    def _patch(self, block_id, block):
+        body = {k: v for k, v in block[block["type"]].items() if k != "children"}
+        patch = metrics.in_context(self.api.patch)
+        self._futures.append(self._pool.submit(patch, f"/blocks/{block_id}", {block["type"]: body}))
+
+    def _sync_children(self, parent_id, old_items, new_items):
+        """Make parent_id's children match new_items, reusing old_items' blocks where possible."""
+        kept = _kept_items(old_items, new_items)
+        for item in new_items:
+            old = kept.get(item["key"])
+            if old and item.get("members") is not None and _needs_rebuild(old.get("members") or [], item["members"]):
+                # Cheaper to replace the whole group toggle than archive its members block by block
+                del kept[item["key"]]
+        for old in old_items:
+            if old["key"] not in kept:
+                self._archive(old)
+
+        states = []
+        prev = None
+        pending = []
+        for item in new_items:
+            old = kept.pop(item["key"], None)
+            hashes = [_block_hash(b) for b in item["blocks"]]
+            if old and old["hashes"] == hashes:
+                state = dict(old)
+                self.uploader.advance(count_blocks(item["blocks"]))
+            elif old and _same_shape(old, item["blocks"]):
+                for block_id, old_hash, new_hash, block in zip(old["block_ids"], old["hashes"], hashes, item["blocks"]):
+                    if old_hash != new_hash:
+                        self._patch(block_id, block)
+                state = {**old, "hashes": hashes}
+                self.uploader.advance(len(item["blocks"]))
+            else:
+                if old:
+                    self._archive(old)
+                if prev is None and kept:
+                    # Notion can only insert after an existing block, so
+                    # nothing goes in front of a kept item: re-place the rest
+                    for later in kept.values():
+                        self._archive(later)
+                    kept.clear()
+                pending.append(item)
+                continue
+
+            # Insert what's queued up in front of this kept item
+            if pending:
+                prev = self._insert(parent_id, pending, prev, states)
+                pending = []
+            states.append(state)
+            prev = state["block_ids"][-1]
+            if item.get("members") is not None:
+                self._groups.append((state, old.get("members") or [], item))
+
+        if pending:
+            self._insert(parent_id, pending, prev, states)
+        return states
+
+    def _insert(self, parent_id, items, after, states):
+        """Insert items' blocks after the block `after` (or at the end); returns the last new block ID."""
+        created = self.uploader.upload(parent_id, [b for item in items for b in item["blocks"]], after=after)
+        ids = [block["id"] for block in created]
+        for item in items:
+            block_ids, ids = ids[:len(item["blocks"])], ids[len(item["blocks"]):]
+            state = {
+                "key": item["key"],
+                "block_ids": block_ids,
+                "types": [b["type"] for b in item["blocks"]],
+                "hashes": [_block_hash(b) for b in item["blocks"]],
+            }
+            states.append(state)
+            if item.get("members") is not None:
+                self._groups.append((state, [], item))
+        return states[-1]["block_ids"][-1]
+
+
+def _children_of(block):
+    return block[block["type"]].get("children") or []
+
+
+def count_blocks(blocks):
+    return sum(1 + count_blocks(_children_of(b)) for b in blocks)
+
+
+def _split(block):
+    """Split a block into what fits in one request and the children to append later."""
+    children = _children_of(block)
+    if len(children) <= MAX_CHILDREN:
+        return block, []
+    body = {**block[block["type"]], "children": children[:MAX_CHILDREN]}
+    return {**block, block["type"]: body}, children[MAX_CHILDREN:]
+
+
+def _batches(blocks):
+    """Group blocks into append requests within Notion's size limits.
+    Yields lists of (block to send, children to append under it afterwards)."""
+    batch, size = [], 0
+    for block in blocks:
+        head, overflow = _split(block)
+        count = count_blocks([head])
+        if batch and (len(batch) == MAX_CHILDREN or size + count > MAX_BLOCKS_PER_REQUEST):
+            yield batch
+            batch, size = [], 0
+        batch.append((head, overflow))
+        size += count
+    if batch:
+        yield batch
+
+
+class BlockUploader:
+    """Appends block trees of any size under Notion blocks or pages.
+    progress_callback(done, total) counts blocks across all uploads."""
+
+    def __init__(self, api=notion, workers=NOTION_EXPORT_WORKERS, progress_callback=None, total=0):
+        self.api = api
+        self.workers = workers
+        self.progress_callback = progress_callback
+        self.total = total
+        self._done = 0
+        self._lock = threading.Lock()
+
+    def upload(self, parent_id, blocks, after=None):
+        """Append blocks under parent_id in order, after the block `after` if
+        given. Returns the created top-level blocks."""
+        # Futures for nested appends; each one adds its own nested appends
+        # here before finishing, so draining the queue waits for everything
+        pending = deque()
+        executor = ThreadPoolExecutor(max_workers=self.workers)
+        with executor:
+            try:
+                created = self._append(parent_id, blocks, after, executor, pending)
+                while pending:
+                    pending.popleft().result()
+            except BaseException:
+                executor.shutdown(cancel_futures=True)
+                raise
+        return created
+
+    def _append(self, parent_id, blocks, after, executor, pending):
+        created = []
+        for batch in _batches(blocks):
+            body = {"children": [head for head, _ in batch]}
+            if after:
+                body["after"] = after
+            results = self.api.patch(f"/blocks/{parent_id}/children", body)["results"]
+            created.extend(results)
+            if after:
+                after = results[-1]["id"]
+            for block, (_, overflow) in zip(results, batch):
+                if overflow:
+                    append = metrics.in_context(self._append)
+                    pending.append(executor.submit(append, block["id"], overflow, None, executor, pending))
+            self.advance(count_blocks([head for head, _ in batch]))
+        return created
+
+    def advance(self, count):
+        with self._lock:
+            self._done += count
+            done = self._done
+        if self.progress_callback:
+            self.progress_callback(done, self.total)
 
 
 def _build_member_blocks(member):
@@ -180,7 +477,8 @@ def _toggle_heading(level, text, children):
         key: {
             "rich_text": [{"type": "text", "text": {"content": text[:2000]}}],
             "is_toggleable": True,
-            "children": children[:100] if children else [],
+            # Children beyond Notion's per-request limit are split off on upload
+            "children": children or [],
         },
     }
 
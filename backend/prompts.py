@@ -1,3 +1,11 @@
+# Bump whenever the prompts below change in a way that should invalidate
+# cached LLM results (see llm_cache.py).
+PROMPT_VERSION = "2"
+
+# These prompts are sent as the system prompt, ahead of the per-page content,
+# so they form a stable prefix that the API can cache (see llm.cached_system).
+# Keep them free of per-request values.
+
 TEAM_EXTRACTION_PROMPT = """Given this HTML from a team/leadership page, extract every team member visible on the page.
 
 For each person return:
@@ -33,29 +41,27 @@ Important:
 - If no photo or profile URL exists, use null
 - Infer the company name from the page content, meta tags, or title"""
 
-PROFILE_EXTRACTION_PROMPT = """Extract structured information from this person's profile page HTML.
-
-Person: {name} — {title}
+PROFILE_EXTRACTION_PROMPT = """Extract structured information from the profile page HTML of the person named in the message.
 
 Return ONLY valid JSON in this exact format:
-{{
+{
   "bio": "Full biography text as a single string",
   "education": [
-    {{
+    {
       "school": "University Name",
       "degree": "Degree type and field",
       "honors": "Any honors, distinctions, or notable details (null if none)"
-    }}
+    }
   ],
   "career": [
-    {{
+    {
       "company": "Company Name",
       "role": "Role/Position",
       "details": "Any additional details (null if none)"
-    }}
+    }
   ],
   "personal": ["Interest or personal detail 1", "Interest or personal detail 2"]
-}}
+}
 
 Important:
 - Extract the full bio text, not a summary
@@ -64,11 +70,9 @@ Important:
 - Personal details include hobbies, interests, side projects, quirks mentioned in the bio
 - If a section has no data, use an empty array []"""
 
-ANALYSIS_PROMPT = """You are an intelligence analyst producing a classified-feel team dossier on {team_count} people at {company}. Your job is to find what others miss — hidden patterns, power dynamics, cultural tells, and standout individuals. Be EXTREMELY specific: reference people BY NAME, give exact counts and percentages, and surface non-obvious connections.
+ANALYSIS_PROMPT = """You are an intelligence analyst producing a classified-feel team dossier on the company and team described in the message. Your job is to find what others miss — hidden patterns, power dynamics, cultural tells, and standout individuals. Be EXTREMELY specific: reference people BY NAME, give exact counts and percentages, and surface non-obvious connections.
 
-Here is the structured data for every team member:
-
-{team_data}
+The message gives the company name, the team size and structured data for every team member.
 
 Produce analysis in the following 6 sections. Each section should be a JSON object with "title" and "content" (markdown string). The first 4 sections should read like intelligence analysis — opinionated, sharp, surprising. The last 2 are structured reference sections.
 
@@ -130,10 +134,63 @@ For larger teams (50+), lead with statistical patterns but still name standouts.
 
 Return ONLY valid JSON as an array of objects:
 [
-  {{
+  {
     "title": "Section Title",
     "content": "## Heading\\n\\nMarkdown content with **bold names**, bullet points, exact numbers..."
-  }}
+  }
 ]
 
 This should read like a compelling, opinionated intelligence report — not a formulaic HR summary. Surprise the reader. Make them feel like they have an unfair advantage after reading this."""
+
+# Large teams are analysed map-reduce style (see analyzer.py): each group, or
+# slice of a large group, is condensed into a digest, and the dossier is
+# written from the digests instead of every member's full data.
+
+DIGEST_PROMPT = """You are preparing notes for an analyst who will write a dossier on a large team. The message gives the company name and structured data for one or more of its groups (or part of a large group). The analyst will only see your notes, never the underlying data, so keep everything they need: exact counts and the names behind them.
+
+Return ONLY valid JSON in this exact format:
+{
+  "groups": ["Group name as given"],
+  "count": 12,
+  "seniority": {"Partner": 4, "Principal": 3},
+  "gender": {"women": 5, "men": 7, "unclear": 0},
+  "schools": [
+    {"school": "Harvard Business School", "degree": "MBA", "people": ["Person Name", "Person Name"]}
+  ],
+  "employers": [
+    {"company": "McKinsey & Company", "people": ["Person Name"]}
+  ],
+  "founders": [
+    {"name": "Person Name", "built": "What they founded or operated"}
+  ],
+  "standouts": [
+    {"name": "Person Name", "why": "One or two sentences on what makes them unusual"}
+  ],
+  "personal": [
+    {"interest": "Marathon running", "people": ["Person Name"]}
+  ],
+  "patterns": ["A specific, non-obvious observation about this group, naming people"]
+}
+
+Important:
+- Count every member in the message; seniority and gender counts must add up to "count"
+- Infer gender only from names and pronouns in the data; use "unclear" otherwise
+- List every school, employer and interest shared by two or more people; list others only if notable
+- Name 3-6 standouts for larger groups, fewer for small ones
+- Be terse: these notes are input for another model, not prose for a reader"""
+
+# The synthesis prompt is the analysis prompt with this sentence swapped for a
+# description of the digests, so the two can't drift apart
+ANALYSIS_INPUT = "The message gives the company name, the team size and structured data for every team member."
+if ANALYSIS_INPUT not in ANALYSIS_PROMPT:
+    # Otherwise the synthesis call would be told it has every member's data
+    raise RuntimeError("ANALYSIS_INPUT must match its sentence in ANALYSIS_PROMPT")
+
+SYNTHESIS_PROMPT = ANALYSIS_PROMPT.replace(
+    ANALYSIS_INPUT,
+    "The team is too large to send in full, so the message gives the company name, the team size and digests"
+    " of its groups, each covering one or more groups or part of a large one: exact seniority and gender"
+    " counts, shared schools, employers and interests with the people behind them, founders, standouts and"
+    " notable patterns. Add counts up across digests for team-wide numbers, and connect people across"
+    " digests — they were written separately, so cross-group patterns are yours to find.",
+)
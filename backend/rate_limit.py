@@ -0,0 +1,156 @@
+"""Client-side rate limiting: a token bucket for fixed rates, a budget that
+follows the rate limits the Anthropic API reports, and the Retry-After
+parsing every HTTP client here shares."""
+import random
+import asyncio
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+
+def retry_after_seconds(headers):
+    """Seconds from a Retry-After header (delay or HTTP date), or None."""
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """Allows `rate` acquisitions per second on average, in bursts of up to `capacity`."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available, then take it."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    wait = self._paused_until - now
+                else:
+                    self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                    self._updated = now
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        """Hand out no tokens for `seconds` (e.g. after a 429 with Retry-After)."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._tokens = 0
+            self._updated = self._paused_until
+
+
+def _seconds_until(timestamp):
+    try:
+        reset = datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+    except (AttributeError, ValueError):
+        return None
+    return max(0.0, (reset - datetime.now(timezone.utc)).total_seconds())
+
+
+def anthropic_quota(headers, kind):
+    """(limit, remaining, seconds until reset) from Anthropic's rate-limit
+    headers for kind ("requests", "tokens", "input-tokens" or
+    "output-tokens"), or None if the response didn't carry them."""
+    prefix = f"anthropic-ratelimit-{kind}"
+    try:
+        limit = int(headers.get(f"{prefix}-limit"))
+        remaining = int(headers.get(f"{prefix}-remaining"))
+    except (TypeError, ValueError):
+        return None
+    return limit, remaining, _seconds_until(headers.get(f"{prefix}-reset"))
+
+
+class RequestBudget:
+    """Requests and input tokens left in the API's rate-limit windows, per model.
+
+    update() takes the numbers from each response's rate-limit headers;
+    acquire() spends one request and the call's estimated input tokens
+    from them, waiting for the window to reset (plus jitter, so queued
+    callers don't all fire at once) when too little is left. Until a model
+    has reported its limits, or once a window has reset, requests go
+    straight through.
+    """
+
+    KINDS = ("requests", "input-tokens")
+
+    def __init__(self, max_wait=60, jitter=0.2):
+        self.max_wait = max_wait
+        self.jitter = jitter
+        self._windows = {}
+        self._lock = threading.Lock()
+
+    def update(self, key, headers):
+        now = time.monotonic()
+        with self._lock:
+            for kind in self.KINDS:
+                quota = anthropic_quota(headers, kind)
+                if quota is None:
+                    continue
+                limit, remaining, reset = quota
+                self._windows[(key, kind)] = {
+                    "limit": limit,
+                    "remaining": remaining,
+                    "reset": now + reset if reset is not None else None,
+                }
+
+    def _take(self, key, tokens):
+        """Spend one request and tokens; 0 if they were available, else seconds to wait."""
+        now = time.monotonic()
+        with self._lock:
+            wait = 0
+            for kind, cost in zip(self.KINDS, (1, tokens)):
+                window = self._windows.get((key, kind))
+                if window is None:
+                    continue
+                if window["reset"] is not None and now >= window["reset"]:
+                    window["remaining"], window["reset"] = window["limit"], None
+                # A call bigger than the whole window can only wait for a full one. Once
+                # the reset has passed, the next response says what the new window holds
+                if window["remaining"] < min(cost, window["limit"]) and window["reset"] is not None:
+                    wait = max(wait, window["reset"] - now)
+            if wait:
+                return min(wait, self.max_wait) * (1 + random.uniform(0, self.jitter))
+            for kind, cost in zip(self.KINDS, (1, tokens)):
+                window = self._windows.get((key, kind))
+                if window is not None:
+                    window["remaining"] -= cost
+            return 0
+
+    def acquire(self, key, tokens=0):
+        """Block until the budget allows a call; returns the seconds waited."""
+        waited = 0
+        while True:
+            wait = self._take(key, tokens)
+            if not wait:
+                return waited
+            time.sleep(wait)
+            waited += wait
+
+    async def acquire_async(self, key, tokens=0):
+        waited = 0
+        while True:
+            wait = self._take(key, tokens)
+            if not wait:
+                return waited
+            await asyncio.sleep(wait)
+            waited += wait
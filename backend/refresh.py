@@ -0,0 +1,124 @@
+"""Incremental refresh of a finished dossier.
+
+Re-extracts the team structure, diffs members against the previous result
+by profile URL (or name), and only re-extracts profiles that are new or
+whose cleaned profile page changed, judged by the content hashes recorded
+on the previous run. Unchanged members keep their previous profile data.
+"""
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import metrics
+import router
+import structured_extract
+from scraper import (
+    fetch_page,
+    extract_team_structure,
+    profile_request,
+    extract_profile,
+    fetch_profile,
+    empty_profile,
+    content_hash,
+    member_key,
+    list_members,
+    assemble_team,
+)
+
+# Fields filled in by profile extraction, reused for unchanged members
+PROFILE_FIELDS = ("bio", "education", "career", "personal")
+
+
+def roster(team_data):
+    """Who is on the team, in which group and with which title."""
+    return sorted(
+        (group_name, member_key(m), m.get("name"), m.get("title"))
+        for group_name, _, m in list_members(team_data.get("groups", []))
+    )
+
+
+def refresh_team(url, previous_result, previous_hashes, progress_callback=None,
+                 member_callback=None, profile_hashes=None, max_workers=10):
+    """Rebuild team data, re-processing only new or changed members.
+
+    Returns (team_data, roster_changed).
+    """
+    if progress_callback:
+        progress_callback(5, "Re-fetching team page...")
+
+    html = fetch_page(url, revalidate=True)
+
+    if progress_callback:
+        progress_callback(10, "Re-analyzing page structure...")
+
+    team_data = extract_team_structure(html, url)
+    company = team_data.get("company", "Unknown Company")
+    groups = team_data.get("groups", [])
+
+    previous = {member_key(m): m for _, _, m in list_members(previous_result.get("groups", []))}
+    all_members = list_members(groups)
+    total_members = len(all_members)
+    counts = {"new": 0, "changed": 0, "unchanged": 0}
+
+    if progress_callback:
+        progress_callback(20, f"Found {total_members} team members. Checking for changes...")
+
+    def refresh_member(member):
+        key = member_key(member)
+        old = previous.get(key)
+        if old is None:
+            return "new", fetch_profile(member, profile_hashes=profile_hashes)
+        if not member.get("profile_url"):
+            return "unchanged", {**empty_profile(member), **{f: old.get(f) for f in PROFILE_FIELDS}}
+
+        try:
+            html = fetch_page(member["profile_url"], revalidate=True)
+            route, content = profile_request(member, html)
+        except Exception as e:
+            print(f"Error fetching profile for {member['name']}: {e}")
+            return "changed", empty_profile(member)
+        digest = content_hash(content)
+
+        def extracted(profile):
+            # Recorded only once the profile is in hand, as in scraper.fetch_profile: a
+            # failed member without a hash is extracted again by the next refresh
+            if profile_hashes is not None:
+                profile_hashes[key] = digest
+            return profile
+
+        if previous_hashes.get(key) == digest:
+            return "unchanged", extracted({**member, **{f: old.get(f) for f in PROFILE_FIELDS}})
+        fast = structured_extract.extract_profile(html, member) or router.short_profile(html, member)
+        if fast:
+            return "changed", extracted({**member, **fast})
+        try:
+            return "changed", extracted(extract_profile(member, route, content))
+        except Exception as e:
+            print(f"Error extracting profile for {member['name']}: {e}")
+            return "changed", empty_profile(member)
+
+    def refresh_and_track(group_name, idx, member):
+        return (group_name, idx, *refresh_member(member))
+
+    completed = 0
+    enriched_groups = {g["name"]: [] for g in groups}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(metrics.in_context(refresh_and_track), gn, idx, m) for gn, idx, m in all_members]
+        try:
+            for future in as_completed(futures):
+                group_name, idx, change, enriched_member = future.result()
+                counts[change] += 1
+                enriched_groups[group_name].append((idx, enriched_member))
+                if member_callback:
+                    member_callback(group_name, idx, enriched_member)
+                completed += 1
+                if progress_callback:
+                    pct = 20 + int((completed / total_members) * 50)
+                    progress_callback(
+                        pct,
+                        f"Refreshing profiles ({completed}/{total_members}): "
+                        f"{counts['new']} new, {counts['changed']} changed, {counts['unchanged']} unchanged",
+                    )
+        except BaseException:
+            executor.shutdown(cancel_futures=True)
+            raise
+
+    team_data = assemble_team(company, groups, enriched_groups)
+    return team_data, roster(team_data) != roster(previous_result)
@@ -0,0 +1,171 @@
+"""Model routing for the pipeline's Claude calls.
+
+Every call gets a Route: a model tier, max_tokens and timeout picked from
+the size of its input. Small team pages go to the fast tier and larger ones
+to the balanced tier; small teams get their insights from the balanced tier
+and larger ones from the deep tier. Profile pages with barely any text skip
+Claude altogether.
+
+A response that isn't valid JSON of the expected shape (including one cut
+off at max_tokens), or a fast-tier team extraction that found nobody, is
+retried one tier up with twice the max_tokens, until the deep tier. Each route taken is printed and counted in the metrics.
+"""
+import os
+from collections import namedtuple
+import metrics
+import structured_extract
+from html_chunker import estimate_tokens
+
+# ROUTER_ENABLED=0 restores fixed models (balanced for team pages, fast for
+# profiles, deep for insights) without escalation or skipped profiles
+ROUTER_ENABLED = os.environ.get("ROUTER_ENABLED", "1") == "1"
+TIERS = ("fast", "balanced", "deep")
+MODELS = {
+    "fast": os.environ.get("ROUTER_FAST_MODEL", "claude-haiku-4-5-20251001"),
+    "balanced": os.environ.get("ROUTER_BALANCED_MODEL", "claude-sonnet-4-20250514"),
+    "deep": os.environ.get("ROUTER_DEEP_MODEL", "claude-opus-4-20250514"),
+}
+# Team pages (or chunks of one) up to this many estimated tokens go to the fast tier
+ROUTER_SMALL_PAGE_TOKENS = int(os.environ.get("ROUTER_SMALL_PAGE_TOKENS", 12_000))
+# Teams up to this many members get their insights from the balanced tier
+ROUTER_SMALL_TEAM_MEMBERS = int(os.environ.get("ROUTER_SMALL_TEAM_MEMBERS", 25))
+# Profile pages with less visible text than this are taken as is, bio only
+ROUTER_SKIP_PROFILE_CHARS = int(os.environ.get("ROUTER_SKIP_PROFILE_CHARS", 300))
+# Highest max_tokens an escalated call may ask for
+ROUTER_MAX_TOKENS = int(os.environ.get("ROUTER_MAX_TOKENS", 32_000))
+
+# Seconds before a call is abandoned (and retried by the SDK), per tier
+TIMEOUTS = {"fast": 60, "balanced": 180, "deep": 600}
+
+Route = namedtuple("Route", ["stage", "tier", "model", "max_tokens", "timeout", "reason"])
+
+PROFILE_FIELDS = {"bio": (str, type(None)), "education": list, "career": list, "personal": list}
+
+
+def _route(stage, tier, max_tokens, reason):
+    return Route(stage, tier, MODELS[tier], max_tokens, TIMEOUTS[tier], reason)
+
+
+def team_route(content):
+    tokens = estimate_tokens(content)
+    if ROUTER_ENABLED and tokens <= ROUTER_SMALL_PAGE_TOKENS:
+        return _route("team", "fast", 8192, f"{tokens} tokens")
+    return _route("team", "balanced", 8192, f"{tokens} tokens")
+
+
+def profile_route(content):
+    return _route("profile", "fast", 4096, f"{estimate_tokens(content)} tokens")
+
+
+def digest_route(members):
+    return _route("digest", "fast", 4096, f"{members} members")
+
+
+def insights_route(team_count):
+    if ROUTER_ENABLED and team_count <= ROUTER_SMALL_TEAM_MEMBERS:
+        return _route("insights", "balanced", 16384, f"{team_count} members")
+    return _route("insights", "deep", 16384, f"{team_count} members")
+
+
+def escalate(route):
+    """The same call one tier up with twice the max_tokens, or None at the top."""
+    if not ROUTER_ENABLED or route.tier == TIERS[-1]:
+        return None
+    tier = TIERS[TIERS.index(route.tier) + 1]
+    return _route(route.stage, tier, min(route.max_tokens * 2, ROUTER_MAX_TOKENS), "escalated")
+
+
+def record(route, escalated=False):
+    """Report the route a call took."""
+    print(f"Routing {route.stage} to {route.tier} ({route.model}, {route.reason})")
+    metrics.record_route(route.stage, route.tier, escalated)
+
+
+def valid(stage, data):
+    """Whether parsed output has the shape the stage's prompt asks for."""
+    if stage == "team":
+        return isinstance(data, dict) and isinstance(data.get("groups"), list) and all(
+            isinstance(g, dict) and isinstance(g.get("members"), list) for g in data["groups"]
+        )
+    if stage == "profile":
+        return isinstance(data, dict) and all(isinstance(data.get(k), t) for k, t in PROFILE_FIELDS.items())
+    if stage == "digest":
+        return isinstance(data, dict) and isinstance(data.get("count"), int)
+    if stage == "insights":
+        return isinstance(data, list) and bool(data) and all(
+            isinstance(s, dict) and s.get("title") and isinstance(s.get("content"), str) for s in data
+        )
+    return True
+
+
+def has_members(team_data):
+    """Whether extracted team data names at least one member."""
+    return any(
+        isinstance(m, dict) and m.get("name") for g in team_data.get("groups", []) for m in g.get("members", [])
+    )
+
+
+def _check(route, data):
+    if not valid(route.stage, data):
+        raise ValueError(f"unexpected {route.stage} output shape")
+    # An empty roster is how the fast tier most often fails on a team page;
+    # the tiers above it are trusted when they find nobody
+    if route.stage == "team" and route.tier == "fast" and not has_members(data):
+        raise ValueError("no team members found")
+    return data
+
+
+def _next(route, error):
+    """The escalated route after a failed call, or re-raise the failure."""
+    escalated = escalate(route)
+    if escalated is None:
+        raise error
+    print(f"{route.stage} output from {route.model} was invalid ({error}), escalating to {escalated.model}")
+    return escalated
+
+
+def call(route, fn):
+    """Run fn(route) and validate its parsed output, escalating until it is valid.
+
+    fn must make the Claude call and parse the response; a ValueError from
+    parsing counts as invalid output. Returns the output.
+    """
+    escalated = False
+    while True:
+        record(route, escalated)
+        try:
+            return _check(route, fn(route))
+        except ValueError as e:
+            route, escalated = _next(route, e), True
+
+
+async def acall(route, fn):
+    """Async counterpart of call(), for a coroutine function fn."""
+    escalated = False
+    while True:
+        record(route, escalated)
+        try:
+            return _check(route, await fn(route))
+        except ValueError as e:
+            route, escalated = _next(route, e), True
+
+
+def short_profile(html, member):
+    """Profile data for a page with too little text to need Claude, or None.
+
+    The page's visible text (its <main>, if it has one), minus the member's
+    name and title, becomes the bio.
+    """
+    if not ROUTER_ENABLED:
+        return None
+    root = structured_extract.parse_html(html)
+    main = next((node for node in root.walk() if node.tag == "main"), None)
+    text = (main or root).text()
+    if len(text) >= ROUTER_SKIP_PROFILE_CHARS:
+        return None
+    for label in (member.get("name"), member.get("title")):
+        if label and text.startswith(label):
+            text = text[len(label):].strip(" —-|,")
+    print(f"Routing profile of {member['name']} past Claude ({len(text)} characters of text)")
+    metrics.record_route("profile", "skipped")
+    return {"bio": text or None, "education": [], "career": [], "personal": []}
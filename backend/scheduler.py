@@ -0,0 +1,163 @@
+"""Bounded, prioritized scheduler for dossier jobs.
+
+Instead of a thread per submission, every job is queued here and run by a
+fixed pool of SCHEDULER_WORKERS threads. Interactive submissions go ahead
+of bulk ones (first come, first served within a priority), so a burst of
+bulk URLs waits in line rather than every pipeline competing for Anthropic
+rate limits at once. Bulk jobs never hold more than BULK_WORKERS workers,
+so an interactive job doesn't wait for a long bulk one to finish. Each job also gets a quota of concurrent profile
+workers, smaller for bulk jobs.
+
+Queued jobs are cancelled immediately; running jobs stop at their next
+progress update, when check() raises JobCancelled.
+"""
+import os
+import heapq
+import itertools
+import threading
+
+# Dossier jobs running at once, across all submissions
+SCHEDULER_WORKERS = int(os.environ.get("SCHEDULER_WORKERS", 4))
+# Of those, how many bulk jobs may hold; the rest are kept for interactive ones
+BULK_WORKERS = int(os.environ.get("BULK_WORKERS", max(1, SCHEDULER_WORKERS - 1)))
+
+INTERACTIVE = 0
+BULK = 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BULK: "bulk"}
+
+# Concurrent profile fetches/extractions allowed per job. Within that, the
+# adaptive per-host and per-model limits (adaptive_limit.py) decide how many
+# requests are actually in flight
+PROFILE_WORKERS = {
+    INTERACTIVE: int(os.environ.get("INTERACTIVE_PROFILE_WORKERS", 24)),
+    BULK: int(os.environ.get("BULK_PROFILE_WORKERS", 3)),
+}
+
+
+class JobCancelled(Exception):
+    """Raised inside a running job once it has been cancelled."""
+
+
+class Scheduler:
+    def __init__(self, workers=SCHEDULER_WORKERS, bulk_workers=BULK_WORKERS):
+        self.workers = workers
+        self.bulk_workers = bulk_workers
+        # Heap of (priority, sequence, job_id) entries. A queued job maps to its
+        # current entry and task; stale entries (cancelled, promoted) are skipped
+        self._heap = []
+        self._queued = {}
+        # Running job ids and their priorities
+        self._running = {}
+        self._cancelled = set()
+        self._sequence = itertools.count()
+        self._cond = threading.Condition()
+        self._threads = []
+
+    def _start(self):
+        """Start the worker threads on first use (called with the lock held)."""
+        if self._threads:
+            return
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"scheduler-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, job_id, fn, *args, priority=INTERACTIVE):
+        """Queue fn(*args) to run as job_id."""
+        with self._cond:
+            self._start()
+            entry = (priority, next(self._sequence), job_id)
+            self._queued[job_id] = (entry, fn, args)
+            # A retried job may still be winding down from an earlier cancel
+            self._cancelled.discard(job_id)
+            heapq.heappush(self._heap, entry)
+            self._cond.notify()
+
+    def promote(self, job_id, priority):
+        """Move a queued job up to a better priority. Returns True if it moved."""
+        with self._cond:
+            queued = self._queued.get(job_id)
+            if queued is None or queued[0][0] <= priority:
+                return False
+            entry = (priority, next(self._sequence), job_id)
+            self._queued[job_id] = (entry, *queued[1:])
+            heapq.heappush(self._heap, entry)
+            # An idle worker may have been holding off on it as a bulk job
+            self._cond.notify_all()
+            return True
+
+    def position(self, job_id):
+        """1-based place in line of a queued job, or None if it isn't queued."""
+        with self._cond:
+            if job_id not in self._queued:
+                return None
+            entry = self._queued[job_id][0]
+            return sum(1 for other, _, _ in self._queued.values() if other <= entry)
+
+    def cancel(self, job_id):
+        """Cancel a job. Returns "queued" or "running" (where it was caught), or None."""
+        with self._cond:
+            if self._queued.pop(job_id, None) is not None:
+                return "queued"
+            if job_id in self._running:
+                self._cancelled.add(job_id)
+                return "running"
+            return None
+
+    def job_ids(self):
+        """Ids of the jobs queued or running here."""
+        with self._cond:
+            return set(self._queued) | set(self._running)
+
+    def counts(self):
+        """(queued, running) job counts."""
+        with self._cond:
+            return len(self._queued), len(self._running)
+
+    def check(self, job_id):
+        """Raise JobCancelled if the running job has been cancelled."""
+        if job_id in self._cancelled:
+            raise JobCancelled(job_id)
+
+    def _next(self):
+        """Take the next job to run off the queue, or None if there is none or
+        it is a bulk job and bulk jobs hold their share of workers already
+        (called with the lock held)."""
+        while self._heap:
+            entry = self._heap[0]
+            queued = self._queued.get(entry[2])
+            if queued is None or queued[0] != entry:
+                heapq.heappop(self._heap)
+                continue
+            # Interactive jobs sort first, so a bulk job here means none are queued
+            bulk_running = sum(1 for p in self._running.values() if p != INTERACTIVE)
+            if entry[0] != INTERACTIVE and bulk_running >= self.bulk_workers:
+                return None
+            heapq.heappop(self._heap)
+            del self._queued[entry[2]]
+            self._running[entry[2]] = entry[0]
+            return queued
+
+    def _work(self):
+        while True:
+            with self._cond:
+                queued = self._next()
+                while queued is None:
+                    self._cond.wait()
+                    queued = self._next()
+                entry, fn, args = queued
+                job_id = entry[2]
+
+            try:
+                fn(*args)
+            except Exception as e:
+                print(f"Scheduled job {job_id} failed: {e}")
+            finally:
+                with self._cond:
+                    self._running.pop(job_id, None)
+                    self._cancelled.discard(job_id)
+                    # A bulk job may have been waiting for this worker
+                    self._cond.notify_all()
+
+
+scheduler = Scheduler()
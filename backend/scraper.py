@@ -1,13 +1,33 @@
-import requests
-import cloudscraper
-from bs4 import BeautifulSoup
-from urllib.parse import urljoin, urlparse
+import hashlib
+import os
+import threading
+from contextlib import nullcontext
+from urllib.parse import urljoin
 from concurrent.futures import ThreadPoolExecutor, as_completed
-import json
-import anthropic
+import adaptive_limit
+import html_cleaner
+import metrics
+import llm_cache
+import router
+import structured_extract
+from llm import complete_json, stream_json, anthropic_client
 from prompts import TEAM_EXTRACTION_PROMPT, PROFILE_EXTRACTION_PROMPT
-
-client = anthropic.Anthropic()
+from fetch_cache import FetchCache, FETCH_CACHE_ENABLED, normalize_url
+from http_client import http
+from rate_limit import retry_after_seconds
+from html_chunker import chunk_html, merge_team_data
+from members import member_key
+from singleflight import SingleFlight
+
+client = anthropic_client()
+page_cache = FetchCache() if FETCH_CACHE_ENABLED else None
+# Jobs scraping the same profile at the same time share one fetch + extraction
+profile_flights = SingleFlight()
+
+# Team pages larger than this (estimated tokens of cleaned HTML) are split
+# into chunks that are extracted concurrently
+TEAM_CHUNK_TOKENS = int(os.environ.get("TEAM_CHUNK_TOKENS", 40_000))
+TEAM_CHUNK_WORKERS = int(os.environ.get("TEAM_CHUNK_WORKERS", 4))
 
 HEADERS = {
     "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36",
@@ -23,162 +43,272 @@ HEADERS = {
 }
 
 
-def fetch_page(url, retries=2):
+def fetch_page(url, retries=2, revalidate=False):
     """Fetch a web page and return its HTML content.
-    Falls back to cloudscraper for Cloudflare-protected pages."""
-    for attempt in range(retries + 1):
-        try:
-            resp = requests.get(url, headers=HEADERS, timeout=30, allow_redirects=True)
+    Falls back to cloudscraper for Cloudflare-protected pages (see http_client).
+    Pages are served from the fetch cache while fresh, and revalidated with a
+    conditional request once stale (or always, with revalidate=True)."""
+    cached = page_cache.lookup(url) if page_cache else None
+    if cached and cached.fresh and not revalidate:
+        return cached.body
+
+    headers = request_headers(cached)
+    limit = adaptive_limit.host_limit(url)
+    with metrics.span("fetch_page"):
+        for attempt in range(retries + 1):
+            # At most the host's adaptive limit in flight, across all jobs
+            with limit.slot() as slot:
+                # Pooled per-host sessions; 403s are retried through cloudscraper
+                resp = http.get(url, headers=headers, timeout=30)
+                if resp.status_code in adaptive_limit.OVERLOAD_STATUSES:
+                    # Holds back every request to the host, this retry included
+                    slot.overloaded(retry_after_seconds(resp.headers) or 2 * (attempt + 1))
+            if resp.status_code == 304 and cached:
+                page_cache.revalidated(url)
+                return cached.body
+            if attempt < retries and resp.status_code in adaptive_limit.OVERLOAD_STATUSES:
+                metrics.record_retry("fetch")
+                continue
             resp.raise_for_status()
+            cache_response(url, resp)
             return resp.text
-        except requests.exceptions.HTTPError as e:
-            if resp.status_code == 403:
-                # Cloudflare or similar — try cloudscraper
-                scraper = cloudscraper.create_scraper()
-                resp2 = scraper.get(url, timeout=30)
-                resp2.raise_for_status()
-                return resp2.text
-            if attempt < retries and resp.status_code in (429, 503):
-                import time
-                time.sleep(2 * (attempt + 1))
-                continue
-            raise
-
 
-def extract_team_structure(html, url):
-    """Use Claude to parse team page HTML and extract team member data."""
-    # Trim HTML to reduce token usage — remove scripts, styles, nav, footer
-    soup = BeautifulSoup(html, "html.parser")
-    for tag in soup(["script", "style", "nav", "footer", "noscript", "svg", "iframe"]):
-        tag.decompose()
 
-    cleaned_html = str(soup)
-    # Truncate if extremely large (Claude context limit)
-    if len(cleaned_html) > 300_000:
-        cleaned_html = cleaned_html[:300_000]
-
-    message = client.messages.create(
-        model="claude-sonnet-4-20250514",
-        max_tokens=8192,
-        messages=[
-            {
-                "role": "user",
-                "content": f"The page URL is: {url}\n\nHTML content:\n\n{cleaned_html}\n\n{TEAM_EXTRACTION_PROMPT}",
-            }
-        ],
+def request_headers(cached):
+    """Browser headers, plus conditional headers when revalidating a cached page."""
+    headers = dict(HEADERS)
+    if cached:
+        if cached.etag:
+            headers["If-None-Match"] = cached.etag
+        if cached.last_modified:
+            headers["If-Modified-Since"] = cached.last_modified
+    return headers
+
+
+def cache_response(url, resp):
+    """Store a successful response in the fetch cache unless it forbids it."""
+    if not page_cache or "no-store" in resp.headers.get("Cache-Control", ""):
+        return
+    page_cache.store(
+        url,
+        resp.text,
+        etag=resp.headers.get("ETag"),
+        last_modified=resp.headers.get("Last-Modified"),
     )
 
-    response_text = message.content[0].text
-    # Extract JSON from response (handle markdown code blocks)
-    if "```json" in response_text:
-        response_text = response_text.split("```json")[1].split("```")[0]
-    elif "```" in response_text:
-        response_text = response_text.split("```")[1].split("```")[0]
-
-    team_data = json.loads(response_text.strip())
 
-    # Resolve relative URLs
-    base_url = f"{urlparse(url).scheme}://{urlparse(url).netloc}"
+def clean_html(html, max_chars):
+    """Trim HTML to reduce token usage — remove scripts, styles, nav, footer."""
+    cleaned_html = html_cleaner.clean_html(html)
+    # Truncate if extremely large (Claude context limit)
+    if len(cleaned_html) > max_chars:
+        cleaned_html = cleaned_html[:max_chars]
+    return cleaned_html
+
+
+def team_requests(html, url):
+    """Route and message content for each chunk of a team page.
+
+    Pages that fit in TEAM_CHUNK_TOKENS are sent whole; larger pages are
+    split on structural boundaries and each part is extracted separately.
+    """
+    cleaned_html = html_cleaner.clean_html(html)
+    chunks = chunk_html(cleaned_html, TEAM_CHUNK_TOKENS)
+    if len(chunks) == 1:
+        content = f"The page URL is: {url}\n\nHTML content:\n\n{cleaned_html}"
+        return [(router.team_route(content), content)]
+
+    requests = []
+    for i, chunk in enumerate(chunks):
+        context = f"This is part {i + 1} of {len(chunks)} of the page's HTML."
+        if chunk.heading:
+            context += (
+                f' The last section heading before this part is "{chunk.heading}";'
+                " members at the start of this part belong to that group unless the HTML shows otherwise."
+            )
+        content = f"The page URL is: {url}\n\n{context}\n\nHTML content:\n\n{chunk.html}"
+        requests.append((router.team_route(content), content))
+    return requests
+
+
+def resolve_member_url(member, url):
+    """Resolve a member's relative photo and profile URLs against the team page URL."""
+    if member.get("photo_url") and not member["photo_url"].startswith("http"):
+        member["photo_url"] = urljoin(url, member["photo_url"])
+    if member.get("profile_url") and not member["profile_url"].startswith("http"):
+        member["profile_url"] = urljoin(url, member["profile_url"])
+    return member
+
+
+def resolve_member_urls(team_data, url):
+    """Resolve relative photo and profile URLs against the team page URL."""
     for group in team_data.get("groups", []):
         for member in group.get("members", []):
-            if member.get("photo_url") and not member["photo_url"].startswith("http"):
-                member["photo_url"] = urljoin(url, member["photo_url"])
-            if member.get("profile_url") and not member["profile_url"].startswith("http"):
-                member["profile_url"] = urljoin(url, member["profile_url"])
+            resolve_member_url(member, url)
+    return team_data
 
+
+def is_member_path(path):
+    """Whether a path in the team extraction JSON is one member's object: ("groups", i, "members", j)."""
+    return len(path) == 4 and path[0] == "groups" and path[2] == "members"
+
+
+def _extract_team_chunk(route, content, found_callback=None):
+    team_data = llm_cache.lookup(route.model, TEAM_EXTRACTION_PROMPT, content)
+    if team_data is None:
+        if found_callback:
+            # Streamed, so each member is passed on as soon as the model has written it
+            def call(r):
+                return stream_json(
+                    client, "Team extraction", r, TEAM_EXTRACTION_PROMPT, content, is_member_path,
+                    lambda path, member: found_callback(member),
+                )
+        else:
+            def call(r):
+                return complete_json(client, "Team extraction", r, TEAM_EXTRACTION_PROMPT, content)
+        team_data = router.call(route, call)
+        llm_cache.store(route.model, TEAM_EXTRACTION_PROMPT, content, team_data)
+    elif found_callback:
+        for _, _, member in list_members(team_data.get("groups", [])):
+            found_callback(member)
     return team_data
 
 
-def fetch_profile(member, progress_callback=None):
-    """Fetch and parse an individual profile page."""
-    profile_url = member.get("profile_url")
-    if not profile_url:
-        return {**member, "bio": None, "education": [], "career": [], "personal": []}
+def extract_team_structure(html, url, found_callback=None):
+    """Use Claude to parse team page HTML and extract team member data.
+    Pages with structured data or a regular card grid skip Claude; large
+    pages are extracted in concurrent chunks and merged.
+
+    With found_callback, the extraction is streamed and found_callback(member)
+    is called (from any thread) with each member, URLs resolved, as soon as
+    it has been read, before the rest of the team. A member can be passed
+    more than once (chunk overlaps, escalated calls) or be missing from the
+    final result."""
+    fast = structured_extract.extract_team(html, url)
+    if fast:
+        team_data, method = fast
+        print(f"Team structure read from {method}, skipping Claude")
+        return resolve_member_urls(team_data, url)
+
+    found = found_callback and (lambda member: found_callback(resolve_member_url(member, url)))
+    requests = team_requests(html, url)
+    if len(requests) == 1:
+        return resolve_member_urls(_extract_team_chunk(*requests[0], found), url)
+
+    with ThreadPoolExecutor(max_workers=min(len(requests), TEAM_CHUNK_WORKERS)) as executor:
+        parts = list(executor.map(metrics.in_context(lambda r: _extract_team_chunk(*r, found)), requests))
+    return merge_team_data([resolve_member_urls(part, url) for part in parts])
+
+
+def profile_request(member, html):
+    """Route and message content for extracting one member's profile page."""
+    cleaned_html = clean_html(html, 100_000)
+    content = (
+        f"Person: {member['name']} — {member.get('title', 'Unknown')}\n\n"
+        f"Profile page URL: {member['profile_url']}\n\nHTML:\n\n{cleaned_html}"
+    )
+    return router.profile_route(content), content
 
-    try:
-        html = fetch_page(profile_url)
-        soup = BeautifulSoup(html, "html.parser")
-        for tag in soup(["script", "style", "nav", "footer", "noscript", "svg", "iframe"]):
-            tag.decompose()
-
-        cleaned_html = str(soup)
-        if len(cleaned_html) > 100_000:
-            cleaned_html = cleaned_html[:100_000]
-
-        prompt = PROFILE_EXTRACTION_PROMPT.format(
-            name=member["name"], title=member.get("title", "Unknown")
-        )
-
-        message = client.messages.create(
-            model="claude-haiku-4-5-20251001",
-            max_tokens=4096,
-            messages=[
-                {
-                    "role": "user",
-                    "content": f"Profile page URL: {profile_url}\n\nHTML:\n\n{cleaned_html}\n\n{prompt}",
-                }
-            ],
-        )
-
-        response_text = message.content[0].text
-        if "```json" in response_text:
-            response_text = response_text.split("```json")[1].split("```")[0]
-        elif "```" in response_text:
-            response_text = response_text.split("```")[1].split("```")[0]
-
-        profile_data = json.loads(response_text.strip())
-        return {**member, **profile_data}
 
-    except Exception as e:
-        print(f"Error fetching profile for {member['name']}: {e}")
-        return {**member, "bio": None, "education": [], "career": [], "personal": []}
+def content_hash(content):
+    """Fingerprint of a profile request, used to detect changed profile pages."""
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
 
 
-def scrape_team(url, progress_callback=None):
-    """Full scraping pipeline: fetch page → extract team → fetch profiles."""
-    if progress_callback:
-        progress_callback(5, "Fetching team page...")
+def empty_profile(member):
+    return {**member, "bio": None, "education": [], "career": [], "personal": []}
 
-    html = fetch_page(url)
 
-    if progress_callback:
-        progress_callback(10, "Analyzing page structure with AI...")
+def _extract_profile_data(member, route, content):
+    profile_data = llm_cache.lookup(route.model, PROFILE_EXTRACTION_PROMPT, content)
+    if profile_data is None:
+        label = f"Profile extraction ({member['name']})"
+        profile_data = router.call(route, lambda r: complete_json(client, label, r, PROFILE_EXTRACTION_PROMPT, content))
+        llm_cache.store(route.model, PROFILE_EXTRACTION_PROMPT, content, profile_data)
+    return profile_data
 
-    team_data = extract_team_structure(html, url)
-    company = team_data.get("company", "Unknown Company")
-    groups = team_data.get("groups", [])
 
-    # Count total members
-    total_members = sum(len(g.get("members", [])) for g in groups)
+def extract_profile(member, route, content):
+    """Run the profile extraction call for a prepared request."""
+    return {**member, **_extract_profile_data(member, route, content)}
 
-    if progress_callback:
-        progress_callback(20, f"Found {total_members} team members. Fetching individual profiles...")
 
-    # Fetch all individual profiles in parallel (track index to preserve order)
+def _load_profile(member):
+    """Fetch and extract a profile page. Returns (profile data, content hash)."""
+    html = fetch_page(member["profile_url"])
+    route, content = profile_request(member, html)
+    profile_data = structured_extract.extract_profile(html, member) or router.short_profile(html, member)
+    if profile_data is None:
+        profile_data = _extract_profile_data(member, route, content)
+    return profile_data, content_hash(content)
+
+
+def fetch_profile(member, progress_callback=None, profile_hashes=None):
+    """Fetch and parse an individual profile page.
+    The content hash of the profile request is recorded in profile_hashes."""
+    profile_url = member.get("profile_url")
+    if not profile_url:
+        return empty_profile(member)
+
+    try:
+        profile_data, digest = profile_flights.do(normalize_url(profile_url), _load_profile, member)
+        if profile_hashes is not None:
+            profile_hashes[member_key(member)] = digest
+        return {**member, **profile_data}
+
+    except Exception as e:
+        print(f"Error fetching profile for {member['name']}: {e}")
+        return empty_profile(member)
+
+
+class ProfilePool:
+    """Fetches and extracts members' profiles on a thread pool, each member once.
+
+    submit() can be called from any thread, e.g. as team extraction streams
+    members in; a member already submitted, or in done (member_key →
+    enriched member, from a checkpoint), isn't fetched again. Leaving the
+    with block cancels profiles that haven't started.
+    """
+
+    def __init__(self, max_workers, profile_hashes=None, done=None):
+        self.profile_hashes = profile_hashes
+        self.done = done or {}
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._futures = {}
+        self._lock = threading.Lock()
+        self._fetch = metrics.in_context(fetch_profile)
+
+    def submit(self, member):
+        """Start on member's profile; returns its Future (None for a member in done)."""
+        key = member_key(member)
+        if key in self.done:
+            return None
+        with self._lock:
+            future = self._futures.get(key)
+            if future is None:
+                future = self._executor.submit(self._fetch, member, profile_hashes=self.profile_hashes)
+                self._futures[key] = future
+            return future
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        # Members the final team left out (or everything, e.g. on cancellation)
+        self._executor.shutdown(cancel_futures=True)
+
+
+def list_members(groups):
+    """Flatten groups into (group name, index, member), tracking index to preserve order."""
     all_members = []
     for group in groups:
         for idx, m in enumerate(group.get("members", [])):
             all_members.append((group["name"], idx, m))
+    return all_members
 
-    completed = 0
-    enriched_groups = {g["name"]: [] for g in groups}
-
-    def fetch_and_track(group_name, idx, member):
-        return group_name, idx, fetch_profile(member)
-
-    with ThreadPoolExecutor(max_workers=10) as executor:
-        futures = {
-            executor.submit(fetch_and_track, gn, idx, m): (gn, idx, m)
-            for gn, idx, m in all_members
-        }
-        for future in as_completed(futures):
-            group_name, idx, enriched_member = future.result()
-            enriched_groups[group_name].append((idx, enriched_member))
-            completed += 1
-            if progress_callback:
-                pct = 20 + int((completed / total_members) * 50)
-                progress_callback(pct, f"Fetching profiles ({completed}/{total_members})...")
 
+def assemble_team(company, groups, enriched_groups):
+    """Rebuild the team from enriched (index, member) pairs keyed by group name."""
     # Sort each group by original index to preserve page order
     for group_name in enriched_groups:
         enriched_groups[group_name].sort(key=lambda x: x[0])
@@ -195,6 +325,72 @@ def scrape_team(url, progress_callback=None):
 
     return {
         "company": company,
-        "team_count": total_members,
+        "team_count": sum(len(g["members"]) for g in result_groups),
         "groups": result_groups,
     }
+
+
+def scrape_team(url, progress_callback=None, member_callback=None, profile_hashes=None, max_workers=10):
+    """Full scraping pipeline: fetch page → extract team → fetch profiles.
+    member_callback(group_name, idx, member) is called as each profile is enriched;
+    profile content hashes are collected in profile_hashes (see refresh.py).
+    At most max_workers profiles are processed at once."""
+    if progress_callback:
+        progress_callback(5, "Fetching team page...")
+
+    html = fetch_page(url)
+
+    if progress_callback:
+        progress_callback(10, "Analyzing page structure with AI...")
+
+    # Profiles are fetched while the rest of the team is still being extracted
+    with ProfilePool(max_workers, profile_hashes) as profiles:
+        team_data = extract_team_structure(html, url, found_callback=profiles.submit)
+        return enrich_team(team_data, progress_callback, member_callback, profile_hashes, max_workers,
+                           profiles=profiles)
+
+
+def enrich_team(team_data, progress_callback=None, member_callback=None, profile_hashes=None, max_workers=10,
+                done=None, profiles=None):
+    """Fetch every member's profile in parallel and assemble the enriched team.
+    Members in done (member_key → enriched member, e.g. from a checkpoint)
+    are reused as they are, without a callback. Profiles already submitted
+    to profiles (a ProfilePool) during team extraction aren't fetched again."""
+    company = team_data.get("company", "Unknown Company")
+    groups = team_data.get("groups", [])
+    done = done or {}
+
+    all_members = list_members(groups)
+    total_members = len(all_members)
+
+    if progress_callback:
+        progress_callback(20, f"Found {total_members} team members. Fetching individual profiles...")
+
+    enriched_groups = {g["name"]: [] for g in groups}
+    pending = []
+    for group_name, idx, member in all_members:
+        if member_key(member) in done:
+            enriched_groups[group_name].append((idx, done[member_key(member)]))
+        else:
+            pending.append((group_name, idx, member))
+    completed = total_members - len(pending)
+
+    # The same person can be listed in two groups; both wait on one profile
+    waiting = {}
+    with nullcontext(profiles) if profiles else ProfilePool(max_workers, profile_hashes) as profiles:
+        for group_name, idx, member in pending:
+            waiting.setdefault(profiles.submit(member), []).append((group_name, idx, member))
+        # Leaving the pool on an error (e.g. the job was cancelled) doesn't start the remaining profiles
+        for future in as_completed(waiting):
+            for group_name, idx, member in waiting[future]:
+                # The member as the final team has it, which may have been merged from several sightings
+                enriched_member = {**future.result(), **member}
+                enriched_groups[group_name].append((idx, enriched_member))
+                if member_callback:
+                    member_callback(group_name, idx, enriched_member)
+                completed += 1
+                if progress_callback:
+                    pct = 20 + int((completed / total_members) * 50)
+                    progress_callback(pct, f"Fetching profiles ({completed}/{total_members})...")
+
+    return assemble_team(company, groups, enriched_groups)
@@ -0,0 +1,593 @@
+"""Rule-based extraction of team pages and profiles, tried before Claude.
+
+Many team pages describe their people as schema.org Person JSON-LD or
+microdata, or lay them out as a regular grid of cards (photo, name, title,
+link). When one of those gives a confident answer it is returned in the
+same shape as the extraction prompts' JSON and the LLM call is skipped;
+otherwise callers fall back to Claude as before.
+
+A team page result is trusted when at least MIN_MEMBERS people were found
+and, for card grids, at least FAST_EXTRACT_MIN_CONFIDENCE of the cards
+read as one person each and the grid shows they are people (job titles,
+profile pages with photos, or a team heading); a page with two such grids
+is left to Claude. JSON-LD people only count when they are listed
+at the top level or in an ItemList (not an organization's founders or an
+article's author), when that share of their names shows on the page, and
+when the page doesn't show clearly more names than they account for. A profile is only taken from structured data when
+it carries a bio, education and prior roles, since Claude derives all three.
+"""
+import os
+import re
+import json
+from collections import Counter
+from html.parser import HTMLParser
+from urllib.parse import urljoin, urlsplit
+
+FAST_EXTRACT_ENABLED = os.environ.get("FAST_EXTRACT_ENABLED", "1") == "1"
+# Share of a card grid's cards that must look like exactly one person
+FAST_EXTRACT_MIN_CONFIDENCE = float(os.environ.get("FAST_EXTRACT_MIN_CONFIDENCE", 0.9))
+# Fewer people than this is more likely a byline or a testimonial than a team
+MIN_MEMBERS = 3
+# A bio shorter than this is a teaser, not something worth skipping Claude for
+MIN_BIO_CHARS = 200
+
+JSONLD_RE = re.compile(r"""<script[^>]*type=["']?application/ld\+json["']?[^>]*>(.*?)</script>""", re.I | re.S)
+TITLE_RE = re.compile(r"<title[^>]*>(.*?)</title>", re.I | re.S)
+SITE_NAME_RE = re.compile(
+    r"""<meta[^>]*(?:property|name)=["'](?:og:site_name|application-name)["'][^>]*content=["']([^"']+)["']""", re.I
+)
+TITLE_SEPARATORS_RE = re.compile(r"\s+[|\-–—:·]\s+")
+WHITESPACE_RE = re.compile(r"\s+")
+
+# Title segments that describe the page rather than name the company
+PAGE_WORDS = {"team", "our", "the", "people", "leadership", "about", "us", "meet", "staff", "partners", "who", "we", "are"}
+# Link and button labels that are never a job title
+LINK_LABELS = {"read more", "view profile", "bio", "view bio", "full bio", "learn more", "more", "profile",
+               "linkedin", "twitter", "email", "contact", "x"}
+# Words in a card's title line that make it a job title rather than a tagline
+ROLE_WORDS = {"partner", "partners", "founder", "founding", "co-founder", "cofounder", "ceo", "cfo", "coo", "cto",
+              "cio", "gc", "chief", "officer", "president", "vp", "director", "head", "manager", "managing",
+              "principal", "associate", "analyst", "advisor", "adviser", "counsel", "chair", "chairman",
+              "chairwoman", "board", "member", "venture", "operating", "investor", "investment", "lead",
+              "senior", "engineer", "designer", "scientist", "researcher", "fellow", "executive", "assistant",
+              "coordinator", "controller", "recruiter", "specialist", "strategist", "consultant", "professor",
+              "entrepreneur-in-residence", "eir", "general", "emeritus", "platform", "talent", "marketing",
+              "operations", "finance", "legal", "communications"}
+# Words in a grid's heading that say its cards are people
+TEAM_HEADING_WORDS = {"team", "people", "partners", "leadership", "founders", "staff", "advisors", "advisers",
+                      "board", "investors", "management", "executives"}
+# Lowercase words allowed inside a name
+NAME_PARTICLES = {"van", "von", "de", "der", "den", "da", "di", "del", "la", "le", "du", "bin", "al", "dos", "st."}
+
+SKIP_TAGS = {"script", "style", "noscript", "template", "svg", "nav", "footer", "head", "iframe"}
+VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr"}
+# Tags an open tag of the same name implicitly closes
+SELF_CLOSING_SIBLINGS = {"li", "p", "dt", "dd", "tr", "td", "th", "option"}
+HEADING_TAGS = {"h1", "h2", "h3", "h4", "h5", "h6"}
+EMPHASIS_TAGS = HEADING_TAGS | {"strong", "b"}
+GROUP_HEADING_TAGS = {"h2", "h3", "h4"}
+MIN_CARDS = 3
+# Where images keep their URL, lazy-loading placeholders aside
+IMAGE_ATTRIBUTES = ("src", "data-src", "data-lazy-src", "data-original")
+
+
+def _collapse(text):
+    return WHITESPACE_RE.sub(" ", text or "").strip()
+
+
+def looks_like_name(text):
+    """Does text read like a person's name ("Jane Q. Doe", "Ana de la Cruz, PhD")?"""
+    text = _collapse(text).split(",")[0]
+    words = text.split(" ")
+    if not 2 <= len(words) <= 5 or len(text) > 50 or any(c.isdigit() for c in text):
+        return False
+    for word in words:
+        if word.lower() in NAME_PARTICLES:
+            continue
+        if not word[0].isupper() or not all(c.isalpha() or c in ".'’-" for c in word):
+            return False
+    return True
+
+
+class _Node:
+    __slots__ = ("tag", "attrs", "children", "order")
+
+    def __init__(self, tag, attrs, order):
+        self.tag = tag
+        self.attrs = attrs
+        self.children = []
+        self.order = order
+
+    def elements(self):
+        return [c for c in self.children if isinstance(c, _Node)]
+
+    def walk(self):
+        """This node and every descendant element, in document order."""
+        yield self
+        for child in self.children:
+            if isinstance(child, _Node):
+                yield from child.walk()
+
+    def text(self):
+        parts = []
+        for child in self.children:
+            parts.append(child.text() if isinstance(child, _Node) else child)
+        return _collapse(" ".join(parts))
+
+
+class _TreeBuilder(HTMLParser):
+    """Minimal forgiving DOM: elements, attributes and text, minus SKIP_TAGS."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.root = _Node("root", {}, 0)
+        self._stack = [self.root]
+        self._order = 0
+        self._skip_tag = None
+        self._skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if self._skip_tag:
+            if tag == self._skip_tag:
+                self._skip_depth += 1
+            return
+        if tag in SKIP_TAGS:
+            self._skip_tag, self._skip_depth = tag, 1
+            return
+        if tag in SELF_CLOSING_SIBLINGS and self._stack[-1].tag == tag:
+            self._stack.pop()
+        self._order += 1
+        # Boolean attributes (itemscope) come through as None
+        node = _Node(tag, {k: v or "" for k, v in attrs}, self._order)
+        self._stack[-1].children.append(node)
+        if tag not in VOID_TAGS:
+            self._stack.append(node)
+
+    def handle_startendtag(self, tag, attrs):
+        if not self._skip_tag and tag not in SKIP_TAGS:
+            self.handle_starttag(tag, attrs)
+            if tag not in VOID_TAGS:
+                self._stack.pop()
+
+    def handle_endtag(self, tag):
+        if self._skip_tag:
+            if tag == self._skip_tag:
+                self._skip_depth -= 1
+                if self._skip_depth == 0:
+                    self._skip_tag = None
+            return
+        # Close up to the matching open tag; stray end tags are ignored
+        for i in range(len(self._stack) - 1, 0, -1):
+            if self._stack[i].tag == tag:
+                del self._stack[i:]
+                return
+
+    def handle_data(self, data):
+        if not self._skip_tag and data.strip():
+            self._stack[-1].children.append(data)
+
+
+def parse_html(html):
+    builder = _TreeBuilder()
+    builder.feed(html)
+    builder.close()
+    return builder.root
+
+
+# --- Company name -----------------------------------------------------------
+
+def company_name(html, jsonld_orgs=()):
+    """Site name from og:site_name, JSON-LD or the <title>."""
+    m = SITE_NAME_RE.search(html)
+    if m:
+        return _collapse(m.group(1))
+    if jsonld_orgs:
+        return jsonld_orgs[0]
+    m = TITLE_RE.search(html)
+    if m:
+        for segment in reversed(TITLE_SEPARATORS_RE.split(_collapse(m.group(1)))):
+            if segment and not set(re.findall(r"[a-z]+", segment.lower())) <= PAGE_WORDS:
+                return segment
+    return "Unknown Company"
+
+
+# --- JSON-LD ------------------------------------------------------------------
+
+def _types(obj):
+    t = obj.get("@type")
+    return {v for v in (t if isinstance(t, list) else [t]) if isinstance(v, str)}
+
+
+def _first(value):
+    return value[0] if isinstance(value, list) and value else value
+
+
+def _url_of(value):
+    value = _first(value)
+    if isinstance(value, dict):
+        value = value.get("url") or value.get("contentUrl") or value.get("@id")
+    return value if isinstance(value, str) and value else None
+
+
+def _name_of(value):
+    value = _first(value)
+    if isinstance(value, dict):
+        value = value.get("name")
+    return _collapse(value) if isinstance(value, str) and value.strip() else None
+
+
+def _text_of(value):
+    """A text property as a string; lists of strings are joined, anything else is skipped."""
+    if isinstance(value, list) and all(isinstance(v, str) for v in value):
+        value = " ".join(value)
+    return _collapse(value) if isinstance(value, str) else ""
+
+
+def jsonld_objects(html):
+    """Every JSON-LD object on the page, nested ones and @graph members included."""
+    found = []
+
+    def walk(value):
+        if isinstance(value, list):
+            for v in value:
+                walk(v)
+        elif isinstance(value, dict):
+            found.append(value)
+            for v in value.values():
+                if isinstance(v, (dict, list)):
+                    walk(v)
+
+    for m in JSONLD_RE.finditer(html):
+        try:
+            walk(json.loads(m.group(1).strip()))
+        except ValueError:
+            continue
+    return found
+
+
+def _jsonld_people(objects):
+    return [o for o in objects if "Person" in _types(o) and _name_of(o.get("name"))]
+
+
+def _jsonld_roster(html):
+    """Person objects at the top level of a JSON-LD block (or its @graph) or in an ItemList.
+
+    People nested in anything else (an Organization's founders, an article's
+    author) are a few names from the page, not its roster.
+    """
+    people = []
+
+    def visit(value):
+        if isinstance(value, list):
+            for v in value:
+                visit(v)
+        elif isinstance(value, dict):
+            types = _types(value)
+            if "Person" in types:
+                if _name_of(value.get("name")):
+                    people.append(value)
+            elif "ItemList" in types:
+                visit(value.get("itemListElement"))
+            elif "ListItem" in types:
+                visit(value.get("item"))
+            elif "@graph" in value:
+                visit(value["@graph"])
+
+    for m in JSONLD_RE.finditer(html):
+        try:
+            visit(json.loads(m.group(1).strip()))
+        except ValueError:
+            continue
+    return people
+
+
+def _jsonld_orgs(objects):
+    org_types = {"Organization", "Corporation", "LocalBusiness", "InvestmentFund", "FinancialService"}
+    return [_name_of(o.get("name")) for o in objects if _types(o) & org_types and _name_of(o.get("name"))]
+
+
+# --- Team pages -----------------------------------------------------------------
+
+def _same_site(href, page_url):
+    if not href or href.startswith(("#", "mailto:", "tel:", "javascript:")):
+        return False
+    host = urlsplit(urljoin(page_url, href)).netloc.lower()
+    return host == urlsplit(page_url).netloc.lower()
+
+
+def _text_items(card):
+    """(text, emphasised) for each run of text in the card, in order."""
+    items = []
+
+    def walk(node, emphasised):
+        emphasised = emphasised or node.tag in EMPHASIS_TAGS
+        for child in node.children:
+            if isinstance(child, _Node):
+                walk(child, emphasised)
+            else:
+                text = _collapse(child)
+                if text:
+                    items.append((text, emphasised))
+
+    walk(card, False)
+    return items
+
+
+def _card_member(card, page_url):
+    """A member from one card, or None unless it holds exactly one person."""
+    items = _text_items(card)
+    emphasised_names = [t for t, emphasised in items if emphasised and looks_like_name(t)]
+    if len(emphasised_names) > 1:
+        return None
+    if emphasised_names:
+        name = emphasised_names[0]
+    else:
+        # Plain-text cards: the name has to come first
+        names = [t for t, _ in items[:2] if looks_like_name(t)]
+        if len(names) != 1 or sum(looks_like_name(t) for t, _ in items) > 1:
+            return None
+        name = names[0]
+
+    texts = [t for t, _ in items]
+    after = texts[texts.index(name) + 1:]
+    title = next((t for t in after if t.lower() not in LINK_LABELS and 1 < len(t) <= 120), None)
+
+    photo_url = None
+    profile_url = card.attrs.get("href") if card.tag == "a" and _same_site(card.attrs.get("href"), page_url) else None
+    for node in card.walk():
+        if node.tag == "img" and not photo_url:
+            photo_url = next(
+                (node.attrs[a] for a in IMAGE_ATTRIBUTES if node.attrs.get(a) and not node.attrs[a].startswith("data:")),
+                None,
+            )
+        elif node.tag == "a" and not profile_url and _same_site(node.attrs.get("href"), page_url):
+            profile_url = node.attrs["href"]
+
+    return {"name": name, "title": title, "photo_url": photo_url, "profile_url": profile_url}
+
+
+def _card_key(node):
+    """Siblings with the same key are cards of one grid: tag and class, else tag and shape."""
+    cls = node.attrs.get("class")
+    if cls:
+        return node.tag, cls
+    return node.tag, tuple(child.tag for child in node.elements())
+
+
+def _words(text):
+    return set(re.findall(r"[a-z][a-z-]*", (text or "").lower()))
+
+
+def _is_person(member):
+    """Does a card show more than a name: a role, or its own profile page and photo?"""
+    title = member["title"] or ""
+    # A news excerpt can mention a partner too; job titles are short
+    if len(title.split()) <= 8 and _words(title) & ROLE_WORDS:
+        return True
+    return bool(member["profile_url"] and member["photo_url"])
+
+
+def _heading_before(root, node):
+    """Text of the last h2-h4 before node, or ""."""
+    heading = ""
+    for n in root.walk():
+        if n.order >= node.order:
+            break
+        if n.tag in GROUP_HEADING_TAGS and n.text():
+            heading = n.text()
+    return heading
+
+
+def _people_grid(root, cards, members):
+    """Is a grid people rather than a portfolio or a news list?
+
+    Names alone don't tell: "Blue Apron" and "Acme Closes Fund Four" read
+    like names too, so its cards need a role or a profile page and photo,
+    or the grid needs a heading like "Our Team".
+    """
+    found = [m for m in members if m]
+    if sum(_is_person(m) for m in found) >= FAST_EXTRACT_MIN_CONFIDENCE * len(found):
+        return True
+    return bool(_words(_heading_before(root, cards[0])) & TEAM_HEADING_WORDS)
+
+
+def _card_grids(root, page_url):
+    """Find repeated-card grids. Returns [(cards, members, confidence)], outermost first."""
+    grids = []
+
+    def visit(node):
+        children = node.elements()
+        if len(children) >= MIN_CARDS:
+            key, count = Counter(_card_key(c) for c in children).most_common(1)[0]
+            if count >= MIN_CARDS and count * 2 >= len(children):
+                cards = [c for c in children if _card_key(c) == key]
+                members = [_card_member(card, page_url) for card in cards]
+                names = [m["name"] for m in members if m is not None]
+                confidence = len(names) / len(cards)
+                # The same "name" on every card is a title or label ("Operating Team"), not people
+                if confidence >= FAST_EXTRACT_MIN_CONFIDENCE and len(set(names)) == len(names):
+                    grids.append((cards, members, confidence))
+                    return
+        for child in children:
+            visit(child)
+
+    visit(root)
+    return grids
+
+
+def _microdata_people(root):
+    """(node, member) for each schema.org/Person microdata item."""
+    people = []
+    for node in root.walk():
+        if "itemscope" not in node.attrs or "schema.org/Person" not in node.attrs.get("itemtype", ""):
+            continue
+        props = {}
+
+        def collect(n):
+            for child in n.elements():
+                prop = child.attrs.get("itemprop")
+                if prop and prop not in props:
+                    props[prop] = (
+                        child.attrs.get("content") or child.attrs.get("src") or child.attrs.get("href")
+                        if child.tag in ("meta", "img", "a", "link") else child.text()
+                    )
+                # Nested items (an employer, an address) describe something else
+                if "itemscope" not in child.attrs:
+                    collect(child)
+
+        collect(node)
+        name = _collapse(props.get("name"))
+        if name:
+            people.append((node, {
+                "name": name,
+                "title": _collapse(props.get("jobTitle")) or None,
+                "photo_url": props.get("image"),
+                "profile_url": props.get("url"),
+            }))
+    return people
+
+
+def _place_by_name(root, members):
+    """(node, member) for each member whose name shows in the page's text, at the element holding it."""
+    texts = [(node, _collapse(child)) for node in root.walk() for child in node.children if isinstance(child, str)]
+    placed = []
+    for member in members:
+        node = next((n for n, text in texts if member["name"] in text), None)
+        if node is not None:
+            placed.append((node, member))
+    return placed
+
+
+def _lists_more(root, members):
+    """Does the page show clearly more names (as headings or bold text) than members covers?"""
+    shown = {t for t, emphasised in _text_items(root) if emphasised and looks_like_name(t)}
+    others = [t for t in shown if not any(m["name"] in t for m in members)]
+    # A few section headings read like names too ("Investment Team")
+    return len(others) > max(MIN_MEMBERS, (1 - FAST_EXTRACT_MIN_CONFIDENCE) * len(members))
+
+
+def _group_by_heading(root, placed):
+    """Groups from [(node, member)], named after the nearest preceding h2-h4 outside any card."""
+    in_cards = {id(n) for node, _ in placed for n in node.walk()}
+    headings = [
+        (n.order, n.text()) for n in root.walk()
+        if n.tag in GROUP_HEADING_TAGS and id(n) not in in_cards and n.text()
+    ]
+    groups = {}
+    for node, member in sorted(placed, key=lambda p: p[0].order):
+        preceding = [text for order, text in headings if order < node.order]
+        groups.setdefault(preceding[-1] if preceding else "Team", []).append(member)
+    return [{"name": name, "members": members} for name, members in groups.items()]
+
+
+def _dedupe(members):
+    seen = set()
+    unique = []
+    for m in members:
+        key = (m.get("profile_url") or "", m["name"].lower())
+        if key not in seen:
+            seen.add(key)
+            unique.append(m)
+    return unique
+
+
+def extract_team(html, url):
+    """Team data in the TEAM_EXTRACTION_PROMPT shape, or None when not confident.
+
+    Returns (team_data, method) where method is "json-ld", "microdata" or
+    "card-grid". When several apply, the one finding the most people wins.
+    """
+    if not FAST_EXTRACT_ENABLED:
+        return None
+
+    objects = jsonld_objects(html)
+    company = company_name(html, _jsonld_orgs(objects))
+    candidates = []
+    root = parse_html(html)
+
+    people = _jsonld_roster(html)
+    if people:
+        members = _dedupe([{
+            "name": _name_of(p.get("name")),
+            "title": _name_of(p.get("jobTitle")),
+            "photo_url": _url_of(p.get("image")),
+            "profile_url": _url_of(p.get("url")),
+        } for p in people])
+        # People not shown on the page are dropped; too many of them and the JSON-LD isn't this page's roster
+        placed = _place_by_name(root, members)
+        if len(placed) >= FAST_EXTRACT_MIN_CONFIDENCE * len(members) and not _lists_more(root, members):
+            groups = _group_by_heading(root, placed)
+            candidates.append(("json-ld", groups, len(placed)))
+
+    microdata = _microdata_people(root)
+    if microdata:
+        groups = _group_by_heading(root, microdata)
+        candidates.append(("microdata", groups, sum(len(g["members"]) for g in groups)))
+
+    grids = [(cards, members) for cards, members, _ in _card_grids(root, url) if _people_grid(root, cards, members)]
+    # Two grids of people (a team and its portfolio founders, say) need Claude to tell which is the team
+    if len(grids) == 1:
+        placed = [(card, member) for card, member in zip(*grids[0]) if member]
+        groups = _group_by_heading(root, placed)
+        for group in groups:
+            group["members"] = _dedupe(group["members"])
+        candidates.append(("card-grid", groups, sum(len(g["members"]) for g in groups)))
+
+    candidates = [c for c in candidates if c[2] >= MIN_MEMBERS]
+    if not candidates:
+        return None
+    method, groups, _ = max(candidates, key=lambda c: c[2])
+    return {"company": company, "groups": groups}, method
+
+
+# --- Profile pages ----------------------------------------------------------------
+
+def _as_list(value):
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+def _profile_from(people, member):
+    """The profile for member from JSON-LD Person objects, or None when it is incomplete."""
+    wanted = _collapse(member.get("name")).lower()
+    person = next((p for p in people if _name_of(p.get("name")).lower() == wanted), None)
+    if person is None and len(people) == 1:
+        person = people[0]
+    if person is None:
+        return None
+
+    bio = _text_of(person.get("description"))
+    education = [
+        {"school": _name_of(school), "degree": None, "honors": None}
+        for school in _as_list(person.get("alumniOf")) if _name_of(school)
+    ]
+    career = []
+    for role in _as_list(person.get("hasOccupation")):
+        if not isinstance(role, dict) or not _name_of(role.get("name")):
+            continue
+        employer = _name_of(role.get("worksFor") or role.get("memberOf") or role.get("hiringOrganization"))
+        career.append({"company": employer or "", "role": _name_of(role.get("name")),
+                       "details": _text_of(role.get("description")) or None})
+
+    if len(bio) < MIN_BIO_CHARS or not education or not career:
+        return None
+    return {"bio": bio, "education": education, "career": career, "personal": []}
+
+
+def extract_profile(html, member):
+    """Profile data in the PROFILE_EXTRACTION_PROMPT shape from JSON-LD, or None.
+
+    Only used when the page's Person for this member has a full bio,
+    education (alumniOf) and prior roles (hasOccupation); anything less
+    would lose detail Claude would have pulled out of the bio.
+    """
+    if not FAST_EXTRACT_ENABLED:
+        return None
+
+    try:
+        return _profile_from(_jsonld_people(jsonld_objects(html)), member)
+    except (TypeError, AttributeError, ValueError) as e:
+        # Malformed JSON-LD: let Claude read the page instead
+        print(f"Ignoring malformed JSON-LD profile for {member.get('name')}: {e}")
+        return None
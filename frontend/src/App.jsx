@@ -1,4 +1,4 @@
-import { useState, useEffect, useCallback } from 'react'
+import { useState, useEffect } from 'react'
 import UrlForm from './components/UrlForm'
 import Progress from './components/Progress'
 import Dossier from './components/Dossier'
@@ -17,10 +17,13 @@ function App() {
   const [jobId, setJobId] = useState(null)
   const [progress, setProgress] = useState({ progress: 0, step: '', status: 'pending' })
   const [dossier, setDossier] = useState(null)
+  const [partialInsights, setPartialInsights] = useState([])
+  const [notionExport, setNotionExport] = useState(null)
   const [error, setError] = useState(null)
 
   const handleSubmit = async (url) => {
     setError(null)
+    setJobId(null)
     setView('progress')
     setProgress({ progress: 0, step: 'Submitting...', status: 'pending' })
 
@@ -42,47 +45,101 @@ function App() {
     }
   }
 
-  const pollJob = useCallback(async () => {
-    if (!jobId) return
-
-    try {
-      const resp = await fetch(`${API_URL}/dossier/${jobId}`)
-      const data = await resp.json()
-
-      setProgress({
-        progress: data.progress,
-        step: data.step,
-        status: data.status,
-      })
-
-      if (data.status === 'complete') {
-        setDossier(data.result)
-        setView('dossier')
-      } else if (data.status === 'error') {
-        setError(data.step)
-        setView('form')
-      }
-    } catch (e) {
-      // Network error — keep polling
-    }
-  }, [jobId])
-
+  // Progress and result fragments are pushed over Server-Sent Events; the
+  // browser reconnects on its own and resumes from the last event id
   useEffect(() => {
     if (view !== 'progress' || !jobId) return
 
-    const interval = setInterval(pollJob, 2000)
-    pollJob() // Immediate first poll
-    return () => clearInterval(interval)
-  }, [view, jobId, pollJob])
+    const source = new EventSource(`${API_URL}/dossier/${jobId}/events`)
+
+    source.addEventListener('progress', (e) => {
+      const data = JSON.parse(e.data)
+      setProgress((prev) => ({ ...prev, progress: data.progress, step: data.step, status: 'in_progress' }))
+    })
+    source.addEventListener('insight', (e) => {
+      const data = JSON.parse(e.data)
+      setPartialInsights((prev) => {
+        const next = prev.slice()
+        next[data.index] = data.insight
+        return next
+      })
+    })
+    source.addEventListener('complete', (e) => {
+      const data = JSON.parse(e.data)
+      source.close()
+      setProgress({ progress: 100, step: 'Done', status: 'complete' })
+      setDossier(data.result)
+      setView('dossier')
+    })
+    source.addEventListener('error', (e) => {
+      // Server-sent "error" events carry data; connection errors don't and
+      // are retried by the browser
+      if (!e.data) return
+      source.close()
+      setError(JSON.parse(e.data).step)
+      setView('form')
+    })
+    source.addEventListener('cancelled', () => {
+      source.close()
+      setError('Dossier generation was cancelled')
+      setView('form')
+    })
+
+    return () => source.close()
+  }, [view, jobId])
 
   const handleReset = () => {
     setView('form')
     setJobId(null)
     setDossier(null)
+    setPartialInsights([])
+    setNotionExport(null)
     setProgress({ progress: 0, step: '', status: 'pending' })
     setError(null)
   }
 
+  // Resumes a failed or cancelled job from its last checkpoint, under the same id
+  const handleRetry = async () => {
+    if (!jobId) return
+
+    try {
+      const resp = await fetch(`${API_URL}/dossier/${jobId}/retry`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+      })
+      const data = await resp.json()
+      if (!resp.ok) throw new Error(data.error || 'Retry failed')
+      setError(null)
+      setPartialInsights([])
+      setProgress({ progress: 0, step: 'Retrying...', status: 'pending' })
+      setView('progress')
+    } catch (e) {
+      setError(e.message)
+    }
+  }
+
+  // Re-runs only what changed on the team page; progress streams as a new job
+  const handleRefresh = async () => {
+    if (!jobId) return
+
+    try {
+      const resp = await fetch(`${API_URL}/dossier/${jobId}/refresh`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+      })
+      const data = await resp.json()
+      if (!resp.ok) throw new Error(data.error || 'Refresh failed')
+      setPartialInsights([])
+      setNotionExport(null)
+      setProgress({ progress: 0, step: 'Refreshing...', status: 'pending' })
+      setJobId(data.job_id)
+      setView('progress')
+    } catch (e) {
+      alert('Refresh failed: ' + e.message)
+    }
+  }
+
+  // The export runs as a background job on the server; poll until it's done
   const handleExportNotion = async () => {
     if (!jobId) return
 
@@ -91,13 +148,25 @@ function App() {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
       })
-      const data = await resp.json()
-      if (data.notion_url) {
+      let data = await resp.json()
+      if (!resp.ok) throw new Error(data.error || 'Export failed')
+
+      while (data.status === 'pending' || data.status === 'in_progress') {
+        setNotionExport(data)
+        await new Promise((resolve) => setTimeout(resolve, 1000))
+        const poll = await fetch(`${API_URL}/dossier/${jobId}/export-notion`)
+        data = await poll.json()
+        if (!poll.ok) throw new Error(data.error || 'Export failed')
+      }
+
+      setNotionExport(data)
+      if (data.status === 'complete') {
         window.open(data.notion_url, '_blank')
       } else {
-        alert(data.error || 'Export failed')
+        alert(data.step || 'Export failed')
       }
     } catch (e) {
+      setNotionExport(null)
       alert('Export failed: ' + e.message)
     }
   }
@@ -111,13 +180,14 @@ function App() {
 
       <main className="app-main">
         {view === 'form' && (
-          <UrlForm onSubmit={handleSubmit} error={error} />
+          <UrlForm onSubmit={handleSubmit} error={error} onRetry={error && jobId ? handleRetry : null} />
         )}
         {view === 'progress' && (
           <Progress
             progress={progress.progress}
             step={progress.step}
             status={progress.status}
+            insights={partialInsights}
           />
         )}
         {view === 'dossier' && dossier && (
@@ -125,6 +195,8 @@ function App() {
             data={dossier}
             onReset={handleReset}
             onExportNotion={handleExportNotion}
+            notionExport={notionExport}
+            onRefresh={handleRefresh}
           />
         )}
       </main>
@@ -2,7 +2,7 @@ import { useState } from 'react'
 import ProfileCard from './ProfileCard'
 import InsightSection from './InsightSection'
 
-function Dossier({ data, onReset, onExportNotion }) {
+function Dossier({ data, onReset, onExportNotion, notionExport, onRefresh }) {
   const [activeTab, setActiveTab] = useState('team')
 
   // Flatten all members across groups, preserve original order
@@ -74,8 +74,28 @@ function Dossier({ data, onReset, onExportNotion }) {
       )}
 
       <div className="dossier-actions">
-        <button className="action-btn action-btn-primary" onClick={onExportNotion}>
-          Export to Notion
+        {notionExport?.status === 'complete' ? (
+          <a
+            className="action-btn action-btn-primary"
+            href={notionExport.notion_url}
+            target="_blank"
+            rel="noreferrer"
+          >
+            Open in Notion
+          </a>
+        ) : (
+          <button
+            className="action-btn action-btn-primary"
+            onClick={onExportNotion}
+            disabled={notionExport?.status === 'pending' || notionExport?.status === 'in_progress'}
+          >
+            {notionExport?.status === 'pending' || notionExport?.status === 'in_progress'
+              ? `Exporting... ${notionExport.progress}%`
+              : 'Export to Notion'}
+          </button>
+        )}
+        <button className="action-btn action-btn-secondary" onClick={onRefresh}>
+          Refresh
         </button>
         <button className="action-btn action-btn-secondary" onClick={onReset}>
           Generate Another
@@ -1,6 +1,7 @@
 import { useState, useEffect, useRef } from 'react'
+import InsightSection from './InsightSection'
 
-function Progress({ progress, step, status }) {
+function Progress({ progress, step, status, insights = [] }) {
   const [elapsedSeconds, setElapsedSeconds] = useState(0)
   const phase2StartRef = useRef(null)
   const timerRef = useRef(null)
@@ -97,11 +98,21 @@ function Progress({ progress, step, status }) {
               {formatTime(elapsedSeconds)}
             </div>
             <div className="progress-subtext">
-              This usually takes 60–90 seconds. Stay tuned.
+              {insights.length > 0
+                ? `${insights.length} section${insights.length === 1 ? '' : 's'} ready — more on the way.`
+                : 'This usually takes 60–90 seconds. Stay tuned.'}
             </div>
           </>
         )}
       </div>
+
+      {isPhase2 && insights.length > 0 && (
+        <div className="progress-insights">
+          {insights.map((insight, i) => (
+            <InsightSection key={i} title={insight.title} content={insight.content} />
+          ))}
+        </div>
+      )}
     </div>
   )
 }
@@ -1,6 +1,6 @@
 import { useState } from 'react'
 
-function UrlForm({ onSubmit, error }) {
+function UrlForm({ onSubmit, error, onRetry }) {
   const [url, setUrl] = useState('')
   const [submitting, setSubmitting] = useState(false)
 
@@ -36,6 +36,13 @@ function UrlForm({ onSubmit, error }) {
         Enter any team or leadership page URL
       </p>
       {error && <p className="form-error">{error}</p>}
+      {onRetry && (
+        <div className="form-retry">
+          <button type="button" className="action-btn action-btn-secondary" onClick={onRetry}>
+            Retry from where it stopped
+          </button>
+        </div>
+      )}
     </form>
   )
 }